@@ -0,0 +1,59 @@
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from src.ann import IVFIndex
+from src.config import MOVIE_GENRES
+from src.recommender import Recommender
+
+
+def make_clustered_catalogue(rows, dim=384, topics=200, seed=0):
+    # Real overviews cluster by topic; uniform noise would make any IVF index look far worse than it is
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim), dtype=np.float32)
+    embeddings = centers[rng.integers(0, topics, rows)] + 0.6 * rng.standard_normal((rows, dim), dtype=np.float32)
+    embeddings /= np.sqrt(np.einsum('ij,ij->i', embeddings, embeddings))[:, None]
+    genre_ids = np.array(list(MOVIE_GENRES))
+    df = pd.DataFrame({
+        "title": [f"Title {i:07d}" for i in range(rows)],
+        "genre_ids": [json.dumps(rng.choice(genre_ids, size=rng.integers(1, 4), replace=False).tolist()) for _ in range(rows)],
+    })
+    return df, embeddings
+
+
+def latency(recommender, titles, **kwargs):
+    results, times = [], []
+    for title in titles:
+        start = time.perf_counter()
+        results.append(recommender.recommend(title, **kwargs))
+        times.append(time.perf_counter() - start)
+    return results, np.percentile(times, 50) * 1000, np.percentile(times, 99) * 1000
+
+
+def run(rows, queries, probes, n_lists):
+    df, embeddings = make_clustered_catalogue(rows)
+    start = time.perf_counter()
+    index = IVFIndex.build(embeddings, n_lists=n_lists)
+    print(f"{rows} rows: built {index.n_lists}-list IVF index in {time.perf_counter() - start:.1f}s")
+
+    recommender = Recommender(df, embeddings, index)
+    titles = df['title'].sample(queries, random_state=1).tolist()
+    exact, p50, p99 = latency(recommender, titles, exact=True)
+    print(f"  exact          p50 {p50:7.2f}ms  p99 {p99:7.2f}ms")
+
+    for n_probe in probes:
+        recommender.n_probe = n_probe
+        approx, p50, p99 = latency(recommender, titles)
+        recall = np.mean([len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(approx, exact)])
+        print(f"  n_probe={n_probe:<5}  p50 {p50:7.2f}ms  p99 {p99:7.2f}ms  recall@15 {recall:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--lists', type=int, default=None)
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+    run(args.rows, args.queries, args.probes, args.lists)
@@ -0,0 +1,75 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+import merge_datasets
+
+
+class FakeImageHandler(BaseHTTPRequestHandler):
+    # Stand-in for image.tmdb.org/t/p/{size}/{file}: per-request latency and a body whose size follows the tier
+    latency = 0.05
+    sizes = {"original": 400_000, "w342": 30_000}
+
+    def do_GET(self):
+        size = self.path.strip("/").split("/")[-2]
+        body = os.urandom(self.sizes.get(size, 20_000))
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_items(count):
+    # Every third item is a duplicate title with fewer fields, which must not be downloaded
+    items = []
+    for i in range(count):
+        items.append({"title": f"Title {i}", "media_type": "movie", "overview": "...", "vote_count": 10,
+                      "poster_path": f"/poster{i}.jpg", "backdrop_path": f"/backdrop{i}.jpg"})
+        if i % 3 == 0:
+            items.append({"title": f"Title {i}", "media_type": "movie",
+                          "poster_path": f"/dupe{i}.jpg", "backdrop_path": ""})
+    return items
+
+
+def run(count, size, workers_list):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/t/p/"
+    data_dir, image_dir = merge_datasets.DATA_DIR, merge_datasets.IMAGE_DIR
+    try:
+        for workers in workers_list:
+            with tempfile.TemporaryDirectory() as tmp:
+                # Images go under a scratch data directory rather than the configured one
+                merge_datasets.DATA_DIR = Path(tmp)
+                merge_datasets.IMAGE_DIR = Path(tmp) / "images"
+                os.makedirs(merge_datasets.IMAGE_DIR)
+                items = merge_datasets.unify_items(make_items(count))
+                start = time.perf_counter()
+                merge_datasets.download_images(items, size, workers, base_url)
+                elapsed = time.perf_counter() - start
+                files = sum(len(names) for _, _, names in os.walk(merge_datasets.IMAGE_DIR))
+                start = time.perf_counter()
+                merge_datasets.download_images(merge_datasets.unify_items(make_items(count)), size, workers, base_url)
+                rerun = time.perf_counter() - start
+            print(f"{workers:>3} workers, {size}: {files} files in {elapsed:.1f}s ({files / elapsed:.0f} images/sec), "
+                  f"re-run with files present {rerun:.2f}s")
+    finally:
+        merge_datasets.DATA_DIR, merge_datasets.IMAGE_DIR = data_dir, image_dir
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=300)
+    parser.add_argument('--size', choices=merge_datasets.IMAGE_SIZES, default="w342")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, merge_datasets.DOWNLOAD_WORKERS])
+    args = parser.parse_args()
+    run(args.items, args.size, args.workers)
@@ -0,0 +1,86 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import make_catalogue
+from src.filters import RecommendationFilter
+from src.recommender import Recommender
+
+# Each filter's candidates and rankings against a brute-force mask over the whole frame, then per-query timings.
+# The combinations pair media types with genres that mostly belong to the other type, so a condition that is
+# dropped changes the answer. The check also runs on a slice where TV is rare, so the media type is sometimes
+# the smallest condition and the genre the one checked against it.
+FILTERS = [
+    RecommendationFilter(media_type="tv"),
+    RecommendationFilter(genre="Drama"),
+    RecommendationFilter(released_after="2010"),
+    RecommendationFilter(released_after="2000", released_before="2004-06"),
+    RecommendationFilter(min_vote_count=19_000),
+    RecommendationFilter(min_popularity=100, media_type="tv"),
+    RecommendationFilter(media_type="tv", genre="Drama"),
+    RecommendationFilter(media_type="movie", genre="Kids"),
+    RecommendationFilter(media_type="tv", genre="Western"),
+    RecommendationFilter(media_type="movie", genre="Western", min_vote_average=8, released_after=2015),
+]
+
+
+def brute_force_rows(df, filters):
+    keep = np.ones(len(df), dtype=bool)
+    if filters.media_type is not None:
+        keep &= df["media_type"].to_numpy() == filters.media_type
+    if filters.genre is not None:
+        keep &= df["genres"].str.split(", ").apply(lambda names: filters.genre in names).to_numpy()
+    days = (pd.to_datetime(df["release_date"]) - pd.Timestamp("1970-01-01")).dt.days.to_numpy()
+    low, high = filters.date_range
+    if low is not None:
+        keep &= days >= low
+    if high is not None:
+        keep &= days <= high
+    for column, minimum in (("popularity", filters.min_popularity), ("vote_count", filters.min_vote_count),
+                            ("vote_average", filters.min_vote_average)):
+        if minimum is not None:
+            keep &= df[column].to_numpy() >= minimum
+    return np.flatnonzero(keep)
+
+
+def check_parity(recommender, df, titles, top_n=15):
+    for filters in FILTERS:
+        expected = brute_force_rows(df, filters)
+        got = recommender.candidate_rows(filters)
+        if not np.array_equal(got, expected):
+            raise AssertionError(f"{filters.as_dict()}: {len(got)} candidate rows, brute force finds {len(expected)}")
+        for title in titles:
+            idx = recommender.find(title)
+            want = recommender._rank(idx, recommender._title_keys[idx], recommender.scores(idx, expected), expected, top_n)
+            if recommender.recommend_rows(title, top_n, filters=filters) != want:
+                raise AssertionError(f"{filters.as_dict()}: ranking for {title!r} differs from brute force")
+
+
+def run(rows, queries):
+    df, embeddings = make_catalogue(rows)
+    recommender = Recommender(df, embeddings)
+    titles = df["title"].sample(queries, random_state=1).tolist()
+    recommender.recommend_rows(titles[0])
+
+    check_parity(recommender, df, titles[:5])
+    media = df["media_type"].to_numpy()
+    skewed = np.sort(np.r_[np.flatnonzero(media == "movie"), np.flatnonzero(media == "tv")[::50]])
+    skewed_df = df.iloc[skewed].reset_index(drop=True)
+    check_parity(Recommender(skewed_df, embeddings[skewed]), skewed_df, skewed_df["title"].sample(5, random_state=1).tolist())
+    print(f"{rows} rows: {len(FILTERS)} filters match brute-force candidates and rankings, also with TV at 2%")
+    for filters in [RecommendationFilter()] + FILTERS:
+        start = time.perf_counter()
+        for title in titles:
+            recommender.recommend_rows(title, filters=filters)
+        elapsed = (time.perf_counter() - start) / len(titles) * 1000
+        candidates = recommender.candidate_rows(filters)
+        print(f"    {str(filters.as_dict() or 'unfiltered'):<100} {len(df) if candidates is None else len(candidates):>8} rows  "
+              f"{elapsed:7.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+    run(args.rows, args.queries)
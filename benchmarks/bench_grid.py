@@ -0,0 +1,67 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from benchmarks.synthetic import write_catalogue
+
+# Scripted scroll / resize / keystroke session against one MediaGridView, timing each frame offscreen
+SESSION = """
+import time
+import numpy as np
+from PySide6.QtWidgets import QApplication
+app = QApplication([])
+from gui.media_grid_view import MediaGridView
+
+def frame(action):
+    start = time.perf_counter()
+    action()
+    app.processEvents()
+    view.grid_view.viewport().repaint()
+    return (time.perf_counter() - start) * 1000
+
+start = time.perf_counter()
+view = MediaGridView({media_type!r})
+view.resize(1280, 720)
+view.show()
+app.processEvents()
+build = (time.perf_counter() - start) * 1000
+
+bar = view.grid_view.verticalScrollBar()
+scroll = [frame(lambda: bar.setValue(bar.value() + 240)) for _ in range({steps})]
+scroll += [frame(lambda: bar.setValue(int(bar.maximum() * f))) for f in np.linspace(0, 1, 20)]
+resize = [frame(lambda w=w: view.resize(w, 720)) for w in [900, 1100, 1280, 1600, 1920, 1400, 1000] * 3]
+queries = ["t", "ti", "tit", "titl", "title", "title 0", "title 00012", ""]
+typing = [frame(lambda t=t: view.search_bar.setText(t)) for t in queries]
+# Waits for the in-memory title index when there is no on-disk catalogue
+view.catalogue.page(view.media_type, "title", limit=1)
+# The debounced filter itself, as it runs once typing pauses
+search = [frame(lambda t=t: (view.search_bar.setText(t), view.apply_filters())) for t in queries]
+
+for name, times in (("scroll", scroll), ("resize", resize), ("keystroke", typing), ("search", search)):
+    print("RESULT", name, np.mean(times), np.percentile(times, 95), np.max(times), flush=True)
+print("RESULT build", build, build, build, flush=True)
+"""
+
+
+def run(rows, steps):
+    with tempfile.TemporaryDirectory() as tmp:
+        write_catalogue(tmp, rows)
+        env = dict(os.environ, RECOMMENDER_DATA_DIR=tmp, QT_QPA_PLATFORM="offscreen")
+        out = subprocess.run([sys.executable, "-c", SESSION.format(media_type="movie", steps=steps)],
+                             capture_output=True, text=True, env=env)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip())
+    print(f"{rows} rows ({rows // 2} movies in the grid):")
+    for line in out.stdout.splitlines():
+        if line.startswith("RESULT "):
+            _, name, mean, p95, worst = line.split()
+            print(f"    {name:<10} mean {float(mean):7.2f}ms  p95 {float(p95):7.2f}ms  max {float(worst):7.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--steps', type=int, default=200)
+    args = parser.parse_args()
+    run(args.rows, args.steps)
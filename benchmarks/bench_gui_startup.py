@@ -0,0 +1,65 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from benchmarks.synthetic import write_catalogue
+from src.catalogue import build_catalogue
+
+# Builds the main window offscreen, opens both grids and one detail view, and counts metadata reads. With
+# --catalogue the grids page through the on-disk catalogue, so the CSV is only read for the detail view.
+STARTUP = """
+import time
+import pandas as pd
+reads = []
+read_csv = pd.read_csv
+pd.read_csv = lambda *args, **kwargs: reads.append(args[0]) or read_csv(*args, **kwargs)
+
+start = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+app = QApplication([])
+from gui.window import MovieRecommenderGUI
+from gui.media_grid_view import RowDataRole
+window = MovieRecommenderGUI()
+window.show()
+app.processEvents()
+startup = time.perf_counter() - start
+
+window.show_grid("tv")
+app.processEvents()
+start = time.perf_counter()
+window.show_detail_view(window.tv_view.model.index(0, 0).data(RowDataRole))
+app.processEvents()
+detail = time.perf_counter() - start
+
+with open('/proc/self/status') as f:
+    peak_kb = next(line.split()[1] for line in f if line.startswith('VmHWM'))
+print("RESULT", startup, detail, int(peak_kb) / 1024, len(reads), flush=True)
+"""
+
+
+def run(rows, catalogue=False):
+    with tempfile.TemporaryDirectory() as tmp:
+        write_catalogue(tmp, rows)
+        if catalogue:
+            build_catalogue(os.path.join(tmp, "metadata_embeddings.csv"), os.path.join(tmp, "catalogue.sqlite"))
+        env = dict(os.environ, RECOMMENDER_DATA_DIR=tmp, QT_QPA_PLATFORM="offscreen")
+        out = subprocess.run([sys.executable, "-c", STARTUP], capture_output=True, text=True, env=env)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip())
+    # Poster loader threads may still be printing, so pick out the tagged line
+    result = next(line for line in out.stdout.splitlines() if line.startswith("RESULT "))
+    startup, detail, peak_mb, reads = result.split()[1:]
+    print(f"{rows} rows{' (catalogue)' if catalogue else ''}: startup {float(startup):.2f}s, first detail view {float(detail):.2f}s, "
+          f"peak RSS {float(peak_mb):.0f} MB, metadata CSV reads {reads}")
+    if int(reads) != 1:
+        sys.exit(f"expected the metadata CSV to be read exactly once, got {reads}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--catalogue', action='store_true', help="build the on-disk catalogue first")
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.catalogue)
@@ -0,0 +1,53 @@
+import argparse
+import json
+import random
+import tempfile
+from pathlib import Path
+from benchmarks.common import run_measured
+
+MERGERS = {
+    "in-memory": """
+import merge_datasets
+items = merge_datasets.unify_items(*[merge_datasets.load_jsonl(p) for p in {paths!r}])
+merge_datasets.download_images(items)
+merge_datasets.save_merged_csv(items, {output!r})
+""",
+    "streaming": """
+import merge_datasets
+merge_datasets.merge_jsonl({paths!r}, {output!r})
+""",
+}
+
+
+def write_jsonl(path, media_type, lines, duplicate_rate=0.1, seed=0):
+    # Image paths are left empty so the benchmark measures the merge, not the downloader
+    rng = random.Random(seed)
+    unique = int(lines * (1 - duplicate_rate))
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            n = i if i < unique else rng.randrange(unique)
+            item = {"id": n, "overview": f"Synthetic overview number {n} " * 4, "genre_ids": [18, 35],
+                    "popularity": rng.random() * 100, "vote_average": 7.0, "vote_count": rng.randrange(50, 5000),
+                    "original_language": "en", "adult": False, "poster_path": "", "backdrop_path": "",
+                    "media_type": media_type}
+            item["title" if media_type == "movie" else "name"] = f"{media_type} title {n}"
+            f.write(json.dumps(item) + "\n")
+
+
+def run(sizes):
+    for lines in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [str(Path(tmp) / "tmdb_movie.jsonl"), str(Path(tmp) / "tmdb_tv.jsonl")]
+            write_jsonl(paths[0], "movie", lines // 2)
+            write_jsonl(paths[1], "tv", lines // 2, seed=1)
+            for name, body in MERGERS.items():
+                output = str(Path(tmp) / f"{name}.csv")
+                seconds, peak_mb = run_measured(body.format(paths=paths, output=output))
+                print(f"{lines:>9} lines  {name:<10} {seconds:6.1f}s  {lines / seconds:8.0f} lines/sec  peak RSS {peak_mb:6.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 300_000, 1_000_000])
+    args = parser.parse_args()
+    run(args.sizes)
@@ -0,0 +1,68 @@
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from benchmarks.synthetic import make_catalogue
+from src import metrics
+from src.recommender import Recommender
+
+
+def per_call_ns(function, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def span_block():
+    with metrics.span("bench.span", rows=1):
+        pass
+
+
+def timer_block():
+    with metrics.timer("bench.timer"):
+        pass
+
+
+def count_call():
+    metrics.count("bench.count")
+
+
+def query_times(recommender, titles):
+    times = []
+    for title in titles:
+        start = time.perf_counter()
+        recommender.recommend_rows(title)
+        times.append((time.perf_counter() - start) * 1000)
+    return np.array(times)
+
+
+def run(calls, rows, queries):
+    df, embeddings = make_catalogue(rows)
+    recommender = Recommender(df, embeddings)
+    titles = df["title"].sample(queries, random_state=0).tolist()
+    recommender.recommend_rows(titles[0])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for state in ("off", "on"):
+            if state == "on":
+                metrics.configure(os.path.join(tmp, "metrics.jsonl"))
+            results[state] = ([per_call_ns(f, calls) for f in (span_block, timer_block, count_call)],
+                              query_times(recommender, titles))
+        metrics.disable()
+
+    print(f"Per call over {calls} calls, then recommend_rows on {rows} rows x {queries} queries:")
+    for state, ((span_ns, timer_ns, count_ns), times) in results.items():
+        print(f"    metrics {state:<3}  span {span_ns:7.0f}ns  timer {timer_ns:7.0f}ns  count {count_ns:6.0f}ns  "
+              f"recommend p50 {np.percentile(times, 50):7.2f}ms  p99 {np.percentile(times, 99):7.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200_000)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+    run(args.calls, args.rows, args.queries)
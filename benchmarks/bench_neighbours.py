@@ -0,0 +1,66 @@
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from benchmarks.common import run_measured
+from benchmarks.synthetic import make_catalogue
+from src.neighbours import load_neighbours
+from src.recommender import Recommender
+
+# Peak memory of one batch at a given block size, in a fresh interpreter
+BATCH = """
+import numpy as np
+from benchmarks.synthetic import make_catalogue
+from src.recommender import Recommender
+df, embeddings = make_catalogue({rows})
+recommender = Recommender(df, embeddings)
+recommender.neighbours_of(np.arange({queries}), 15, block_size={block_size})
+"""
+
+
+def run(rows, queries, block_sizes):
+    df, embeddings = make_catalogue(rows)
+    recommender = Recommender(df, embeddings)
+    idxs = np.random.default_rng(0).choice(rows, queries, replace=False)
+    titles = df['title'].to_numpy()[idxs]
+
+    start = time.perf_counter()
+    single = [recommender.recommend_rows(title, 15, exact=True) for title in titles]
+    single_time = time.perf_counter() - start
+    print(f"{rows} rows, {queries} queries:")
+    print(f"    one query at a time    {queries / single_time:8.0f} queries/sec")
+
+    # None is the default: as many queries per block as BATCH_MEMORY_BYTES allows
+    for block_size in [None] + block_sizes:
+        start = time.perf_counter()
+        ids, _ = recommender.neighbours_of(idxs, 15, block_size=block_size)
+        elapsed = time.perf_counter() - start
+        same = np.mean([list(row[row >= 0]) == expected for row, expected in zip(ids, single)])
+        _, peak = run_measured(BATCH.format(rows=rows, queries=queries, block_size=block_size))
+        print(f"    block_size={str(block_size):<9} {queries / elapsed:8.0f} queries/sec  peak {peak:6.0f} MB  "
+              f"identical to single queries {same:.1%}")
+
+    # What the detail view does once build_neighbours.py has run: one row of a memory-mapped table
+    with tempfile.TemporaryDirectory() as tmp:
+        ids_path, scores_path = os.path.join(tmp, "ids.npy"), os.path.join(tmp, "scores.npy")
+        table_ids = np.full((rows, 15), -1, dtype=np.int32)
+        table_ids[idxs] = ids
+        np.save(ids_path, table_ids)
+        np.save(scores_path, np.zeros((rows, 15), dtype=np.float32))
+        table = load_neighbours(ids_path, scores_path, rows, embeddings_path=os.path.join(tmp, "missing.npy"))
+        start = time.perf_counter()
+        for idx in idxs:
+            table.lookup(idx, 10)
+        lookup = (time.perf_counter() - start) / queries
+        del table
+    print(f"    table lookup           {lookup * 1e6:8.2f} us/query")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=1_000)
+    parser.add_argument('--block-sizes', type=int, nargs='+', default=[1, 8, 32, 128])
+    args = parser.parse_args()
+    run(args.rows, args.queries, args.block_sizes)
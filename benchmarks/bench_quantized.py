@@ -0,0 +1,81 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmarks.synthetic import write_catalogue
+from src.quantize import QuantizedEmbeddings, remove_quantized
+from src.recommender import Recommender
+
+# Memory of the app's recommender loaded from the on-disk store after answering some queries, in a fresh interpreter
+# pointed at the benchmark's data directory. Anonymous memory only: the memory-mapped store shows up as page cache,
+# which is shared and reclaimable (and on large-folio filesystems counts whole folios around each row touched).
+SERVE = """
+from src.dataset import Dataset
+from src.recommender import build_recommender
+recommender = build_recommender(Dataset.load())
+for title in {titles!r}:
+    recommender.recommend_rows(title)
+with open('/proc/self/status') as f:
+    print(next(line.split()[1] for line in f if line.startswith('RssAnon')))
+"""
+
+
+def serving_memory(titles):
+    out = subprocess.run([sys.executable, "-c", SERVE.format(titles=titles)], capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip())
+    return int(out.stdout.split()[-1]) / 1024
+
+
+def timed_queries(recommender, titles, top_n):
+    results, times = [], []
+    for title in titles:
+        start = time.perf_counter()
+        results.append(recommender.recommend_rows(title, top_n))
+        times.append((time.perf_counter() - start) * 1000)
+    return results, np.array(times)
+
+
+def recall(results, expected):
+    return np.mean([len(set(got) & set(want)) / max(len(want), 1) for got, want in zip(results, expected)])
+
+
+def run(rows, queries, rerank_factors, top_n):
+    with tempfile.TemporaryDirectory() as data_dir:
+        df, embeddings = write_catalogue(data_dir, rows, posters=False)
+        codes_path = os.path.join(data_dir, "embeddings_quantized.npy")
+        scales_path = os.path.join(data_dir, "embeddings_quantized_scales.npy")
+        titles = df["title"].sample(queries, random_state=0).tolist()
+        os.environ["RECOMMENDER_DATA_DIR"] = data_dir
+
+        exact = Recommender(df, embeddings)
+        expected, times = timed_queries(exact, titles, top_n)
+        anon = serving_memory(titles[:20])
+        print(f"{rows} rows, {queries} queries, top {top_n}; scanned = matrix read per query, anon = process memory:")
+        print(f"    {'float32 exact':<22} scanned {embeddings.nbytes / 2**20:7.1f} MB  anon {anon:6.0f} MB  "
+              f"p50 {np.percentile(times, 50):7.2f}ms  p99 {np.percentile(times, 99):7.2f}ms  recall@{top_n} 100.0%")
+
+        for kind in ("float16", "int8"):
+            quantized = QuantizedEmbeddings.quantize(embeddings, kind)
+            quantized.save(codes_path, scales_path)
+            anon = serving_memory(titles[:20])
+            for rerank in rerank_factors:
+                recommender = Recommender(df, embeddings, quantized=quantized, rerank=rerank)
+                results, times = timed_queries(recommender, titles, top_n)
+                print(f"    {f'{kind} rerank x{rerank}':<22} scanned {quantized.nbytes / 2**20:7.1f} MB  anon {anon:6.0f} MB  "
+                      f"p50 {np.percentile(times, 50):7.2f}ms  p99 {np.percentile(times, 99):7.2f}ms  "
+                      f"recall@{top_n} {recall(results, expected):6.1%}")
+        remove_quantized(codes_path, scales_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--rerank', type=int, nargs='+', default=[1, 4, 8], help="candidates re-scored per result")
+    parser.add_argument('--top-n', type=int, default=15)
+    args = parser.parse_args()
+    run(args.rows, args.queries, args.rerank, args.top_n)
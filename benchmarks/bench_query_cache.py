@@ -0,0 +1,83 @@
+import argparse
+import importlib.util
+import os
+import tempfile
+import time
+import numpy as np
+from benchmarks.synthetic import make_catalogue, stub_encode
+from src.embedder import encode_texts
+from src.query_cache import QueryEmbeddingCache
+from src.recommender import Recommender
+
+WORDS = ("space", "heist", "family", "comedy", "dark", "detective", "robot", "romance", "war", "island", "ghost",
+         "road", "trip", "school", "dragon", "murder", "small", "town", "time", "travel")
+
+
+def make_queries(count, seed=0):
+    # Distinct queries, so the first pass is all misses
+    rng = np.random.default_rng(seed)
+    queries = {}
+    while len(queries) < count:
+        queries.setdefault(" ".join(rng.choice(WORDS, rng.integers(2, 6))), None)
+    return list(queries)
+
+
+def near_repeat(query):
+    # How the same request tends to come back: different case and spacing
+    return "  " + query.upper().replace(" ", "   ") + " "
+
+
+def timed(cache, queries, expected_source):
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        _, source = cache.get(query)
+        times.append((time.perf_counter() - start) * 1000)
+        if source != expected_source:
+            raise AssertionError(f"{query!r} came from {source}, expected {expected_source}")
+    return np.array(times)
+
+
+def report(name, times):
+    print(f"    {name:<26} p50 {np.percentile(times, 50):9.3f}ms  p99 {np.percentile(times, 99):9.3f}ms")
+
+
+def run(queries, rows, stub):
+    if not stub and importlib.util.find_spec("sentence_transformers") is None:
+        print("sentence-transformers is not installed, using the stub encoder (uncached times exclude the model)")
+        stub = True
+    encode = stub_encode if stub else encode_texts
+    texts = make_queries(queries)
+    if not stub:
+        encode(["warm up"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "query_cache.sqlite")
+        cache = QueryEmbeddingCache(path, encode=encode)
+        print(f"{len(texts)} queries, {'stub' if stub else 'model'} encoder:")
+        report("uncached (encode)", timed(cache, texts, "encoded"))
+        report("memory hit", timed(cache, texts, "memory"))
+        report("memory hit, near repeat", timed(cache, [near_repeat(t) for t in texts], "memory"))
+        cache.close()
+
+        # A new session: the memory tier starts empty, the disk tier still has every query
+        cache = QueryEmbeddingCache(path, encode=encode)
+        report("disk hit (new session)", timed(cache, texts, "disk"))
+        cache.close()
+
+    df, embeddings = make_catalogue(rows)
+    recommender = Recommender(df, embeddings)
+    vector = encode(texts[:1])[0]
+    start = time.perf_counter()
+    for _ in range(20):
+        recommender.recommend_vector(vector)
+    print(f"    then scoring {rows} rows:      {(time.perf_counter() - start) / 20 * 1000:9.3f}ms per query")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--stub', action='store_true', help="use the offline stub encoder even if the model is installed")
+    args = parser.parse_args()
+    run(args.queries, args.rows, args.stub)
@@ -0,0 +1,108 @@
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+from src.config import MOVIE_GENRES
+from src.recommender import Recommender
+
+# The legacy path materialises an N x N float64 matrix, so it is only run where that fits in memory
+LEGACY_MAX_ROWS = 10_000
+
+
+def make_catalogue(rows, dim=384, seed=0):
+    rng = np.random.default_rng(seed)
+    genre_ids = np.array(list(MOVIE_GENRES))
+    genres = [json.dumps(rng.choice(genre_ids, size=rng.integers(1, 4), replace=False).tolist()) for _ in range(rows)]
+    embeddings = rng.standard_normal((rows, dim), dtype=np.float32)
+    return pd.DataFrame({
+        "title": [f"Title {i:07d}" for i in range(rows)],
+        "genre_ids": genres,
+        "embedding": list(embeddings),
+    })
+
+
+def legacy_get_recommendations(df, title, top_n=15):
+    embeddings = np.vstack(df['embedding'].values)
+    similarity_matrix = cosine_similarity(embeddings)
+
+    match = df[df['title'].str.lower().str.contains(title.lower())]
+    if match.empty:
+        return []
+
+    idx = match.index[0]
+    query_title = title.lower()
+    query_genres = set(json.loads(df.iloc[idx]['genre_ids']))
+
+    scores = []
+    for i in range(len(df)):
+        if i == idx:
+            continue
+        candidate_genres = set(json.loads(df.iloc[i]['genre_ids']))
+        genre_score = legacy_genre_score(query_genres, candidate_genres)
+        scores.append((i, 0.8 * similarity_matrix[idx][i] + 0.2 * genre_score))
+
+    scores = sorted(scores, key=lambda x: x[1], reverse=True)
+
+    filtered = []
+    for i, _ in scores:
+        candidate_title = df.iloc[i]['title'].lower()
+        if query_title in candidate_title or candidate_title in query_title:
+            continue
+        filtered.append(df.iloc[i]['title'])
+        if len(filtered) == top_n:
+            break
+    return filtered
+
+
+def legacy_genre_score(query_genres, candidate_genres):
+    return len(query_genres & candidate_genres) / len(query_genres | candidate_genres) if query_genres | candidate_genres else 0.0
+
+
+def check_genre_parity(recommender, df, queries, seed=0):
+    # The bitset Jaccard must reproduce the set formula bit for bit, for every row against a few query rows
+    sets = [set(json.loads(g)) for g in df['genre_ids']]
+    for idx in np.random.default_rng(seed).integers(0, len(df), queries):
+        expected = np.array([legacy_genre_score(sets[idx], candidate) for candidate in sets])
+        if not np.array_equal(recommender.genres.jaccard(idx), expected):
+            raise AssertionError(f"Genre Jaccard differs from the set formula for row {idx}")
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, queries):
+    for rows in sizes:
+        df = make_catalogue(rows)
+        titles = df['title'].sample(queries, random_state=rows).tolist()
+
+        recommender, build_time = timed(Recommender, df)
+        _, index_time = timed(lambda: recommender.title_index)
+        build_time += index_time
+        query_times = []
+        for title in titles:
+            _, elapsed = timed(recommender.recommend, title)
+            query_times.append(elapsed)
+        print(f"{rows:>9} rows  new: build {build_time:.3f}s, query mean {np.mean(query_times) * 1000:.2f}ms")
+        _, parity_time = timed(check_genre_parity, recommender, df, 3)
+        print(f"{rows:>9} rows  genre Jaccard matches the set formula exactly ({parity_time:.1f}s)")
+
+        if rows > LEGACY_MAX_ROWS:
+            print(f"{rows:>9} rows  legacy: skipped (N x N matrix needs {rows * rows * 8 / 1e9:.0f} GB)")
+            continue
+        for title in titles[:1]:
+            legacy, elapsed = timed(legacy_get_recommendations, df, title)
+            assert legacy == recommender.recommend(title), f"Ranking mismatch for {title}"
+            print(f"{rows:>9} rows  legacy: query {elapsed:.3f}s (rankings match)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+    run(args.sizes, args.queries)
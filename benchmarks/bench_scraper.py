@@ -0,0 +1,79 @@
+import argparse
+import json
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import tmdb_scraper
+
+
+class FakeTMDBHandler(BaseHTTPRequestHandler):
+    # Stand-in for /3/discover/{media_type}: fixed latency plus a server-side limit answered with 429s
+    latency = 0.05
+    server_rate = 40.0
+    _lock = threading.Lock()
+    _window = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        media_type = url.path.rstrip("/").rsplit("/", 1)[-1]
+        page = int(parse_qs(url.query).get("page", ["1"])[0])
+        with self._lock:
+            now = time.monotonic()
+            self._window[:] = [t for t in self._window if now - t < 1.0]
+            limited = len(self._window) >= self.server_rate
+            if not limited:
+                self._window.append(now)
+        if limited:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.end_headers()
+            return
+
+        time.sleep(self.latency)
+        body = json.dumps({"page": page, "results": [
+            {"id": page * 100 + i, "title": f"{media_type} {page}-{i}", "overview": "...", "genre_ids": [18]}
+            for i in range(20)
+        ]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(pages, rate, workers, server_rate):
+    FakeTMDBHandler.server_rate = server_rate
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTMDBHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/3/discover/"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = {}
+            for label, kwargs in (("cold", {"resume": False}), ("resumed", {"resume": True})):
+                start = time.perf_counter()
+                fetched = tmdb_scraper.scrape_tmdb("movie", pages, rate, workers, base_url=base_url, save_dir=tmp, **kwargs)
+                results[label] = (fetched, time.perf_counter() - start)
+            with open(f"{tmp}/tmdb_movie.jsonl", encoding="utf-8") as f:
+                rows = sum(1 for _ in f)
+    finally:
+        server.shutdown()
+
+    fetched, elapsed = results["cold"]
+    print(f"cold:    {fetched} pages in {elapsed:.1f}s = {fetched / elapsed:.1f} pages/sec "
+          f"(client rate {rate}/s, server limit {server_rate}/s, {workers} workers)")
+    print(f"resumed: {results['resumed'][0]} pages re-fetched, {rows} rows on disk")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=tmdb_scraper.DEFAULT_RATE)
+    parser.add_argument('--workers', type=int, default=tmdb_scraper.DEFAULT_WORKERS)
+    parser.add_argument('--server-rate', type=float, default=40.0)
+    args = parser.parse_args()
+    run(args.pages, args.rate, args.workers, args.server_rate)
@@ -0,0 +1,84 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.config import MOVIE_GENRES
+from src.search import TitleIndex, GenreBitmap
+
+FRAME_BUDGET_MS = 1000 / 60
+
+
+def make_titles(rows, vocabulary=20_000, seed=0):
+    # Titles of one to five words from a Zipf-ish vocabulary, so short prefixes are broad and long ones selective
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    words = ["".join(rng.choice(letters, rng.integers(2, 10))).title() for _ in range(vocabulary)]
+    weights = 1 / np.arange(1, vocabulary + 1)
+    picks = rng.choice(vocabulary, size=rows * 5, p=weights / weights.sum())
+    counts = rng.integers(1, 6, rows)
+    ends = np.cumsum(counts)
+    return [" ".join(words[w] for w in picks[end - count:end]) for count, end in zip(counts, ends)]
+
+
+def typing_session(titles, sessions, seed=1):
+    # Every prefix of some real titles, the way the search bar sees them
+    rng = np.random.default_rng(seed)
+    return [title[:i] for title in rng.choice(titles, sessions) for i in range(1, len(title) + 1)]
+
+
+def timed(search, queries):
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        times.append((time.perf_counter() - start) * 1000)
+    return np.array(times)
+
+
+def report(name, times):
+    print(f"    {name:<24} p50 {np.percentile(times, 50):8.2f}ms  p99 {np.percentile(times, 99):8.2f}ms  "
+          f"max {times.max():8.2f}ms  within frame {np.mean(times <= FRAME_BUDGET_MS):6.1%}")
+
+
+def run(rows, sessions, legacy_queries):
+    titles = make_titles(rows)
+    rng = np.random.default_rng(2)
+    genres = pd.Series([", ".join(rng.choice(list(MOVIE_GENRES.values()), rng.integers(1, 4), replace=False))
+                        for _ in range(rows)]).astype("category")
+
+    start = time.perf_counter()
+    index = TitleIndex(titles)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    bitmap = GenreBitmap(genres)
+    bitmap_build = time.perf_counter() - start
+    size_mb = (index.keys.nbytes + index.offsets.nbytes + index.postings.nbytes + index.lengths.nbytes) / 2**20
+    print(f"{rows} titles: index built in {build:.2f}s ({size_mb:.0f} MB of arrays), genre bitmap in {bitmap_build * 1000:.0f}ms")
+
+    queries = typing_session(titles, sessions)
+    movie_rows = np.arange(0, rows, 2)
+    report("index, cold", timed(index.search, queries))
+    report("index, warm", timed(index.search, queries))
+    report("index + rows + genre", timed(lambda q: bitmap.filter(index.search(q, movie_rows), "Drama"), queries))
+
+    # The old grid filter, on a sample since each query scans every title
+    frame = pd.DataFrame({"title": titles, "genres": genres})
+    sample = queries[::max(len(queries) // legacy_queries, 1)]
+    legacy = timed(lambda q: frame[frame["title"].str.lower().str.contains(q.lower(), na=False, regex=False)], sample)
+    report("legacy str.contains", legacy)
+
+    lowered = frame["title"].str.lower()
+    for query in sample:
+        expected = np.flatnonzero(lowered.str.contains(query.lower(), regex=False).to_numpy())
+        if not np.array_equal(index.search(query), expected):
+            raise AssertionError(f"index and str.contains disagree on {query!r}")
+    print(f"    {len(sample)} sampled queries match str.contains exactly")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--sessions', type=int, default=50, help="titles typed out one character at a time")
+    parser.add_argument('--legacy-queries', type=int, default=20)
+    args = parser.parse_args()
+    run(args.rows, args.sessions, args.legacy_queries)
@@ -0,0 +1,161 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+import numpy as np
+from benchmarks.synthetic import write_catalogue
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def connect(target):
+    if target.startswith("unix:"):
+        return UnixHTTPConnection(target[len("unix:"):])
+    url = urlsplit(target)
+    return http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+
+
+def request(target, method, path):
+    connection = connect(target)
+    try:
+        connection.request(method, path)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def wait_until_healthy(target, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            return request(target, "GET", "/health")[1]
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not become healthy in time")
+
+
+def load_test(target, queries, field, clients, total, top_n):
+    # `clients` threads issue `total` requests between them, each on a new connection like a one-shot backend call
+    latencies, errors = [], []
+    counter = iter(range(total))
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            path = "/recommend?" + urlencode({field: queries[i % len(queries)], "top_n": top_n})
+            start = time.perf_counter()
+            try:
+                status, _ = request(target, "GET", path)
+            except OSError as e:
+                status = repr(e)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if status != 200:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    print(f"    {clients:3d} clients  {total / elapsed:8.0f} requests/sec  p50 {np.percentile(latencies, 50):7.2f}ms  "
+          f"p99 {np.percentile(latencies, 99):7.2f}ms  max {latencies.max():7.2f}ms  errors {len(errors)}")
+
+
+def cold_cli(data_dir, title, runs):
+    # What each backend call cost before: a fresh `python -m src.cli` process per query
+    env = dict(os.environ, RECOMMENDER_DATA_DIR=data_dir)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "src.cli", "--title", title], env=env, capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+    return np.mean(times)
+
+
+def run(args):
+    process = None
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.target:
+            target = args.target
+            data_dir = None
+            with open(args.queries, encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()]
+        else:
+            # Synthetic catalogue served from a child process over a Unix socket
+            data_dir = os.path.join(tmp, "data")
+            df, _ = write_catalogue(data_dir, args.rows, posters=False)
+            queries = df["title"].sample(min(len(df), 10_000), random_state=0).tolist()
+            target = f"unix:{os.path.join(tmp, 'server.sock')}"
+            command = [sys.executable, "-m", "src.server", "--socket", target[len("unix:"):]]
+            if args.workers:
+                command += ["--workers", str(args.workers)]
+            process = subprocess.Popen(command, env=dict(os.environ, RECOMMENDER_DATA_DIR=data_dir),
+                                       stdout=subprocess.DEVNULL)
+
+        try:
+            start = time.perf_counter()
+            health = wait_until_healthy(target, process, args.startup_timeout)
+            print(f"{target}: {health['rows']} rows, ready after {time.perf_counter() - start:.1f}s "
+                  f"(ANN index {health['ann_index']}, neighbour table {health['neighbour_table']})")
+
+            load_test(target, queries, args.field, 1, min(args.requests, 200), args.top_n)  # warm-up
+            for clients in args.clients:
+                load_test(target, queries, args.field, clients, args.requests, args.top_n)
+
+            start = time.perf_counter()
+            status, health = request(target, "POST", "/reload")
+            print(f"    reload: status {status}, generation {health.get('generation')}, "
+                  f"{time.perf_counter() - start:.2f}s")
+
+            if data_dir is not None and args.cli_runs:
+                print(f"    cold src.cli process: {cold_cli(data_dir, queries[0], args.cli_runs):.2f}s per query")
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--target', help="running server, http://host:port or unix:/path (default: start one on synthetic data)")
+    parser.add_argument('--queries', help="with --target, a file of one query per line")
+    parser.add_argument('--field', choices=["title", "text"], default="title")
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=2_000)
+    parser.add_argument('--top-n', type=int, default=15)
+    parser.add_argument('--cli-runs', type=int, default=3)
+    parser.add_argument('--startup-timeout', type=float, default=600)
+    args = parser.parse_args()
+    if args.target and not args.queries:
+        parser.error("--target needs --queries")
+    run(args)
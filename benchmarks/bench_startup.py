@@ -0,0 +1,59 @@
+import argparse
+import re
+import subprocess
+import sys
+
+# Import-time cost of each entry point, measured the way `python -X importtime` reports it
+ENTRY_POINTS = {
+    "gui": "import gui.main, gui.window",
+    "cli": "import src.cli",
+    "recommender": "import src.recommender",
+}
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "sklearn", "transformers")
+
+CHECK_HEAVY = "import sys; {imports}; print(','.join(m for m in {heavy!r} if m in sys.modules))"
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_times(statement):
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1])
+    modules = []
+    for line in out.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent)))
+    return modules
+
+
+def run(entry_points, top):
+    for name in entry_points:
+        statement = ENTRY_POINTS.get(name)
+        if statement is None:
+            print(f"{name}: unknown entry point, expected one of {', '.join(ENTRY_POINTS)}")
+            continue
+        try:
+            modules = import_times(statement)
+        except RuntimeError as e:
+            print(f"{name}: import failed ({e})")
+            continue
+        total = sum(cumulative for _, _, cumulative, indent in modules if indent == 1)
+        heavy = subprocess.run([sys.executable, "-c", CHECK_HEAVY.format(imports=statement, heavy=HEAVY_MODULES)],
+                               capture_output=True, text=True).stdout.strip()
+        print(f"{name}: {total / 1000:.0f} ms total import time, heavy modules loaded: {heavy or 'none'}")
+        # Entry-point modules and what they import directly
+        shallow = [m for m in modules if m[3] <= 3]
+        for module, _, cumulative, indent in sorted(shallow, key=lambda m: -m[2])[:top]:
+            print(f"    {cumulative / 1000:8.1f} ms  {' ' * (indent - 1)}{module}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('entry_points', nargs='*', metavar='{' + ','.join(ENTRY_POINTS) + '}')
+    parser.add_argument('--top', type=int, default=8)
+    args = parser.parse_args()
+    run(args.entry_points or list(ENTRY_POINTS), args.top)
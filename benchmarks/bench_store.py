@@ -0,0 +1,71 @@
+import argparse
+import json
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.config import MOVIE_GENRES
+from migrate_embeddings import migrate
+from benchmarks.common import run_measured
+
+# Each loader runs in a fresh interpreter so load time and peak RSS are measured cold
+LOADERS = {
+    "legacy-csv": """
+import ast, numpy as np, pandas as pd
+df = pd.read_csv({metadata!r})
+df = df[df['embedding'].notnull()].reset_index(drop=True)
+df['embedding'] = df['embedding'].apply(lambda x: np.array(ast.literal_eval(x)) if isinstance(x, str) else x)
+""",
+    "npy-mmap": """
+from src.store import load_dataset
+df, embeddings = load_dataset({metadata!r}, {embeddings!r})
+""",
+    "npy-mmap+touch": """
+from src.store import load_dataset
+df, embeddings = load_dataset({metadata!r}, {embeddings!r})
+embeddings.sum()
+""",
+}
+
+
+def write_legacy_csv(path, rows, dim=384, seed=0):
+    rng = np.random.default_rng(seed)
+    genre_ids = list(MOVIE_GENRES)
+    embeddings = rng.standard_normal((rows, dim), dtype=np.float32)
+    embeddings /= np.sqrt(np.einsum('ij,ij->i', embeddings, embeddings))[:, None]
+    pd.DataFrame({
+        "id": np.arange(rows),
+        "title": [f"Title {i}" for i in range(rows)],
+        "media_type": "movie",
+        "genre_ids": [json.dumps(rng.choice(genre_ids, size=2, replace=False).tolist()) for _ in range(rows)],
+        "embedding": [json.dumps(v.tolist()) for v in embeddings],
+    }).to_csv(path, index=False)
+
+
+def measure(name, metadata, embeddings):
+    return run_measured(LOADERS[name].format(metadata=str(metadata), embeddings=str(embeddings)))
+
+
+def run(rows, dtype):
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = Path(tmp) / "legacy.csv"
+        metadata = Path(tmp) / "metadata.csv"
+        embeddings = Path(tmp) / "embeddings.npy"
+        write_legacy_csv(legacy, rows)
+        seconds, rss = measure("legacy-csv", legacy, embeddings)
+        print(f"{rows} rows  legacy-csv:     {seconds:.2f}s, peak RSS {rss:.0f} MB, file {legacy.stat().st_size / 1e6:.0f} MB")
+
+        metadata.write_bytes(legacy.read_bytes())
+        migrate(metadata, embeddings, dtype)
+        for name in ("npy-mmap", "npy-mmap+touch"):
+            seconds, rss = measure(name, metadata, embeddings)
+            print(f"{rows} rows  {name + ':':<16}{seconds:.2f}s, peak RSS {rss:.0f} MB, "
+                  f"files {(metadata.stat().st_size + embeddings.stat().st_size) / 1e6:.0f} MB ({dtype})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32')
+    args = parser.parse_args()
+    run(args.rows, args.dtype)
@@ -0,0 +1,88 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+# Per-poster decode cost: the old full decode + PNG round-trip, a cold thumbnail (decode, scale, write the disk cache)
+# and the two warm tiers (disk cache, in-memory LRU)
+SESSION = """
+import io
+import time
+import numpy as np
+from PIL import Image
+from PySide6.QtGui import QImage
+from PySide6.QtWidgets import QApplication
+app = QApplication([])
+from src.config import DATA_DIR
+from gui.thumbnails import load_thumbnail, get_thumbnail_cache, GRID_SIZE, DETAIL_SIZE
+
+paths = [f"images/bench/poster{{i}}.jpg" for i in range({count})]
+
+def legacy(rel_path, size):
+    with Image.open(DATA_DIR / rel_path) as img:
+        img = img.convert("RGBA")
+        img = img.resize(size, Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        return QImage.fromData(buffer.getvalue(), "PNG")
+
+def measure(name, load, size):
+    times = []
+    for rel_path in paths:
+        start = time.perf_counter()
+        load(rel_path, size)
+        times.append((time.perf_counter() - start) * 1000)
+    print("RESULT", name, f"{{size[0]}}x{{size[1]}}", np.mean(times), np.percentile(times, 95), flush=True)
+
+cache = get_thumbnail_cache()
+
+def memory(rel_path, size):
+    if cache.request(rel_path, size) is None:
+        while cache.get(rel_path, size) is None:
+            app.processEvents()
+
+for size in (GRID_SIZE, DETAIL_SIZE):
+    measure("legacy", legacy, size)
+    measure("cold", load_thumbnail, size)
+    measure("warm-disk", load_thumbnail, size)
+    for rel_path in paths:
+        memory(rel_path, size)
+    measure("warm-memory", cache.get, size)
+"""
+
+
+def write_posters(data_dir, count, width, height):
+    # Noise rather than flat colour so JPEG decoding costs what a real TMDB original does
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    directory = os.path.join(data_dir, "images", "bench")
+    os.makedirs(directory)
+    base = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+    for i in range(count):
+        tile = np.roll(base, i, axis=1).repeat(8, axis=0).repeat(8, axis=1)
+        Image.fromarray(tile).save(os.path.join(directory, f"poster{i}.jpg"), quality=90)
+
+
+def run(count, width, height):
+    with tempfile.TemporaryDirectory() as tmp:
+        write_posters(tmp, count, width, height)
+        env = dict(os.environ, RECOMMENDER_DATA_DIR=tmp, QT_QPA_PLATFORM="offscreen")
+        out = subprocess.run([sys.executable, "-c", SESSION.format(count=count)], capture_output=True, text=True, env=env)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip())
+    print(f"{count} posters at {width}x{height}:")
+    for line in out.stdout.splitlines():
+        if line.startswith("RESULT "):
+            _, name, size, mean, p95 = line.split()
+            print(f"    {size:<8} {name:<12} mean {float(mean):7.2f}ms  p95 {float(p95):7.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--width', type=int, default=2000)
+    parser.add_argument('--height', type=int, default=3000)
+    args = parser.parse_args()
+    run(args.count, args.width, args.height)
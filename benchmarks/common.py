@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+# VmHWM rather than ru_maxrss, which Linux carries over from the forking parent
+MEASURE = """
+import time
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+with open('/proc/self/status') as f:
+    peak_kb = next(line.split()[1] for line in f if line.startswith('VmHWM'))
+print(elapsed, peak_kb)
+"""
+
+
+def run_measured(body):
+    # Runs a snippet in a fresh interpreter and returns (seconds, peak RSS in MB), so caches and imports start cold
+    out = subprocess.run([sys.executable, "-c", MEASURE.format(body=body)], capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip())
+    seconds, peak_kb = out.stdout.split()[-2:]
+    return float(seconds), int(peak_kb) / 1024
+
+
+# Snippets fill `results`; peak RSS is added on the way out
+RESULTS = """
+import json
+results = {{}}
+{body}
+with open('/proc/self/status') as f:
+    results['peak_rss_mb'] = int(next(line.split()[1] for line in f if line.startswith('VmHWM'))) / 1024
+print('RESULT', json.dumps(results))
+"""
+
+
+def run_results(body, env=None):
+    # Like run_measured, for snippets that report several numbers; returns the `results` dict they filled
+    out = subprocess.run([sys.executable, "-c", RESULTS.format(body=body)], capture_output=True, text=True,
+                         env=None if env is None else {**os.environ, **env})
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip())
+    line = next(line for line in reversed(out.stdout.splitlines()) if line.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
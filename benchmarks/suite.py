@@ -0,0 +1,207 @@
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+import numpy as np
+from benchmarks.bench_merge import write_jsonl
+from benchmarks.common import run_results
+from benchmarks.synthetic import write_catalogue
+
+# The hot paths, each timed in a fresh interpreter pointed at a synthetic catalogue through RECOMMENDER_DATA_DIR.
+# Everything runs offline on the CPU: the embedding benchmark swaps the model for the stub encoder.
+ROOT = Path(__file__).resolve().parent.parent
+# Embedding throughput is per row, so large catalogues only encode a prefix
+EMBED_MAX_ROWS = 100_000
+# Relative change in the slower direction reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.10
+# Reported for context, not compared
+COUNTS = ("rows", "posters")
+
+SNIPPETS = {
+    "load": """
+import time
+from src.dataset import Dataset
+start = time.perf_counter()
+dataset = Dataset.load()
+results['load_s'] = time.perf_counter() - start
+dataset.title_index
+dataset.genre_bitmap
+dataset.genre_bitsets
+results['ready_s'] = time.perf_counter() - start
+""",
+    "recommend": """
+import time
+import numpy as np
+from src.dataset import get_dataset
+from src.recommender import get_recommendations
+df = get_dataset().df
+titles = df['title'].sample({queries}, random_state=0).tolist()
+start = time.perf_counter()
+get_recommendations(df, titles[0])
+results['first_query_s'] = time.perf_counter() - start
+times = []
+for title in titles:
+    start = time.perf_counter()
+    get_recommendations(df, title)
+    times.append(time.perf_counter() - start)
+times = np.array(times) * 1000
+results.update(p50_ms=np.percentile(times, 50), p95_ms=np.percentile(times, 95), p99_ms=np.percentile(times, 99),
+               queries_per_sec=len(times) / times.sum() * 1000)
+""",
+    "merge": """
+import time
+import merge_datasets
+start = time.perf_counter()
+merge_datasets.merge_jsonl({paths!r}, {output!r})
+elapsed = time.perf_counter() - start
+results.update(seconds=elapsed, lines_per_sec={lines} / elapsed)
+""",
+    "embed": """
+import time
+import pandas as pd
+from benchmarks.synthetic import StubModel
+from src import embedder
+from src.store import save_dataset
+embedder._model = StubModel()
+df = pd.read_csv({metadata!r}, nrows={rows}).drop(columns=['embedding_row'], errors='ignore')
+start = time.perf_counter()
+df = embedder.prepare_texts(df)
+hashes = embedder.content_hashes(df['combined_text'])
+prepared = time.perf_counter()
+embeddings = embedder.encode_texts(df['combined_text'].tolist())
+encoded = time.perf_counter()
+save_dataset(df, embeddings, {output!r} + '.csv', {output!r} + '.npy', hashes=hashes, hashes_path={output!r} + '_hashes.npy')
+saved = time.perf_counter()
+results.update(rows=len(df), prepare_s=prepared - start, encode_s=encoded - prepared, save_s=saved - encoded,
+               rows_per_sec=len(df) / (saved - start))
+""",
+    "grid": """
+import time
+import numpy as np
+from PySide6.QtWidgets import QApplication
+app = QApplication([])
+from gui.media_grid_view import MediaGridView
+from gui.thumbnails import get_thumbnail_cache
+start = time.perf_counter()
+view = MediaGridView('movie')
+view.resize(1280, 720)
+view.show()
+app.processEvents()
+results['first_paint_s'] = time.perf_counter() - start
+cache = get_thumbnail_cache()
+while cache.pending and time.perf_counter() - start < 60:
+    app.processEvents()
+    time.sleep(0.001)
+results['posters_loaded_s'] = time.perf_counter() - start
+results['posters'] = len(cache.pixmaps)
+bar = view.grid_view.verticalScrollBar()
+frames = []
+for _ in range(50):
+    frame = time.perf_counter()
+    bar.setValue(bar.value() + 240)
+    app.processEvents()
+    view.grid_view.viewport().repaint()
+    frames.append((time.perf_counter() - frame) * 1000)
+results.update(scroll_mean_ms=np.mean(frames), scroll_p95_ms=np.percentile(frames, 95))
+""",
+}
+
+
+def environment():
+    def git(*args):
+        out = subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() if out.returncode == 0 else None
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+            "cpus": os.cpu_count()}
+
+
+def run_benchmark(name, data_dir, tmp, rows, queries):
+    env = {"RECOMMENDER_DATA_DIR": data_dir, "PYTHONPATH": str(ROOT)}
+    if name == "load":
+        body = SNIPPETS["load"]
+    elif name == "recommend":
+        body = SNIPPETS["recommend"].format(queries=queries)
+    elif name == "merge":
+        paths = [os.path.join(tmp, "tmdb_movie.jsonl"), os.path.join(tmp, "tmdb_tv.jsonl")]
+        write_jsonl(paths[0], "movie", rows // 2)
+        write_jsonl(paths[1], "tv", rows - rows // 2, seed=1)
+        body = SNIPPETS["merge"].format(paths=paths, output=os.path.join(tmp, "merged.csv"), lines=rows)
+    elif name == "embed":
+        body = SNIPPETS["embed"].format(metadata=os.path.join(data_dir, "metadata_embeddings.csv"),
+                                        rows=min(rows, EMBED_MAX_ROWS), output=os.path.join(tmp, "embedded"))
+    elif name == "grid":
+        if importlib.util.find_spec("PySide6") is None:
+            return {"skipped": "PySide6 is not installed"}
+        env["QT_QPA_PLATFORM"] = "offscreen"
+        body = SNIPPETS["grid"]
+    else:
+        raise ValueError(f"unknown benchmark {name!r}, expected one of {', '.join(SNIPPETS)}")
+    return run_results(body, env)
+
+
+def run(sizes, names, queries):
+    report = {"environment": environment(), "results": {}}
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as data_dir, tempfile.TemporaryDirectory() as tmp:
+            print(f"{rows} rows: writing synthetic catalogue...", flush=True)
+            write_catalogue(data_dir, rows)
+            results = report["results"][str(rows)] = {}
+            for name in names:
+                results[name] = run_benchmark(name, data_dir, tmp, rows, queries)
+                print(f"    {name:<10} {format_results(results[name])}", flush=True)
+    return report
+
+
+def format_results(results):
+    return "  ".join(f"{key} {value:.4g}" if isinstance(value, float) else f"{key} {value}" for key, value in results.items())
+
+
+def higher_is_better(metric):
+    return metric.endswith("_per_sec")
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    # Every metric present in both reports, as the relative change and whether it moved the wrong way
+    print(f"Baseline {baseline['environment']['commit'] or 'unknown'}, current {current['environment']['commit'] or 'unknown'}:")
+    regressions = 0
+    for rows, benchmarks in current["results"].items():
+        for name, metrics in benchmarks.items():
+            before = baseline["results"].get(rows, {}).get(name, {})
+            for metric, value in metrics.items():
+                old = before.get(metric)
+                if metric in COUNTS or not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                    continue
+                change = value / old - 1
+                worse = -change if higher_is_better(metric) else change
+                flag = "REGRESSION" if worse > threshold else ""
+                regressions += bool(flag)
+                print(f"    {rows:>8} {name:<10} {metric:<18} {old:12.4g} -> {value:12.4g}  {change:+7.1%}  {flag}")
+    print(f"{regressions} regression(s) beyond {threshold:.0%}.")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmark suite on synthetic catalogues and write JSON")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000], help="catalogue sizes, 1k to 1M")
+    parser.add_argument('--only', nargs='+', choices=list(SNIPPETS), default=list(SNIPPETS))
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--output', help="write results as JSON, e.g. bench-$(git rev-parse --short HEAD).json")
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON from an earlier run; exits non-zero on regressions")
+    args = parser.parse_args()
+
+    report = run(args.rows, args.only, args.queries)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.output}.")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            sys.exit(1 if compare(json.load(f), report) else 0)
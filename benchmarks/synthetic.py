@@ -0,0 +1,123 @@
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from src.config import MOVIE_GENRES, TV_GENRES
+from src.embedder import genre_names
+
+EMBEDDING_DIM = 384
+POSTER_COUNT = 64
+OVERVIEW_WORDS = ("a", "the", "young", "old", "detective", "family", "journey", "across", "city", "war", "love",
+                  "secret", "island", "must", "find", "lost", "brother", "sister", "crew", "ship", "space",
+                  "small", "town", "haunted", "house", "heist", "school", "friends", "dark", "past", "future",
+                  "kingdom", "dragon", "robot", "murder", "mystery", "comedy", "road", "trip", "ghost")
+# Rows generated at a time, so a million-row catalogue never holds a second copy of the matrix
+BLOCK_ROWS = 65_536
+
+
+def random_genre_ids(rng, media_types):
+    # One to three distinct ids per row from the row's own genre map, as JSON like the scraper stores them
+    genre_ids = np.empty(len(media_types), dtype=object)
+    for media_type, genre_map in (("movie", MOVIE_GENRES), ("tv", TV_GENRES)):
+        rows = np.flatnonzero(media_types == media_type)
+        ids = np.array(list(genre_map))
+        # The first few columns of a random permutation per row are distinct draws
+        picks = ids[np.argsort(rng.random((len(rows), len(ids))), axis=1)[:, :3]]
+        counts = rng.integers(1, 4, len(rows))
+        genre_ids[rows] = [json.dumps(pick[:count].tolist()) for pick, count in zip(picks, counts)]
+    return genre_ids
+
+
+def random_overviews(rng, rows, min_words=8, max_words=40):
+    # Plain lists: joining numpy string rows is several times slower at a million rows
+    words = rng.integers(0, len(OVERVIEW_WORDS), (rows, max_words)).tolist()
+    lengths = rng.integers(min_words, max_words + 1, rows).tolist()
+    return [" ".join([OVERVIEW_WORDS[i] for i in row[:length]]).capitalize() + "." for row, length in zip(words, lengths)]
+
+
+def random_unit_vectors(rng, rows, dim=EMBEDDING_DIM):
+    embeddings = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, BLOCK_ROWS):
+        block = embeddings[start:start + BLOCK_ROWS]
+        rng.standard_normal(out=block, dtype=np.float32)
+        block /= np.sqrt(np.einsum('ij,ij->i', block, block))[:, None]
+    return embeddings
+
+
+def make_catalogue(rows, dim=EMBEDDING_DIM, seed=0):
+    # metadata_embeddings.csv-shaped frame plus a matching unit-length embedding matrix
+    rng = np.random.default_rng(seed)
+    media_types = np.where(np.arange(rows) % 2 == 0, "movie", "tv")
+    genre_ids = random_genre_ids(rng, media_types)
+    df = pd.DataFrame({
+        "id": np.arange(rows),
+        "title": [f"{media_type.title()} title {i:07d}" for i, media_type in enumerate(media_types)],
+        "overview": random_overviews(rng, rows),
+        "release_date": [f"{year}-{month:02d}-01" for year, month in zip(rng.integers(1950, 2025, rows), rng.integers(1, 13, rows))],
+        "genre_ids": genre_ids,
+        "popularity": rng.gamma(2.0, 20.0, rows).round(3),
+        "vote_average": rng.uniform(1, 10, rows).round(1),
+        "vote_count": rng.integers(0, 20_000, rows),
+        "poster_path": [f"images/synthetic/poster{i % POSTER_COUNT}.jpg" for i in range(rows)],
+        "backdrop_path": "",
+        "media_type": media_types,
+    })
+    df["genres"] = genre_names(df)
+    return df, random_unit_vectors(rng, rows, dim)
+
+
+def stub_encode(texts, dim=EMBEDDING_DIM):
+    # Stands in for the sentence-transformers model offline: a unit vector seeded by each text, so equal texts agree
+    vectors = np.empty((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vectors[i] = np.random.default_rng(seed).standard_normal(dim, dtype=np.float32)
+    vectors /= np.sqrt(np.einsum('ij,ij->i', vectors, vectors))[:, None]
+    return vectors
+
+
+class StubModel:
+    # The two SentenceTransformer methods src.embedder uses, backed by stub_encode, for offline embedding runs
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        return stub_encode(texts, self.dim)
+
+
+def write_posters(data_dir, count=POSTER_COUNT):
+    from PIL import Image
+    directory = os.path.join(data_dir, "images", "synthetic")
+    os.makedirs(directory, exist_ok=True)
+    for i in range(count):
+        path = os.path.join(directory, f"poster{i}.jpg")
+        if not os.path.exists(path):
+            Image.new("RGB", (500, 750), (i * 4 % 256, 90, 160)).save(path, quality=85)
+
+
+def write_catalogue(data_dir, rows, seed=0, posters=True):
+    # Writes the binary store layout the application loads, pointed at by RECOMMENDER_DATA_DIR
+    from src.store import save_dataset
+    os.makedirs(data_dir, exist_ok=True)
+    df, embeddings = make_catalogue(rows, seed=seed)
+    save_dataset(df, embeddings, os.path.join(data_dir, "metadata_embeddings.csv"), os.path.join(data_dir, "embeddings.npy"),
+                 hashes_path=os.path.join(data_dir, "embedding_hashes.npy"))
+    if posters:
+        write_posters(data_dir)
+    return df, embeddings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic catalogue; point the app at it with RECOMMENDER_DATA_DIR")
+    parser.add_argument('data_dir')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-posters', action='store_true')
+    args = parser.parse_args()
+    write_catalogue(args.data_dir, args.rows, args.seed, posters=not args.no_posters)
+    print(f"Wrote {args.rows} rows to {args.data_dir}.")
@@ -0,0 +1,24 @@
+import argparse
+import time
+from src.ann import IVFIndex
+from src.config import ANN_INDEX_PATH
+from src.recommender import normalize_rows
+from src.store import load_dataset
+
+def build(n_lists=None, iterations=10):
+    df, embeddings = load_dataset()
+    start = time.perf_counter()
+    index = IVFIndex.build(normalize_rows(embeddings), n_lists=n_lists, iterations=iterations)
+    index.save(ANN_INDEX_PATH)
+    print(f"Indexed {index.n_rows} rows into {index.n_lists} lists in {time.perf_counter() - start:.1f}s.")
+    return index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lists', type=int, default=None, help="number of k-means lists (default 4 * sqrt(rows))")
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    print("Building ANN index...")
+    build(args.lists, args.iterations)
+    print(f"Done. Index saved to {ANN_INDEX_PATH}.")
@@ -0,0 +1,19 @@
+import argparse
+import time
+from src.catalogue import build_catalogue, BUILD_CHUNK_ROWS
+from src.config import CATALOGUE_PATH
+
+def build(chunk_rows=BUILD_CHUNK_ROWS):
+    start = time.perf_counter()
+    n_rows = build_catalogue(chunk_rows=chunk_rows)
+    print(f"Catalogued {n_rows} rows in {time.perf_counter() - start:.1f}s.")
+    return n_rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the on-disk catalogue the grid pages through")
+    parser.add_argument('--chunk-rows', type=int, default=BUILD_CHUNK_ROWS, help="metadata rows read per batch")
+    args = parser.parse_args()
+
+    print("Building catalogue...")
+    build(args.chunk_rows)
+    print(f"Done. Catalogue saved to {CATALOGUE_PATH}.")
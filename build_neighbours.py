@@ -0,0 +1,64 @@
+import argparse
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from src.config import NEIGHBOUR_IDS_PATH, NEIGHBOUR_SCORES_PATH
+from src.dataset import get_dataset
+from src.neighbours import create_table, publish_table
+from src.recommender import Recommender
+
+DEFAULT_NEIGHBOURS = 15
+SHARD_ROWS = 4096
+
+_worker = None
+
+def init_worker(tmp_paths, top_n):
+    # Each process builds its own recommender over the memory-mapped store and opens the output table in place
+    global _worker
+    dataset = get_dataset()
+    recommender = Recommender(dataset.df, dataset.embeddings, genres=dataset.genre_bitsets)
+    ids = np.load(tmp_paths[0], mmap_mode="r+")
+    scores = np.load(tmp_paths[1], mmap_mode="r+")
+    _worker = (recommender, ids, scores, top_n)
+
+def build_shard(row_range):
+    # Fills rows [start, stop) of the table; ranges never overlap, so workers write without coordination
+    recommender, ids, scores, top_n = _worker
+    start, stop = row_range
+    ids[start:stop], scores[start:stop] = recommender.neighbours_of(np.arange(start, stop), top_n)
+    ids.flush()
+    scores.flush()
+    return stop - start
+
+def build(top_n=DEFAULT_NEIGHBOURS, workers=1, shard_rows=SHARD_ROWS):
+    n_rows = len(get_dataset())
+    tmp_paths = create_table(n_rows, top_n)
+    shards = [(start, min(start + shard_rows, n_rows)) for start in range(0, n_rows, shard_rows)]
+
+    start = time.perf_counter()
+    done = 0
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(tmp_paths, top_n)) as pool:
+            for count in pool.map(build_shard, shards):
+                done += count
+                print(f"{done}/{n_rows} rows ({done / (time.perf_counter() - start):.0f} queries/sec)")
+    else:
+        init_worker(tmp_paths, top_n)
+        for shard in shards:
+            done += build_shard(shard)
+            print(f"{done}/{n_rows} rows ({done / (time.perf_counter() - start):.0f} queries/sec)")
+    publish_table(tmp_paths)
+
+    elapsed = time.perf_counter() - start
+    print(f"Computed top {top_n} neighbours of {n_rows} rows in {elapsed:.1f}s ({n_rows / elapsed if elapsed else 0:.0f} queries/sec).")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--top-n', type=int, default=DEFAULT_NEIGHBOURS)
+    parser.add_argument('--workers', type=int, default=1, help="processes, each taking row-range shards")
+    parser.add_argument('--shard-rows', type=int, default=SHARD_ROWS)
+    args = parser.parse_args()
+
+    print("Building neighbour table...")
+    build(args.top_n, args.workers, args.shard_rows)
+    print(f"Done. Table saved to {NEIGHBOUR_IDS_PATH} and {NEIGHBOUR_SCORES_PATH}.")
@@ -1,16 +1,246 @@
-﻿import pandas as pd
+﻿import argparse
 import json
-from src.embedder import add_embeddings
-from src.config import METADATA_PATH
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from src.embedder import prepare_texts, encode_texts, content_hashes, get_model, MODEL_NAME, DEFAULT_BATCH_SIZE
+from src.config import (METADATA_PATH, EMBEDDINGS_PATH, EMBEDDING_HASHES_PATH, EMBED_CHECKPOINT_PATH, ANN_INDEX_PATH,
+                        CATALOGUE_PATH)
+from src.store import NpyAppender, load_embeddings, load_hashes, EMBEDDING_DTYPES
+from build_ann_index import build as build_ann_index
+from build_catalogue import build as build_catalogue
+from src import metrics
 
-print("Loading metadata...")
-df = pd.read_csv(METADATA_PATH)
+# Metadata rows read, embedded and written per step; progress is saved after each one
+DEFAULT_CHUNK_ROWS = 10_000
+# Output is written beside the files it replaces and only moved into place once every chunk is done
+PARTIAL_EMBEDDINGS_PATH = f"{EMBEDDINGS_PATH}.partial"
+PARTIAL_HASHES_PATH = f"{EMBEDDING_HASHES_PATH}.partial"
+PARTIAL_METADATA_PATH = f"{METADATA_PATH}.partial"
+HASH_DTYPE = "<U32"
 
-print("Generating embeddings...")
-df = add_embeddings(df)
+def load_previous_vectors():
+    hashes = load_hashes()
+    if hashes is None or not os.path.exists(EMBEDDINGS_PATH):
+        return {}, None
+    embeddings = load_embeddings()
+    if len(embeddings) != len(hashes):
+        print("Stored hashes do not match the embedding store, re-encoding everything.")
+        return {}, None
+    return {h: row for row, h in enumerate(hashes)}, embeddings
 
-print("Saving updated metadata...")
-df['embedding'] = df['embedding'].apply(json.dumps)
-df.to_csv(METADATA_PATH, index=False)
+class Encoder:
+    # Encodes chunk after chunk; with several workers the processes start on the first encode and serve every chunk
+    def __init__(self, batch_size, workers):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.pool = None
 
-print("Done. Embeddings refreshed and saved.")
\ No newline at end of file
+    def __call__(self, texts):
+        if self.workers > 1 and self.pool is None and len(texts) > self.batch_size:
+            self.pool = get_model().start_multi_process_pool(target_devices=['cpu'] * self.workers)
+        return encode_texts(texts, self.batch_size, self.workers, pool=self.pool)
+
+    def close(self):
+        if self.pool is not None:
+            get_model().stop_multi_process_pool(self.pool)
+            self.pool = None
+
+def job_settings(args):
+    # A checkpoint is only resumed by a run that would produce the same output from the same metadata
+    stat = os.stat(METADATA_PATH)
+    return {"source": [stat.st_size, stat.st_mtime_ns], "model": MODEL_NAME, "dtype": args.dtype,
+            "chunk_rows": args.chunk_rows, "incremental": args.incremental}
+
+def new_checkpoint(settings, total_rows):
+    # rows_read counts metadata rows consumed, rows the embedded rows written so far
+    return {"settings": settings, "total_rows": total_rows, "chunks": 0, "rows_read": 0, "rows": 0, "dim": None,
+            "columns": None, "metadata_bytes": 0, "finished": False}
+
+def save_checkpoint(checkpoint):
+    tmp_path = f"{EMBED_CHECKPOINT_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, EMBED_CHECKPOINT_PATH)
+
+def partial_sizes(checkpoint, dtype):
+    # The least each output file must hold for the checkpoint to be resumed
+    sizes = {PARTIAL_METADATA_PATH: checkpoint["metadata_bytes"]}
+    if checkpoint["rows"]:
+        sizes[PARTIAL_HASHES_PATH] = NpyAppender.size(HASH_DTYPE, (), checkpoint["rows"])
+        sizes[PARTIAL_EMBEDDINGS_PATH] = NpyAppender.size(dtype, (checkpoint["dim"],), checkpoint["rows"])
+    return sizes
+
+def load_checkpoint(settings):
+    if not os.path.exists(EMBED_CHECKPOINT_PATH):
+        return None
+    with open(EMBED_CHECKPOINT_PATH, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("settings") != settings:
+        print("Saved progress is for different metadata or options, starting over.")
+        return None
+    # Once finishing has started some output may already be in place, which finish() allows for
+    if not checkpoint["finished"] and any(not os.path.exists(path) or os.path.getsize(path) < size
+                                          for path, size in partial_sizes(checkpoint, EMBEDDING_DTYPES[settings["dtype"]]).items()):
+        print("Saved progress is missing output files, starting over.")
+        return None
+    return checkpoint
+
+def count_rows(chunk_rows):
+    # Only the first column is kept, but quoted newlines in overviews mean the file still has to be parsed
+    return sum(len(chunk) for chunk in pd.read_csv(METADATA_PATH, usecols=[0], chunksize=chunk_rows))
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+def report_progress(checkpoint, rows_this_run, elapsed):
+    # Rows per second as measured in this run, so a resumed job does not count rows it never processed
+    done, total = checkpoint["rows_read"], checkpoint["total_rows"]
+    rate = rows_this_run / elapsed if elapsed > 0 else 0
+    eta = format_duration((total - done) / rate) if rate else "unknown"
+    print(f"{done}/{total} rows ({done / max(total, 1):.0%}), {rate:.0f} rows/sec, ETA {eta}", flush=True)
+
+def embed_chunks(checkpoint, args):
+    # Reads the metadata a chunk at a time and appends each chunk's rows, vectors and hashes to the partial output.
+    # The checkpoint is saved only after the chunk is on disk, so a stopped run loses at most the chunk in progress.
+    dtype = EMBEDDING_DTYPES[args.dtype]
+    previous_rows, previous = load_previous_vectors() if args.incremental else ({}, None)
+    encoder = Encoder(args.batch_size, args.workers)
+    hashes_out = NpyAppender(PARTIAL_HASHES_PATH, HASH_DTYPE, rows=checkpoint["rows"])
+    embeddings_out = None
+    if checkpoint["dim"] is not None:
+        embeddings_out = NpyAppender(PARTIAL_EMBEDDINGS_PATH, dtype, (checkpoint["dim"],), checkpoint["rows"])
+    metadata_out = open(PARTIAL_METADATA_PATH, "r+b" if checkpoint["metadata_bytes"] else "w+b")
+    metadata_out.truncate(checkpoint["metadata_bytes"])
+    metadata_out.seek(0, os.SEEK_END)
+
+    start = time.perf_counter()
+    rows_this_run = 0
+    try:
+        for index, chunk in enumerate(pd.read_csv(METADATA_PATH, chunksize=args.chunk_rows)):
+            if index < checkpoint["chunks"]:
+                # Embedded by an earlier run
+                continue
+            rows_read = len(chunk)
+            with metrics.span("embed.chunk", index=index, rows=rows_read) as span:
+                chunk = prepare_texts(chunk.drop(columns=['embedding', 'embedding_row'], errors='ignore'))
+                hashes = content_hashes(chunk['combined_text'])
+                reuse = np.array([previous_rows.get(h, -1) for h in hashes], dtype=np.int64)
+                changed = np.flatnonzero(reuse < 0)
+                metrics.count("embed.rows_reused", len(chunk) - len(changed))
+                span.add(encoded=len(changed))
+
+                # Nothing changed means the model (and torch) is never loaded
+                encoded = encoder(chunk['combined_text'].iloc[changed].tolist()) if len(changed) else None
+                if len(chunk):
+                    dim = encoded.shape[1] if encoded is not None else previous.shape[1]
+                    vectors = np.empty((len(chunk), dim), dtype=np.float32)
+                    kept = np.flatnonzero(reuse >= 0)
+                    if len(kept):
+                        vectors[kept] = previous[reuse[kept]]
+                    if encoded is not None:
+                        vectors[changed] = encoded
+
+                    if embeddings_out is None:
+                        embeddings_out = NpyAppender(PARTIAL_EMBEDDINGS_PATH, dtype, (dim,))
+                        checkpoint["dim"] = dim
+                    # Row i of the matrix belongs to the metadata row whose embedding_row is i
+                    chunk['embedding_row'] = np.arange(checkpoint["rows"], checkpoint["rows"] + len(chunk))
+                    header = checkpoint["columns"] is None
+                    if header:
+                        checkpoint["columns"] = list(chunk.columns)
+                    chunk.reindex(columns=checkpoint["columns"]).to_csv(metadata_out, header=header, index=False,
+                                                                         encoding="utf-8")
+                    embeddings_out.append(vectors)
+                    hashes_out.append(np.asarray(hashes, dtype=HASH_DTYPE))
+
+                for out in (embeddings_out, hashes_out):
+                    if out is not None:
+                        out.sync()
+                metadata_out.flush()
+                os.fsync(metadata_out.fileno())
+                checkpoint.update(chunks=index + 1, rows_read=checkpoint["rows_read"] + rows_read,
+                                  rows=hashes_out.rows, metadata_bytes=metadata_out.tell())
+                save_checkpoint(checkpoint)
+
+            rows_this_run += rows_read
+            report_progress(checkpoint, rows_this_run, time.perf_counter() - start)
+    finally:
+        encoder.close()
+        metadata_out.close()
+        hashes_out.close()
+        if embeddings_out is not None:
+            embeddings_out.close()
+
+def finish(checkpoint, dtype):
+    # Moves the output into place. The metadata goes last: until it is replaced the checkpoint still matches it,
+    # so a run stopped part way through here picks up from the first file not yet moved.
+    checkpoint["finished"] = True
+    save_checkpoint(checkpoint)
+    if os.path.exists(PARTIAL_EMBEDDINGS_PATH):
+        NpyAppender(PARTIAL_EMBEDDINGS_PATH, dtype, (checkpoint["dim"],), checkpoint["rows"]).finish(EMBEDDINGS_PATH)
+    if os.path.exists(PARTIAL_HASHES_PATH):
+        NpyAppender(PARTIAL_HASHES_PATH, HASH_DTYPE, rows=checkpoint["rows"]).finish(EMBEDDING_HASHES_PATH)
+    os.replace(PARTIAL_METADATA_PATH, METADATA_PATH)
+    os.remove(EMBED_CHECKPOINT_PATH)
+
+# Encode workers are spawned processes that re-import this module, so the job must stay under main()
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dtype', choices=list(EMBEDDING_DTYPES), default='float32')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=1, help="CPU encode processes")
+    parser.add_argument('--incremental', action='store_true', help="only encode rows whose text or model changed")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help="metadata rows embedded and saved per step")
+    parser.add_argument('--restart', action='store_true', help="ignore saved progress from an interrupted run")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_from_args(args)
+
+    settings = job_settings(args)
+    checkpoint = None if args.restart else load_checkpoint(settings)
+    if checkpoint is None:
+        print("Counting metadata rows...")
+        with metrics.span("embed.count_rows") as span:
+            checkpoint = new_checkpoint(settings, count_rows(args.chunk_rows))
+            span.add(rows=checkpoint["total_rows"])
+    elif not checkpoint["finished"]:
+        print(f"Resuming after {checkpoint['rows_read']}/{checkpoint['total_rows']} rows.")
+
+    if not checkpoint["finished"]:
+        print("Generating embeddings...")
+        try:
+            embed_chunks(checkpoint, args)
+        except KeyboardInterrupt:
+            sys.exit(f"Stopped after {checkpoint['rows_read']}/{checkpoint['total_rows']} rows; "
+                     f"rerun fix_embeddings.py with the same options to resume.")
+        if not checkpoint["rows"]:
+            os.remove(EMBED_CHECKPOINT_PATH)
+            sys.exit("No metadata rows have an overview to embed; nothing was saved.")
+
+    print("Saving updated metadata...")
+    with metrics.span("embed.save", rows=checkpoint["rows"]):
+        finish(checkpoint, EMBEDDING_DTYPES[args.dtype])
+
+    if os.path.exists(ANN_INDEX_PATH):
+        # An index over the old vectors would silently return the wrong neighbours
+        print("Rebuilding ANN index...")
+        with metrics.span("embed.ann_index"):
+            build_ann_index()
+    if os.path.exists(CATALOGUE_PATH):
+        # Rows without an overview were dropped, so the catalogue's row numbers are out of date
+        print("Rebuilding catalogue...")
+        with metrics.span("embed.catalogue"):
+            build_catalogue()
+
+    print("Done. Embeddings refreshed and saved.")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
-﻿import sys
+﻿import argparse
+import sys
 from PySide6.QtWidgets import QApplication
+from src import metrics
 from gui.window import MovieRecommenderGUI
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(add_help=False)
+    metrics.add_arguments(parser)
+    # Everything else is left for Qt (-style, -platform, ...)
+    args, qt_args = parser.parse_known_args()
+    metrics.configure_from_args(args)
+    app = QApplication([sys.argv[0]] + qt_args)
     window = MovieRecommenderGUI()
     window.show()
     sys.exit(app.exec())
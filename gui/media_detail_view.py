@@ -1,12 +1,88 @@
-﻿from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout, QPushButton, QHBoxLayout, QSizePolicy, QGridLayout, QScrollArea
-from PySide6.QtGui import QPixmap, QIcon
-from PySide6.QtCore import Qt, Signal
+﻿from PySide6.QtWidgets import (QWidget, QLabel, QVBoxLayout, QPushButton, QHBoxLayout, QSizePolicy, QGridLayout, QScrollArea,
+                               QComboBox, QSpinBox)
+from PySide6.QtGui import QIcon
+from PySide6.QtCore import Qt, Signal, QThreadPool, QRunnable, QObject, Slot, QTimer
 from pathlib import Path
-import pandas as pd
-from src.config import METADATA_PATH
-from src.recommender import get_recommendations, get_cached_dataset
+import atexit
+from src import metrics
+from src.filters import RecommendationFilter, GENRE_NAME_IDS
+from src.recommender import get_cached_recommender, get_cached_dataset
+from gui.thumbnails import get_thumbnail_cache, normalize_path, GRID_SIZE, DETAIL_SIZE
 
-PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SIMILAR_COUNT = 10
+SIMILAR_COLUMNS = 5
+MEDIA_CHOICES = {"Any type": None, "Movies": "movie", "TV shows": "tv"}
+ALL_GENRES = "All Genres"
+# Spin box minimums shown as "any"
+ANY_YEAR = 1900
+FILTER_DEBOUNCE_MS = 400
+
+class RecommendationSignal(QObject):
+    finished = Signal(int, object)
+
+class RecommendationLoader(QRunnable):
+    def __init__(self, request_id, row, top_n, signal, filters=None):
+        super().__init__()
+        self.request_id = request_id
+        self.row = row
+        self.top_n = top_n
+        self.signal = signal
+        self.filters = filters
+
+    @Slot()
+    def run(self):
+        try:
+            # A neighbour table, when one has been built, turns this into a single row lookup
+            with metrics.timer("detail.recommendations"), metrics.profile("recommend"):
+                rows = get_cached_recommender().recommend_row(self.row, self.top_n, filters=self.filters)
+                items = get_cached_dataset().iloc[rows].to_dict(orient="records")
+            # Each similar title carries its row, so opening it asks for that row's recommendations in turn
+            for row, item in zip(rows, items):
+                item["row"] = row
+        except Exception as e:
+            print(f"Failed to get recommendations for row {self.row}: {e}")
+            items = []
+        self.signal.finished.emit(self.request_id, items)
+
+class RecommendationService(QObject):
+    # Recommendations run on a single worker thread. A new request drops whatever is still queued, and a
+    # result for an older request is discarded, so only the detail view currently shown is ever filled in.
+    ready = Signal(int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.current = 0
+        # The last filter chosen, so it carries over as the user moves from one title to a similar one
+        self.filters = RecommendationFilter()
+        self.threadpool = QThreadPool()
+        self.threadpool.setMaxThreadCount(1)
+        self.signal = RecommendationSignal()
+        self.signal.finished.connect(self.on_finished)
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        self.threadpool.clear()
+        self.threadpool.waitForDone()
+
+    def request(self, row, top_n=SIMILAR_COUNT, filters=None):
+        self.current += 1
+        if filters is not None:
+            self.filters = filters
+        self.threadpool.clear()
+        self.threadpool.start(RecommendationLoader(self.current, row, top_n, self.signal, self.filters))
+        return self.current
+
+    def on_finished(self, request_id, items):
+        if request_id == self.current:
+            self.ready.emit(request_id, items)
+
+_service = None
+
+def get_recommendation_service():
+    global _service
+    if _service is None:
+        _service = RecommendationService()
+    return _service
 
 class MediaDetailView(QWidget):
     back_clicked = Signal()
@@ -15,6 +91,9 @@ class MediaDetailView(QWidget):
     def __init__(self, metadata: dict, parent=None):
         super().__init__(parent)
         self.metadata = metadata
+        self.poster_labels = {}
+        self.thumbnails = get_thumbnail_cache()
+        self.thumbnails.loaded.connect(self.on_thumbnail_loaded)
 
         main_layout = QVBoxLayout(self)
 
@@ -37,12 +116,7 @@ class MediaDetailView(QWidget):
         image_label = QLabel()
         image_label.setAlignment(Qt.AlignmentFlag.AlignTop)
         if "poster_path" in metadata:
-            poster_path = Path(metadata["poster_path"].strip().lstrip("/\\"))
-            img_path = PROJECT_ROOT / "data" / poster_path
-            if img_path.exists():
-                pixmap = QPixmap(str(img_path))
-                if not pixmap.isNull():
-                    image_label.setPixmap(pixmap.scaled(240, 360, Qt.AspectRatioMode.KeepAspectRatio))
+            self.show_poster(image_label, metadata["poster_path"], DETAIL_SIZE)
         layout.addWidget(image_label)
 
         info_layout = QVBoxLayout()
@@ -59,23 +133,92 @@ class MediaDetailView(QWidget):
         layout.addLayout(info_layout)
         main_layout.addLayout(layout)
 
-        # Similar items section
-        similar_label = QLabel("<b>Similar:</b>")
-        main_layout.addWidget(similar_label)
+        # Similar items section, with filters applied before the catalogue is scored
+        self.recommendations = get_recommendation_service()
+        filters = self.recommendations.filters
+        similar_bar = QHBoxLayout()
+        similar_bar.addWidget(QLabel("<b>Similar:</b>"))
+        similar_bar.addStretch()
+
+        self.media_filter = QComboBox()
+        self.media_filter.addItems(list(MEDIA_CHOICES))
+        self.media_filter.setCurrentText(next(k for k, v in MEDIA_CHOICES.items() if v == filters.media_type))
+        self.genre_filter = QComboBox()
+        self.genre_filter.addItems([ALL_GENRES] + sorted(GENRE_NAME_IDS))
+        self.genre_filter.setCurrentText(filters.genre or ALL_GENRES)
+        self.year_filter = QSpinBox()
+        self.year_filter.setRange(ANY_YEAR, 2100)
+        self.year_filter.setSpecialValueText("Any year")
+        self.year_filter.setPrefix("From ")
+        self.year_filter.setValue(int(filters.released_after) if filters.released_after else ANY_YEAR)
+        self.votes_filter = QSpinBox()
+        self.votes_filter.setRange(0, 1_000_000)
+        self.votes_filter.setSingleStep(100)
+        self.votes_filter.setSpecialValueText("Any votes")
+        self.votes_filter.setPrefix("\u2265 ")
+        self.votes_filter.setSuffix(" votes")
+        self.votes_filter.setValue(filters.min_vote_count or 0)
+        for widget in (self.media_filter, self.genre_filter, self.year_filter, self.votes_filter):
+            similar_bar.addWidget(widget)
+        self.media_filter.currentTextChanged.connect(self.request_recommendations)
+        self.genre_filter.currentTextChanged.connect(self.request_recommendations)
+        # Spin boxes report every keystroke and arrow step, so they only re-query once editing pauses
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DEBOUNCE_MS)
+        self.filter_timer.timeout.connect(self.request_recommendations)
+        # valueChanged(int) would otherwise be taken as the timer's interval in milliseconds
+        self.year_filter.valueChanged.connect(lambda _: self.filter_timer.start())
+        self.votes_filter.valueChanged.connect(lambda _: self.filter_timer.start())
+        main_layout.addLayout(similar_bar)
 
         scroll = QScrollArea()
         scroll.setWidgetResizable(True)
         scroll_widget = QWidget()
         scroll.setWidget(scroll_widget)
-        grid = QGridLayout(scroll_widget)
+        self.similar_grid = QGridLayout(scroll_widget)
+        self.loading_label = QLabel("Loading...")
+        self.similar_grid.addWidget(self.loading_label, 0, 0)
+
+        main_layout.addWidget(scroll)
+        self.setLayout(main_layout)
+
+        # The view is shown with metadata and poster straight away; the similar items follow from the worker
+        self.recommendations.ready.connect(self.on_recommendations)
+        self.request_id = self.recommendations.request(metadata["row"], SIMILAR_COUNT)
 
-        df = get_cached_dataset()
-        titles = get_recommendations(df, metadata.get("title", ""), top_n=10)
-        similar_items = df[df["title"].isin(titles)].to_dict(orient="records")
+    def current_filters(self):
+        genre = self.genre_filter.currentText()
+        year = self.year_filter.value()
+        return RecommendationFilter(media_type=MEDIA_CHOICES[self.media_filter.currentText()],
+                                    genre=genre if genre != ALL_GENRES else None,
+                                    released_after=str(year) if year > ANY_YEAR else None,
+                                    min_vote_count=self.votes_filter.value() or None)
+
+    def request_recommendations(self):
+        self.filter_timer.stop()
+        while self.similar_grid.count():
+            widget = self.similar_grid.takeAt(0).widget()
+            if widget is not None and widget is not self.loading_label:
+                widget.deleteLater()
+        self.loading_label.setText("Loading...")
+        self.similar_grid.addWidget(self.loading_label, 0, 0)
+        self.loading_label.show()
+        self.request_id = self.recommendations.request(self.metadata["row"], SIMILAR_COUNT, self.current_filters())
+
+    def on_recommendations(self, request_id, similar_items):
+        if request_id != self.request_id:
+            return
+        if not similar_items:
+            self.loading_label.setText("No similar titles match these filters." if self.recommendations.filters
+                                       else "No similar titles found.")
+            return
+        self.similar_grid.removeWidget(self.loading_label)
+        self.loading_label.hide()
 
         for idx, item in enumerate(similar_items):
-            col = idx % 5
-            row = idx // 5
+            col = idx % SIMILAR_COLUMNS
+            row = idx // SIMILAR_COLUMNS
 
             item_container = QWidget()
             vbox = QVBoxLayout(item_container)
@@ -86,12 +229,7 @@ class MediaDetailView(QWidget):
             poster_label.setFixedSize(120, 180)
             poster_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
             poster_label.mousePressEvent = self.create_click_handler(item)
-            poster_path = Path(item["poster_path"].strip().lstrip("/\\"))
-            img_path = PROJECT_ROOT / "data" / poster_path
-            if img_path.exists():
-                pixmap = QPixmap(str(img_path))
-                if not pixmap.isNull():
-                    poster_label.setPixmap(pixmap.scaled(120, 180, Qt.AspectRatioMode.KeepAspectRatio))
+            self.show_poster(poster_label, item["poster_path"], GRID_SIZE)
 
             title_label = QLabel(item.get("title", "Untitled"))
             title_label.setFixedSize(120, 40)
@@ -100,10 +238,22 @@ class MediaDetailView(QWidget):
             vbox.addWidget(poster_label)
             vbox.addWidget(title_label)
 
-            grid.addWidget(item_container, row, col)
+            self.similar_grid.addWidget(item_container, row, col)
 
-        main_layout.addWidget(scroll)
-        self.setLayout(main_layout)
+    def show_poster(self, label, poster_path, size):
+        # Cached thumbnails are shown straight away, the rest arrive through on_thumbnail_loaded
+        pixmap = self.thumbnails.request(poster_path, size)
+        if pixmap is None:
+            self.poster_labels.setdefault((normalize_path(poster_path), size), []).append(label)
+        elif not pixmap.isNull():
+            label.setPixmap(pixmap)
+
+    def on_thumbnail_loaded(self, rel_path, size):
+        labels = self.poster_labels.pop((rel_path, size), [])
+        pixmap = self.thumbnails.get(rel_path, size)
+        if pixmap is not None and not pixmap.isNull():
+            for label in labels:
+                label.setPixmap(pixmap)
 
     def create_click_handler(self, item):
         def handler(event):
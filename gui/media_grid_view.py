@@ -1,37 +1,245 @@
-﻿from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout, QGridLayout, QScrollArea, QSizePolicy, QPushButton, QHBoxLayout, QLineEdit, QComboBox
-from PySide6.QtGui import QPixmap, QIcon, QImage
-from PySide6.QtCore import Qt, QSize, Signal, QThreadPool, QRunnable, QObject, Slot
-from pathlib import Path
-import pandas as pd
+﻿from PySide6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QHBoxLayout, QLineEdit, QComboBox, QTableView, QHeaderView, QAbstractItemView, QStyledItemDelegate, QStyle
+from PySide6.QtGui import QIcon, QColor
+from PySide6.QtCore import Qt, QEvent, QSize, QRect, QPoint, QTimer, Signal, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, Slot
+import atexit
+import functools
 import os
-from PIL import Image
-import io
-from src.config import METADATA_PATH
-
-PROJECT_ROOT = Path(__file__).resolve().parents[1]
-
-class ImageLoadedSignal(QObject):
-    loaded = Signal(QImage, object)
-
-class ImageLoader(QRunnable):
-    def __init__(self, image_path, label, signal):
+from collections import OrderedDict
+import numpy as np
+from src import metrics
+from src.catalogue import get_catalogue
+from src.filters import RecommendationFilter
+from src.query_cache import get_query_cache
+from src.recommender import get_cached_recommender
+from gui.thumbnails import get_thumbnail_cache, normalize_path, GRID_SIZE
+
+POSTER_SIZE = QSize(*GRID_SIZE)
+TITLE_HEIGHT = 50
+CELL_SIZE = QSize(170, 240)
+SEARCH_DEBOUNCE_MS = 150
+DESCRIPTION_RESULTS = 60
+TITLE_MODE, DESCRIPTION_MODE = "Title", "Description"
+ALL_GENRES = "All Genres"
+# Titles fetched from the catalogue at a time, and how many such pages stay in memory
+PAGE_ROWS = 200
+CACHED_PAGES = 16
+RowDataRole = Qt.ItemDataRole.UserRole + 1
+
+class MediaGridModel(QAbstractTableModel):
+    # Lays the matching titles out `columns` to a grid row, so resizing only changes the column count instead of
+    # re-laying out every item. Posters are only loaded when a visible cell asks for them.
+    # Titles come from the catalogue a page at a time as the grid scrolls towards the end, and only the most
+    # recently used pages are kept, so memory stays flat however far the user scrolls. A page that was dropped is
+    # fetched again from the row it started after.
+    def __init__(self, catalogue, parent=None):
+        super().__init__(parent)
+        self.catalogue = catalogue
+        self.fetch = None
+        self.pages = OrderedDict()
+        self.page_starts = []
+        self.count = 0
+        self.exhausted = True
+        self.columns = 1
+        self.pending = {}
+
+        self.thumbnails = get_thumbnail_cache()
+        self.thumbnails.loaded.connect(self.on_thumbnail_loaded)
+
+    def set_query(self, media_type, query="", genre=None):
+        # Only the first page is read before the grid is shown
+        self.beginResetModel()
+        self.reset(functools.partial(self.catalogue.page, media_type, query, genre))
+        self.append_page(self.next_page())
+        self.endResetModel()
+
+    def set_entries(self, entries):
+        # A fixed list of (row, title, poster_path) entries, e.g. ranked description matches
+        self.beginResetModel()
+        self.reset(None)
+        for start in range(0, len(entries), PAGE_ROWS):
+            self.pages[start // PAGE_ROWS] = entries[start:start + PAGE_ROWS]
+        self.count = len(entries)
+        self.endResetModel()
+
+    def reset(self, fetch):
+        self.fetch = fetch
+        self.pages.clear()
+        self.page_starts = [-1]
+        self.count = 0
+        self.exhausted = fetch is None
+        self.pending.clear()
+
+    def next_page(self):
+        with metrics.timer("grid.fetch_page"):
+            return self.fetch(after=self.page_starts[-1], limit=PAGE_ROWS)
+
+    def append_page(self, entries):
+        self.store_page(len(self.page_starts) - 1, entries)
+        self.count += len(entries)
+        if len(entries) < PAGE_ROWS:
+            self.exhausted = True
+        else:
+            self.page_starts.append(entries[-1][0])
+
+    def store_page(self, page, entries):
+        self.pages[page] = entries
+        self.pages.move_to_end(page)
+        if len(self.pages) > CACHED_PAGES:
+            self.pages.popitem(last=False)
+
+    def entry(self, position):
+        page, offset = divmod(position, PAGE_ROWS)
+        entries = self.pages.get(page)
+        if entries is None:
+            entries = self.fetch(after=self.page_starts[page], limit=PAGE_ROWS)
+            self.store_page(page, entries)
+        else:
+            self.pages.move_to_end(page)
+        return entries[offset] if offset < len(entries) else None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        old_count, old_rows = self.count, self.rowCount()
+        entries = self.next_page()
+        new_rows = -(-(old_count + len(entries)) // self.columns)
+        if new_rows > old_rows:
+            self.beginInsertRows(QModelIndex(), old_rows, new_rows - 1)
+            self.append_page(entries)
+            self.endInsertRows()
+        else:
+            self.append_page(entries)
+        if old_count % self.columns and len(entries):
+            # The last grid row was partly filled and now has more titles
+            self.dataChanged.emit(self.index(old_rows - 1, 0), self.index(old_rows - 1, self.columns - 1))
+
+    def set_columns(self, columns):
+        if columns != self.columns:
+            self.beginResetModel()
+            self.columns = columns
+            self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else -(-self.count // self.columns)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.columns
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        position = index.row() * self.columns + index.column()
+        if position >= self.count:
+            return None
+        entry = self.entry(position)
+        if entry is None:
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return entry[1]
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.poster(position, entry[2])
+        if role == RowDataRole:
+            return self.catalogue.record(entry[0])
+        return None
+
+    def poster(self, position, poster_rel_path):
+        pixmap = self.thumbnails.request(poster_rel_path, GRID_SIZE)
+        if pixmap is None:
+            self.pending.setdefault(normalize_path(poster_rel_path), set()).add(position)
+        return pixmap
+
+    def on_thumbnail_loaded(self, rel_path, size):
+        if size != GRID_SIZE:
+            return
+        for position in self.pending.pop(rel_path, ()):
+            if position < self.count:
+                index = self.index(position // self.columns, position % self.columns)
+                self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+class DescriptionSignal(QObject):
+    finished = Signal(int, object)
+
+class DescriptionSearch(QRunnable):
+    def __init__(self, request_id, text, media_type, top_n, signal):
         super().__init__()
-        self.image_path = image_path
-        self.label = label
+        self.request_id = request_id
+        self.text = text
+        self.media_type = media_type
+        self.top_n = top_n
         self.signal = signal
 
     @Slot()
     def run(self):
         try:
-            with Image.open(self.image_path) as img:
-                img = img.convert("RGBA")
-                img = img.resize((120, 180), Image.LANCZOS)
-                buffer = io.BytesIO()
-                img.save(buffer, format="PNG")
-                qimage = QImage.fromData(buffer.getvalue(), "PNG")
-                self.signal.loaded.emit(qimage, self.label)
+            with metrics.timer("grid.describe"):
+                vector, _ = get_query_cache().get(self.text)
+                rows = np.array(get_cached_recommender().recommend_vector(
+                    vector, self.top_n, filters=RecommendationFilter(media_type=self.media_type)), dtype=np.int64)
+        except ImportError:
+            print("Description search needs sentence-transformers installed.")
+            rows = None
         except Exception as e:
-            print(f"Failed to load image {self.image_path}: {e}")
+            print(f"Description search for {self.text!r} failed: {e}")
+            rows = None
+        self.signal.finished.emit(self.request_id, rows)
+
+class DescriptionSearchService(QObject):
+    # Free-text searches are encoded one at a time on a worker thread, shared by both grids. As with detail-view
+    # recommendations, a new search drops any still queued and callers ignore results for superseded ids.
+    ready = Signal(int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.next_id = 0
+        self.threadpool = QThreadPool()
+        self.threadpool.setMaxThreadCount(1)
+        self.signal = DescriptionSignal()
+        self.signal.finished.connect(self.ready.emit)
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        self.threadpool.clear()
+        self.threadpool.waitForDone()
+
+    def request(self, text, media_type, top_n=DESCRIPTION_RESULTS):
+        self.next_id += 1
+        self.threadpool.clear()
+        self.threadpool.start(DescriptionSearch(self.next_id, text, media_type, top_n, self.signal))
+        return self.next_id
+
+_description_service = None
+
+def get_description_service():
+    global _description_service
+    if _description_service is None:
+        _description_service = DescriptionSearchService()
+    return _description_service
+
+class PosterDelegate(QStyledItemDelegate):
+    def paint(self, painter, option, index):
+        title = index.data(Qt.ItemDataRole.DisplayRole)
+        if title is None:
+            return
+        rect = option.rect
+        poster_rect = QRect(rect.x() + (rect.width() - POSTER_SIZE.width()) // 2, rect.y(), POSTER_SIZE.width(), POSTER_SIZE.height())
+
+        pixmap = index.data(Qt.ItemDataRole.DecorationRole)
+        if pixmap is not None and not pixmap.isNull():
+            painter.drawPixmap(poster_rect, pixmap)
+        else:
+            painter.fillRect(poster_rect, QColor(60, 60, 60))
+        if option.state & QStyle.StateFlag.State_MouseOver:
+            painter.fillRect(poster_rect, QColor(255, 255, 255, 30))
+
+        title_rect = QRect(poster_rect.x(), poster_rect.bottom() + 1, POSTER_SIZE.width(), TITLE_HEIGHT)
+        painter.setPen(option.palette.text().color())
+        painter.drawText(title_rect, Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignVCenter | Qt.TextFlag.TextWordWrap, title)
+
+    def sizeHint(self, option, index):
+        return CELL_SIZE
 
 class MediaGridView(QWidget):
     poster_clicked = Signal(dict)
@@ -40,16 +248,13 @@ class MediaGridView(QWidget):
     def __init__(self, media_type, parent=None):
         super().__init__(parent)
         self.media_type = media_type
-        self.df = pd.read_csv(METADATA_PATH)
-        self.filtered = self.df[self.df["media_type"] == self.media_type].reset_index(drop=True)
-        self.loaded_items = 0
-        self.batch_size = 25
+        self.catalogue = get_catalogue()
         self.active_genre = None
         self.search_query = ""
-
-        self.threadpool = QThreadPool()
-        self.image_signal = ImageLoadedSignal()
-        self.image_signal.loaded.connect(self.set_poster_image)
+        self.description_rows = None
+        self.description_request = None
+        self.descriptions = get_description_service()
+        self.descriptions.ready.connect(self.on_description_results)
 
         self.layout = QVBoxLayout(self)
 
@@ -70,13 +275,25 @@ class MediaGridView(QWidget):
         self.search_bar = QLineEdit()
         self.search_bar.setPlaceholderText("Search...")
         self.search_bar.setMinimumWidth(300)
-        self.search_bar.textChanged.connect(self.apply_filters)
+        # Typing restarts the timer, so the filter runs once the user pauses rather than on every keystroke
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.apply_filters)
+        self.search_bar.textChanged.connect(self.on_search_text_changed)
+        self.search_bar.returnPressed.connect(self.on_search_submitted)
         top_bar.addWidget(self.search_bar, stretch=2)
+
+        # Description mode ranks titles by how close their overview is to free text, run when Enter is pressed
+        self.search_mode = QComboBox()
+        self.search_mode.addItems([TITLE_MODE, DESCRIPTION_MODE])
+        self.search_mode.currentTextChanged.connect(self.on_search_mode_changed)
+        top_bar.addWidget(self.search_mode)
         top_bar.addSpacing(10)
 
         self.genre_filter = QComboBox()
-        all_genres = sorted(set(g for sub in self.filtered["genres"].dropna() for g in str(sub).split(", ")))
-        self.genre_filter.addItem("All Genres")
+        all_genres = self.catalogue.genres(self.media_type)
+        self.genre_filter.addItem(ALL_GENRES)
         for genre in all_genres:
             self.genre_filter.addItem(genre)
         self.genre_filter.currentTextChanged.connect(self.apply_filters)
@@ -84,108 +301,103 @@ class MediaGridView(QWidget):
 
         self.layout.addLayout(top_bar)
 
-        self.scroll = QScrollArea()
-        self.scroll.setWidgetResizable(True)
-        self.scroll.verticalScrollBar().valueChanged.connect(self.on_scroll)
-
-        self.container = QWidget()
-        self.grid = QGridLayout()
-        self.grid.setHorizontalSpacing(10)
-        self.grid.setVerticalSpacing(20)
-        self.grid.setContentsMargins(10, 10, 10, 10)
-        self.container.setLayout(self.grid)
-        self.scroll.setWidget(self.container)
-
-        self.layout.addWidget(self.scroll)
+        self.model = MediaGridModel(self.catalogue, self)
+        self.model.set_query(self.media_type)
+
+        # Fixed-size sections, so layout cost does not depend on the number of rows and only visible cells are painted
+        self.grid_view = QTableView()
+        self.grid_view.setShowGrid(False)
+        self.grid_view.horizontalHeader().hide()
+        self.grid_view.verticalHeader().hide()
+        for header, size in ((self.grid_view.horizontalHeader(), CELL_SIZE.width()), (self.grid_view.verticalHeader(), CELL_SIZE.height())):
+            header.setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+            header.setMinimumSectionSize(1)
+            header.setDefaultSectionSize(size)
+        self.grid_view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.grid_view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.grid_view.verticalScrollBar().setSingleStep(40)
+        self.grid_view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.grid_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.grid_view.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.grid_view.setMouseTracking(True)
+        self.grid_view.setItemDelegate(PosterDelegate(self.grid_view))
+        self.grid_view.setModel(self.model)
+        self.grid_view.clicked.connect(self.on_item_clicked)
+        self.grid_view.viewport().installEventFilter(self)
+        self.grid_view.verticalScrollBar().valueChanged.connect(self.on_scrolled)
+
+        self.layout.addWidget(self.grid_view)
         self.setLayout(self.layout)
 
-        self.populate_grid()
+    def on_search_text_changed(self):
+        if self.search_mode.currentText() == TITLE_MODE:
+            self.search_timer.start()
+        elif not self.search_bar.text().strip() and self.description_rows is not None:
+            self.description_rows = None
+            self.apply_filters()
+
+    def on_search_submitted(self):
+        if self.search_mode.currentText() == TITLE_MODE:
+            self.apply_filters()
+            return
+        text = self.search_bar.text().strip()
+        if text:
+            self.description_request = self.descriptions.request(text, self.media_type)
+
+    def on_search_mode_changed(self, mode):
+        self.search_bar.setPlaceholderText("Describe what you want to watch, then press Enter..." if mode == DESCRIPTION_MODE else "Search...")
+        self.description_rows = None
+        self.description_request = None
+        if mode == DESCRIPTION_MODE:
+            self.on_search_submitted()
+        self.apply_filters()
+
+    def on_description_results(self, request_id, rows):
+        if request_id != self.description_request:
+            return
+        self.description_request = None
+        if rows is not None:
+            self.description_rows = rows
+            self.apply_filters()
 
     def apply_filters(self):
-        self.search_query = self.search_bar.text().lower().strip()
+        self.search_timer.stop()
+        self.search_query = self.search_bar.text().strip()
         self.active_genre = self.genre_filter.currentText()
-
-        filtered = self.df[self.df["media_type"] == self.media_type]
-
-        if self.search_query:
-            filtered = filtered[filtered["title"].str.lower().str.contains(self.search_query, na=False)]
-
-        if self.active_genre and self.active_genre != "All Genres":
-            filtered = filtered[filtered["genres"].str.contains(self.active_genre, na=False)]
-
-        self.filtered = filtered.reset_index(drop=True)
-        self.reload_grid()
-
-    def populate_grid(self):
-        columns = max(self.width() // 180, 1)
-
-        for index in range(self.loaded_items, min(self.loaded_items + self.batch_size, len(self.filtered))):
-            col = index % columns
-            row_pos = index // columns
-            row = self.filtered.iloc[index]
-
-            container = QWidget()
-            vbox = QVBoxLayout(container)
-            vbox.setContentsMargins(0, 0, 0, 0)
-            vbox.setSpacing(0)
-            vbox.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignHCenter)
-
-            poster_label = QLabel()
-            poster_label.setFixedSize(120, 180)
-            poster_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-            def emit_row(event, row_data=row.to_dict()):
-                self.poster_clicked.emit(row_data)
-
-            poster_label.mousePressEvent = emit_row
-
-            poster_rel_path = Path(row["poster_path"].strip().lstrip("\\/"))
-            img_path = PROJECT_ROOT / "data" / poster_rel_path
-            abs_path = img_path.resolve()
-
-            if img_path.exists():
-                loader = ImageLoader(str(img_path), poster_label, self.image_signal)
-                self.threadpool.start(loader)
+        genre = self.active_genre if self.active_genre and self.active_genre != ALL_GENRES else None
+
+        with metrics.timer("grid.filter"):
+            if self.search_mode.currentText() == DESCRIPTION_MODE:
+                if self.description_rows is not None:
+                    # Best matches first, in rank order
+                    self.model.set_entries(self.catalogue.entries(self.description_rows, genre))
+                else:
+                    self.model.set_query(self.media_type, genre=genre)
             else:
-                print(f"File not found: {abs_path}")
-
-            title_label = QLabel(row["title"])
-            title_label.setFixedSize(120, 50)
-            title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            title_label.setWordWrap(True)
-            title_label.setStyleSheet("background-color: transparent;")
-
-            vbox.addWidget(poster_label)
-            vbox.addWidget(title_label)
-
-            self.grid.addWidget(container, row_pos, col, alignment=Qt.AlignmentFlag.AlignTop)
-
-        self.loaded_items += self.batch_size
-        self.container.setMinimumHeight((self.loaded_items // columns + 1) * 220)
-
-    def set_poster_image(self, qimage, label):
-        try:
-            if isinstance(label, QLabel):
-                pixmap = QPixmap.fromImage(qimage)
-                if not pixmap.isNull():
-                    label.setPixmap(pixmap)
-        except RuntimeError:
-            pass
-
-    def on_scroll(self, value):
-        max_value = self.scroll.verticalScrollBar().maximum()
-        if value > max_value - 100:
-            if self.loaded_items < len(self.filtered):
-                self.populate_grid()
-
-    def resizeEvent(self, event):
-        super().resizeEvent(event)
-        self.reload_grid()
-
-    def reload_grid(self):
-        self.loaded_items = 0
-        for i in reversed(range(self.grid.count())):
-            widget = self.grid.itemAt(i).widget()
-            if widget:
-                widget.setParent(None)
-        self.populate_grid()
+                self.model.set_query(self.media_type, self.search_query, genre)
+        self.grid_view.scrollToTop()
+
+    def on_item_clicked(self, index):
+        row_data = index.data(RowDataRole)
+        if row_data is not None:
+            self.poster_clicked.emit(row_data)
+
+    def on_scrolled(self, value):
+        # The next page is read while the end is still a screen away, so scrolling does not stall at the bottom
+        if self.grid_view.verticalScrollBar().maximum() - value < self.grid_view.viewport().height():
+            self.model.fetchMore(QModelIndex())
+
+    def eventFilter(self, watched, event):
+        if watched is self.grid_view.viewport() and event.type() == QEvent.Type.Resize:
+            self.update_columns()
+        return super().eventFilter(watched, event)
+
+    def update_columns(self):
+        columns = max(self.grid_view.viewport().width() // CELL_SIZE.width(), 1)
+        if columns == self.model.columns:
+            return
+        # Keep the first visible title in view across the re-flow
+        first = self.grid_view.indexAt(QPoint(0, 0))
+        position = first.row() * self.model.columns + first.column() if first.isValid() else 0
+        self.model.set_columns(columns)
+        self.grid_view.scrollTo(self.model.index(position // columns, 0), QAbstractItemView.ScrollHint.PositionAtTop)
@@ -0,0 +1,126 @@
+from PySide6.QtGui import QPixmap, QImage
+from PySide6.QtCore import Signal, QThreadPool, QRunnable, QObject, Slot
+from collections import OrderedDict
+import atexit
+from src.config import DATA_DIR
+from src import metrics
+from src.thumbnails import (GRID_SIZE, DETAIL_SIZE, normalize_path, size_name, thumbnail_path, render_thumbnail,
+                            save_thumbnail, load_manifest)
+
+MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+
+def to_qimage(img):
+    # Straight from PIL's pixel buffer; copy() detaches it from the Python bytes object
+    return QImage(img.tobytes(), img.width, img.height, img.width * 3, QImage.Format.Format_RGB888).copy()
+
+@metrics.timed("thumbnails.load")
+def load_thumbnail(rel_path, size, precomputed=False):
+    cached = thumbnail_path(rel_path, size)
+    if precomputed:
+        # Listed in the manifest by precompute_thumbnails.py, so neither file needs a stat
+        image = QImage(str(cached))
+        if not image.isNull():
+            metrics.count("thumbnails.disk_hits")
+            return image
+
+    source = DATA_DIR / rel_path
+    try:
+        if cached.stat().st_mtime >= source.stat().st_mtime:
+            image = QImage(str(cached))
+            if not image.isNull():
+                metrics.count("thumbnails.disk_hits")
+                return image
+    except FileNotFoundError:
+        pass
+
+    if not source.exists():
+        print(f"File not found: {source.resolve()}")
+        return QImage()
+    img = render_thumbnail(source, size)
+    metrics.count("images.decoded")
+    save_thumbnail(img, cached)
+    return to_qimage(img)
+
+class ThumbnailLoadedSignal(QObject):
+    loaded = Signal(str, object, QImage)
+
+class ThumbnailLoader(QRunnable):
+    def __init__(self, rel_path, size, signal, precomputed=False):
+        super().__init__()
+        self.rel_path = rel_path
+        self.size = size
+        self.signal = signal
+        self.precomputed = precomputed
+
+    @Slot()
+    def run(self):
+        try:
+            image = load_thumbnail(self.rel_path, self.size, self.precomputed)
+        except Exception as e:
+            print(f"Failed to load image {self.rel_path}: {e}")
+            image = QImage()
+        self.signal.loaded.emit(self.rel_path, self.size, image)
+
+class ThumbnailCache(QObject):
+    # Decoded thumbnails for the GUI thread, evicted least-recently-used once the pixel budget is exceeded.
+    # Misses are decoded on a worker pool and announced through `loaded`.
+    loaded = Signal(str, object)
+
+    def __init__(self, budget_bytes=MEMORY_BUDGET_BYTES, parent=None):
+        super().__init__(parent)
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.pixmaps = OrderedDict()
+        self.pending = set()
+        self.threadpool = QThreadPool()
+        self.signal = ThumbnailLoadedSignal()
+        self.signal.loaded.connect(self.on_loaded)
+        manifest = load_manifest()
+        self.precomputed_sizes = set(manifest["sizes"])
+        self.precomputed = manifest["images"]
+        # Queued loads must not outlive the signal object they report through
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        self.threadpool.clear()
+        self.threadpool.waitForDone()
+
+    def get(self, rel_path, size):
+        key = (rel_path, size)
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+        return pixmap
+
+    def request(self, rel_path, size):
+        rel_path = normalize_path(rel_path)
+        if not rel_path:
+            return QPixmap()
+        pixmap = self.get(rel_path, size)
+        metrics.count("thumbnails.memory_hits" if pixmap is not None else "thumbnails.memory_misses")
+        if pixmap is None and (rel_path, size) not in self.pending:
+            self.pending.add((rel_path, size))
+            precomputed = size_name(size) in self.precomputed_sizes and rel_path in self.precomputed
+            self.threadpool.start(ThumbnailLoader(rel_path, size, self.signal, precomputed))
+        return pixmap
+
+    def on_loaded(self, rel_path, size, image):
+        key = (rel_path, size)
+        self.pending.discard(key)
+        # Failures are cached as null pixmaps so a missing file is not retried on every repaint
+        pixmap = QPixmap.fromImage(image)
+        self.pixmaps[key] = pixmap
+        self.used_bytes += pixmap.width() * pixmap.height() * 4
+        while self.used_bytes > self.budget_bytes and len(self.pixmaps) > 1:
+            _, evicted = self.pixmaps.popitem(last=False)
+            self.used_bytes -= evicted.width() * evicted.height() * 4
+        self.loaded.emit(rel_path, size)
+
+_cache = None
+
+def get_thumbnail_cache():
+    # Created lazily because pixmaps need a running QApplication
+    global _cache
+    if _cache is None:
+        _cache = ThumbnailCache()
+    return _cache
@@ -1,5 +1,6 @@
 ﻿from PySide6.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QVBoxLayout
 from gui.poster_widget import PosterWidget
+from src import metrics
 from gui.media_grid_view import MediaGridView
 from gui.media_detail_view import MediaDetailView
 
@@ -15,8 +16,10 @@ class MovieRecommenderGUI(QMainWindow):
         y = (screen.height() - window.height()) // 2
         self.move(x, y)
 
-        self.movies_view = MediaGridView("movie", parent=self)
-        self.tv_view = MediaGridView("tv", parent=self)
+        with metrics.span("grid.load", media_type="movie"), metrics.profile("grid.load"):
+            self.movies_view = MediaGridView("movie", parent=self)
+        with metrics.span("grid.load", media_type="tv"):
+            self.tv_view = MediaGridView("tv", parent=self)
         self.detail_view = None
         self.current_grid = None
 
@@ -1,11 +1,15 @@
-﻿import csv
+﻿import argparse
+import csv
+import hashlib
 import json
+import os
 import requests
-from pathlib import Path
-from src.config import METADATA_PATH
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from requests.adapters import HTTPAdapter
+from src.config import DATA_DIR, IMAGE_DIR, METADATA_PATH
+from src import metrics
 
-DATA_DIR = Path("data")
-IMAGE_DIR = DATA_DIR / "images"
 IMAGE_DIR.mkdir(parents=True, exist_ok=True)
 
 TMDB_FIELDS = [
@@ -14,30 +18,70 @@ TMDB_FIELDS = [
     "poster_path", "backdrop_path", "adult", "video", "media_type"
 ]
 
-TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/original"
+TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/"
+IMAGE_SIZES = ["w92", "w154", "w185", "w342", "w500", "w780", "original"]
+DEFAULT_IMAGE_SIZE = "original"
+DOWNLOAD_WORKERS = 16
+MERGE_CHUNK_SIZE = 1000
 
 def load_jsonl(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return [json.loads(line) for line in f]
+    return [item for _, item in iter_jsonl(path)]
 
-def download_image(image_path):
+def image_filename(image_path, size=DEFAULT_IMAGE_SIZE):
+    # Smaller tiers get their own directory so they never shadow an existing original
+    directory = IMAGE_DIR if size == "original" else IMAGE_DIR / size
+    return directory / image_path.strip("/")
+
+def download_image(image_path, session=None, size=DEFAULT_IMAGE_SIZE, base_url=TMDB_IMAGE_BASE):
     if not image_path:
         return ""
-    filename = IMAGE_DIR / image_path.strip("/")
+    filename = image_filename(image_path, size)
     if filename.exists():
+        metrics.count("merge.images_existing")
         return str(filename.relative_to(DATA_DIR))
-    url = f"{TMDB_IMAGE_BASE}{image_path}"
+    url = f"{base_url}{size}{image_path}"
     print(f"Downloading {url}...")
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    tmp_filename = filename.with_name(filename.name + ".part")
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        with open(filename, "wb") as f:
-            f.write(response.content)
+        with metrics.timer("merge.download_image"):
+            with (session or requests).get(url, timeout=10, stream=True) as response:
+                response.raise_for_status()
+                with open(tmp_filename, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+        # Only complete files ever appear under the final name, so an interrupted run is simply retried
+        os.replace(tmp_filename, filename)
     except Exception as e:
         print(f"Failed to download {url}: {e}")
+        metrics.count("merge.images_failed")
+        tmp_filename.unlink(missing_ok=True)
         return ""
+    metrics.count("merge.images_downloaded")
     return str(filename.relative_to(DATA_DIR))
 
+def download_images(items, size=DEFAULT_IMAGE_SIZE, workers=DOWNLOAD_WORKERS, base_url=TMDB_IMAGE_BASE):
+    image_paths = sorted({item.get(field) for item in items for field in ("poster_path", "backdrop_path") if item.get(field)})
+    with requests.Session() as session:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            local_paths = dict(zip(image_paths, pool.map(lambda p: download_image(p, session, size, base_url), image_paths)))
+
+    # Replace image paths with the downloaded files
+    for item in items:
+        item["poster_path"] = local_paths.get(item.get("poster_path"), "")
+        item["backdrop_path"] = local_paths.get(item.get("backdrop_path"), "")
+    return items
+
+def normalize_item(item):
+    # Normalize fields for TV shows
+    item["title"] = item.get("title") or item.get("name")
+    item["original_title"] = item.get("original_title") or item.get("original_name")
+    item["release_date"] = item.get("release_date") or item.get("first_air_date")
+    return item
+
 def unify_items(*item_lists):
     merged = {}
     for items in item_lists:
@@ -48,14 +92,7 @@ def unify_items(*item_lists):
                 print(f"Skipping invalid item: {item}")
                 continue
 
-            # Normalize fields for TV shows
-            item["title"] = item.get("title") or item.get("name")
-            item["original_title"] = item.get("original_title") or item.get("original_name")
-            item["release_date"] = item.get("release_date") or item.get("first_air_date")
-
-            # Download and replace image paths
-            item["poster_path"] = download_image(item.get("poster_path"))
-            item["backdrop_path"] = download_image(item.get("backdrop_path"))
+            normalize_item(item)
 
             key = (title.lower(), media_type)
             if key not in merged or count_non_empty_fields(item) > count_non_empty_fields(merged[key]):
@@ -65,26 +102,110 @@ def unify_items(*item_lists):
 def count_non_empty_fields(item):
     return sum(1 for field in TMDB_FIELDS if item.get(field))
 
+def iter_jsonl(path):
+    # Yields each item with its byte offset, so the line can be re-read later instead of kept in memory
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            if line.strip():
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    # e.g. a row torn by a scraper run that was killed mid-write
+                    print(f"Skipping unreadable line at byte {offset} of {path}: {e}")
+                    metrics.count("merge.bad_lines")
+                else:
+                    yield offset, item
+            offset += len(line)
+
+def item_key(title, media_type):
+    # 64-bit digest of (title.lower(), media_type): an accidental collision is ~1e-7 even at a million titles
+    digest = hashlib.blake2b(f"{media_type}\0{title.lower()}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def build_key_index(paths):
+    # Same duplicate resolution as unify_items, but only the winning line's location is kept per key,
+    # packed into one int: byte offset, source file and field count
+    index = {}
+    for source, path in enumerate(paths):
+        for offset, item in iter_jsonl(path):
+            title = item.get("title") or item.get("name")
+            media_type = item.get("media_type")
+            if not title or not media_type:
+                print(f"Skipping invalid item: {item}")
+                continue
+
+            key = item_key(title, media_type)
+            score = count_non_empty_fields(normalize_item(item))
+            if key not in index or score > index[key] & 0xFF:
+                index[key] = (offset << 16) | (source << 8) | score
+    return index
+
+def iter_merged_items(paths, index):
+    # Dicts keep first-insertion order, so rows come out in the order unify_items would produce
+    files = [open(path, "rb") for path in paths]
+    try:
+        for location in index.values():
+            f = files[(location >> 8) & 0xFF]
+            f.seek(location >> 16)
+            yield normalize_item(json.loads(f.readline()))
+    finally:
+        for f in files:
+            f.close()
+
+def iter_chunks(items, size):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+def csv_row(item):
+    row = item.copy()
+    row["genre_ids"] = json.dumps(item.get("genre_ids", []))
+    return {k: v for k, v in row.items() if k in TMDB_FIELDS}
+
 def save_merged_csv(items, path):
     with open(path, "w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=TMDB_FIELDS)
         writer.writeheader()
         for item in items:
-            row = item.copy()
-            row["genre_ids"] = json.dumps(item.get("genre_ids", []))
-            row = {k: v for k, v in row.items() if k in TMDB_FIELDS}
-            writer.writerow(row)
+            writer.writerow(csv_row(item))
+
+def merge_jsonl(paths, output_path, image_size=DEFAULT_IMAGE_SIZE, workers=DOWNLOAD_WORKERS, chunk_size=MERGE_CHUNK_SIZE):
+    with metrics.span("merge.key_index") as span:
+        index = build_key_index(paths)
+        span.add(items=len(index))
+    print(f"Found {len(index)} unique items, writing in chunks of {chunk_size}...")
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=TMDB_FIELDS)
+        writer.writeheader()
+        for chunk in iter_chunks(iter_merged_items(paths, index), chunk_size):
+            with metrics.span("merge.chunk", rows=len(chunk)):
+                download_images(chunk, image_size, workers)
+                writer.writerows(csv_row(item) for item in chunk)
+            metrics.count("merge.rows_written", len(chunk))
+    os.replace(tmp_path, output_path)
+    return len(index)
 
 def main():
-    print("Loading datasets...")
-    scraped_movies = load_jsonl(DATA_DIR / "tmdb_movie.jsonl")
-    scraped_tv = load_jsonl(DATA_DIR / "tmdb_tv.jsonl")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image-size", choices=IMAGE_SIZES, default=DEFAULT_IMAGE_SIZE)
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=MERGE_CHUNK_SIZE)
+    parser.add_argument("--skip-thumbnails", action="store_true", help="don't precompute GUI thumbnails afterwards")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_from_args(args)
 
     print("Merging datasets...")
-    all_items = unify_items(scraped_movies, scraped_tv)
-
-    print(f"Saving {len(all_items)} merged items...")
-    save_merged_csv(all_items, METADATA_PATH)
+    count = merge_jsonl([DATA_DIR / "tmdb_movie.jsonl", DATA_DIR / "tmdb_tv.jsonl"], METADATA_PATH,
+                        args.image_size, args.download_workers, args.chunk_size)
+    print(f"Saved {count} merged items.")
+    if not args.skip_thumbnails:
+        from precompute_thumbnails import precompute
+        print("Precomputing thumbnails...")
+        precompute()
     print("Done.")
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+import argparse
+import json
+import numpy as np
+import pandas as pd
+from src.config import METADATA_PATH, EMBEDDINGS_PATH
+from src.store import save_dataset, EMBEDDING_DTYPES
+
+# One-shot conversion of a metadata CSV with JSON-encoded vectors to the binary store
+
+def migrate(metadata_path, embeddings_path, dtype, chunksize=10_000):
+    frames = []
+    vectors = []
+    for chunk in pd.read_csv(metadata_path, chunksize=chunksize):
+        chunk = chunk[chunk['embedding'].notnull()]
+        vectors.append(np.array([json.loads(x) for x in chunk['embedding']], dtype=np.float32))
+        frames.append(chunk.drop(columns=['embedding']))
+        print(f"Parsed {sum(len(v) for v in vectors)} embeddings...")
+
+    df = pd.concat(frames, ignore_index=True)
+    embeddings = np.concatenate(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+    save_dataset(df, embeddings, metadata_path, embeddings_path, dtype)
+    return embeddings.shape
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--metadata', default=str(METADATA_PATH))
+    parser.add_argument('--embeddings', default=str(EMBEDDINGS_PATH))
+    parser.add_argument('--dtype', choices=list(EMBEDDING_DTYPES), default='float32')
+    args = parser.parse_args()
+
+    rows, dim = migrate(args.metadata, args.embeddings, args.dtype)
+    print(f"Done. Wrote {rows} x {dim} {args.dtype} embeddings to {args.embeddings}.")
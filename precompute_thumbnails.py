@@ -0,0 +1,114 @@
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from src.config import DATA_DIR, IMAGE_DIR, THUMBNAIL_MANIFEST_PATH
+from src.thumbnails import (THUMBNAIL_SIZES, MANIFEST_VERSION, size_name, thumbnail_path, render_thumbnails,
+                            save_thumbnail, load_manifest, save_manifest)
+from src import metrics
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+MANIFEST_SAVE_EVERY = 1000
+POOL_CHUNK_SIZE = 16
+
+def scan_images(image_dir=IMAGE_DIR):
+    # (rel_path, mtime_ns, bytes) for every image below image_dir, rel_path as the GUI asks for it
+    stack = [image_dir] if os.path.isdir(image_dir) else []
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                    stat = entry.stat()
+                    rel_path = os.path.relpath(entry.path, DATA_DIR).replace(os.sep, "/")
+                    yield rel_path, stat.st_mtime_ns, stat.st_size
+
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def process_image(task):
+    # Runs in a pool worker. A touched file whose bytes are unchanged keeps its thumbnails.
+    # Returns (rel_path, hash, rendered, error).
+    rel_path, known_hash = task
+    source = DATA_DIR / rel_path
+    try:
+        digest = file_hash(source)
+        if digest == known_hash:
+            return rel_path, digest, False, None
+        for size, img in zip(THUMBNAIL_SIZES, render_thumbnails(source, THUMBNAIL_SIZES)):
+            save_thumbnail(img, thumbnail_path(rel_path, size))
+    except Exception as e:
+        return rel_path, None, False, str(e)
+    return rel_path, digest, True, None
+
+def precompute(workers=None, force=False):
+    start = time.perf_counter()
+    manifest = load_manifest()
+    sizes = [size_name(size) for size in THUMBNAIL_SIZES]
+    if force or manifest["sizes"] != sizes:
+        manifest["images"] = {}
+    previous = manifest["images"]
+
+    images, tasks = {}, []
+    for rel_path, mtime, size in scan_images():
+        entry = previous.get(rel_path)
+        if entry and entry[0] == mtime and entry[1] == size:
+            images[rel_path] = entry
+        else:
+            images[rel_path] = [mtime, size, None]
+            tasks.append((rel_path, entry[2] if entry else None))
+    print(f"{len(images)} images, {len(images) - len(tasks)} up to date by mtime, {len(tasks)} to check.")
+
+    # Entries still being processed stay out of the manifest, so an interrupted run picks them up again
+    pending = {rel_path for rel_path, _ in tasks}
+    manifest = {"version": MANIFEST_VERSION, "sizes": sizes, "images": images}
+
+    def save():
+        save_manifest({**manifest, "images": {k: v for k, v in images.items() if k not in pending}},
+                      THUMBNAIL_MANIFEST_PATH)
+
+    rendered = failed = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(process_image, tasks, chunksize=POOL_CHUNK_SIZE)
+            for done, (rel_path, digest, was_rendered, error) in enumerate(results, 1):
+                if error:
+                    print(f"Failed to render {rel_path}: {error}")
+                    failed += 1
+                    del images[rel_path]
+                else:
+                    images[rel_path][2] = digest
+                    rendered += was_rendered
+                pending.discard(rel_path)
+                if done % MANIFEST_SAVE_EVERY == 0:
+                    save()
+                    print(f"{done}/{len(tasks)} images checked.")
+    finally:
+        save()
+
+    elapsed = time.perf_counter() - start
+    metrics.count("thumbnails.images_decoded", rendered)
+    metrics.count("thumbnails.unchanged", len(tasks) - rendered - failed)
+    metrics.count("thumbnails.failed", failed)
+    print(f"Rendered {rendered} images, {len(tasks) - rendered - failed} unchanged by hash, {failed} failed "
+          f"in {elapsed:.1f}s ({rendered / elapsed if elapsed else 0:.0f} images/sec).")
+    return rendered
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="re-render every image")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_from_args(args)
+
+    print("Precomputing thumbnails...")
+    with metrics.span("thumbnails.precompute"):
+        precompute(args.workers, args.force)
+    print(f"Done. Manifest saved to {THUMBNAIL_MANIFEST_PATH}.")
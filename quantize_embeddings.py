@@ -0,0 +1,33 @@
+import argparse
+import time
+from src.config import QUANTIZED_EMBEDDINGS_PATH
+from src.quantize import QuantizedEmbeddings, QUANTIZED_KINDS, remove_quantized
+from src.recommender import normalize_rows
+from src.store import load_dataset
+
+def build(kind):
+    df, embeddings = load_dataset()
+    if normalize_rows(embeddings) is not embeddings:
+        # The recommender re-ranks against the store without normalizing it when a quantized copy is present
+        raise SystemExit("Quantized scoring needs a unit-length float32 store; rerun fix_embeddings.py or "
+                         "migrate_embeddings.py --dtype float32 first.")
+    start = time.perf_counter()
+    quantized = QuantizedEmbeddings.quantize(embeddings, kind)
+    quantized.save()
+    print(f"Quantized {len(quantized)} rows to {kind} ({quantized.nbytes / 2**20:.0f} MB, "
+          f"float32 store {len(quantized) * embeddings.shape[1] * 4 / 2**20:.0f} MB) in {time.perf_counter() - start:.1f}s.")
+    return quantized
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kind', choices=list(QUANTIZED_KINDS) + ["float32"], default="int8",
+                        help="float32 removes the quantized copy, so scoring reads the store directly again")
+    args = parser.parse_args()
+
+    if args.kind == "float32":
+        remove_quantized()
+        print("Removed quantized embeddings; recommendations score the float32 store.")
+    else:
+        print(f"Quantizing embeddings to {args.kind}...")
+        build(args.kind)
+        print(f"Done. Saved to {QUANTIZED_EMBEDDINGS_PATH}.")
@@ -0,0 +1,83 @@
+import os
+import numpy as np
+from .config import ANN_INDEX_PATH, EMBEDDINGS_PATH
+
+DEFAULT_PROBES = 8
+ASSIGN_BLOCK_ROWS = 65_536
+
+def _assign(embeddings, centroids):
+    # Blocked so the rows x lists similarity matrix never has to exist in full
+    labels = np.empty(len(embeddings), dtype=np.int64)
+    for start in range(0, len(embeddings), ASSIGN_BLOCK_ROWS):
+        block = np.asarray(embeddings[start:start + ASSIGN_BLOCK_ROWS], dtype=centroids.dtype)
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+class IVFIndex:
+    # Inverted-file index: rows are bucketed by their nearest k-means centroid and a query only scans
+    # the buckets of its closest centroids. Expects unit-length embeddings, so dot product is cosine.
+    kind = "ivf"
+
+    def __init__(self, centroids, offsets, rows, n_rows):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.n_rows = n_rows
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, iterations=10, sample_size=100_000, seed=0):
+        n = len(embeddings)
+        n_lists = min(n_lists or max(int(4 * np.sqrt(n)), 1), n)
+        rng = np.random.default_rng(seed)
+
+        sample = np.asarray(embeddings[np.sort(rng.choice(n, size=min(sample_size, n), replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = _assign(sample, centroids)
+            counts = np.bincount(labels, minlength=n_lists)
+            empty = counts == 0
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums = np.zeros_like(centroids)
+            sums[~empty] = np.add.reduceat(sample[np.argsort(labels, kind="stable")], starts[~empty], axis=0)
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            norms = np.sqrt(np.einsum('ij,ij->i', sums, sums))[:, None]
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+
+        labels = _assign(embeddings, centroids)
+        rows = np.argsort(labels, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_lists))])
+        return cls(centroids, offsets, rows, n)
+
+    def candidates(self, query, n_probe=DEFAULT_PROBES):
+        if n_probe >= self.n_lists:
+            return np.arange(self.n_rows)
+        similarity = self.centroids @ np.asarray(query, dtype=self.centroids.dtype)
+        probed = np.argpartition(similarity, self.n_lists - n_probe)[self.n_lists - n_probe:]
+        # Sorted, so ties in the final ranking still fall back to row order like the exact search
+        return np.sort(np.concatenate([self.rows[self.offsets[l]:self.offsets[l + 1]] for l in probed]))
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, kind=self.kind, centroids=self.centroids, offsets=self.offsets, rows=self.rows, n_rows=self.n_rows)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays["centroids"], arrays["offsets"], arrays["rows"], int(arrays["n_rows"]))
+
+INDEX_TYPES = {IVFIndex.kind: IVFIndex}
+
+def load_index(path=ANN_INDEX_PATH, embeddings_path=EMBEDDINGS_PATH):
+    if not os.path.exists(path):
+        return None
+    # Re-embedded rows move, so an older index probes the wrong lists even when the row count still matches
+    if os.path.exists(embeddings_path) and os.path.getmtime(path) < os.path.getmtime(embeddings_path):
+        print("Ignoring ANN index older than the embeddings; rerun build_ann_index.py.")
+        return None
+    with np.load(path) as arrays:
+        return INDEX_TYPES[str(arrays["kind"])].from_arrays(arrays)
@@ -0,0 +1,249 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from .config import CATALOGUE_PATH, METADATA_PATH
+from .embedder import genre_names
+from .search import normalize_title
+
+# Rows read from the metadata CSV per insert batch while building, so the build runs in bounded memory
+BUILD_CHUNK_ROWS = 50_000
+# Queries shorter than a trigram cannot use the full-text index and scan the partition instead
+TRIGRAM = 3
+# Matching rows kept per recent query by the in-memory fallback
+DATASET_QUERY_CACHE_SIZE = 8
+
+# Rows are dataset positions, so they line up with the recommender and the embedding store
+GENRES_TABLE = """
+CREATE TABLE title_genres (genre TEXT NOT NULL, media_type TEXT NOT NULL, row INTEGER NOT NULL,
+                           PRIMARY KEY (genre, media_type, row)) WITHOUT ROWID
+"""
+# Indexes are made once every row is in, which is quicker than keeping them up to date row by row
+INDEXES = """
+CREATE INDEX titles_media_type ON titles (media_type, row);
+CREATE INDEX titles_title_key ON titles (title_key);
+CREATE TABLE genre_names (media_type TEXT NOT NULL, genre TEXT NOT NULL, PRIMARY KEY (media_type, genre)) WITHOUT ROWID;
+CREATE VIRTUAL TABLE title_search USING fts5(title_key, content='titles', content_rowid='row', tokenize='trigram');
+INSERT INTO title_search (rowid, title_key) SELECT row, title_key FROM titles;
+INSERT INTO genre_names SELECT DISTINCT media_type, genre FROM title_genres;
+"""
+
+def _sql_type(dtype):
+    if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def build_catalogue(metadata_path=METADATA_PATH, path=CATALOGUE_PATH, chunk_rows=BUILD_CHUNK_ROWS):
+    # SQLite copy of the metadata for the browsing UI, written under a temporary name and moved into place.
+    # Row numbers follow Dataset.load: rows without an embedding are skipped and the rest numbered from 0.
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    try:
+        db.execute("PRAGMA journal_mode=OFF")
+        db.execute("PRAGMA synchronous=OFF")
+        columns = None
+        next_row = 0
+        for chunk in pd.read_csv(metadata_path, chunksize=chunk_rows):
+            # The legacy layout keeps rows with an inline vector, as load_dataset does
+            chunk = chunk[chunk["embedding_row" if "embedding_row" in chunk.columns else "embedding"].notnull()]
+            chunk = chunk.drop(columns=["embedding", "embedding_row"], errors="ignore")
+            if "genres" not in chunk.columns:
+                chunk["genres"] = genre_names(chunk)
+            for column in ("poster_path", "backdrop_path"):
+                if column in chunk.columns:
+                    chunk[column] = chunk[column].fillna("")
+            chunk.insert(0, "row", np.arange(next_row, next_row + len(chunk)))
+            chunk.insert(1, "title_key", chunk["title"].map(normalize_title))
+            next_row += len(chunk)
+            if columns is None:
+                columns = list(chunk.columns)
+                definitions = ", ".join(f"{_quote(c)} {'INTEGER PRIMARY KEY' if c == 'row' else _sql_type(chunk[c].dtype)}"
+                                        for c in columns)
+                db.execute(f"CREATE TABLE titles ({definitions})")
+                db.execute(GENRES_TABLE)
+            chunk = chunk.reindex(columns=columns)
+            values = chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+            db.executemany(f"INSERT INTO titles VALUES ({', '.join('?' * len(columns))})", values)
+
+            genres = chunk["genres"].fillna("").astype(str).str.split(", ")
+            pairs = genres.explode()
+            pairs = pairs[pairs.astype(bool)]
+            db.executemany("INSERT OR IGNORE INTO title_genres VALUES (?, ?, ?)",
+                           zip(pairs.tolist(), chunk["media_type"].astype(str)[pairs.index].tolist(),
+                               chunk["row"][pairs.index].tolist()))
+            print(f"{next_row} rows")
+        if columns is None:
+            raise ValueError(f"{metadata_path} has no rows")
+        db.executescript(INDEXES)
+        db.execute("ANALYZE")
+        db.commit()
+    except BaseException:
+        db.close()
+        os.remove(tmp_path)
+        raise
+    db.close()
+    os.replace(tmp_path, path)
+    return next_row
+
+def load_catalogue(path=CATALOGUE_PATH, metadata_path=METADATA_PATH):
+    if not os.path.exists(path):
+        return None
+    if os.path.exists(metadata_path) and os.path.getmtime(path) < os.path.getmtime(metadata_path):
+        print("Ignoring catalogue older than the metadata; rerun build_catalogue.py.")
+        return None
+    try:
+        return SQLiteCatalogue(path)
+    except sqlite3.Error as e:
+        print(f"Could not open catalogue {path} ({e}), browsing from the in-memory dataset.")
+        return None
+
+class SQLiteCatalogue:
+    # What the grid and detail views read, served from the on-disk catalogue built by build_catalogue.py. Nothing
+    # is held in memory beyond SQLite's page cache, so browsing costs the same for any catalogue size.
+    def __init__(self, path=CATALOGUE_PATH):
+        self.path = path
+        self._db = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._db.execute("SELECT 1 FROM titles LIMIT 1")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM titles")[0][0]
+
+    def genres(self, media_type):
+        return [row[0] for row in self._query("SELECT genre FROM genre_names WHERE media_type = ? ORDER BY genre", (media_type,))]
+
+    def page(self, media_type, query="", genre=None, after=-1, limit=100):
+        # Up to `limit` (row, title, poster_path) entries after row `after`, in row order, with the title search
+        # and genre filter evaluated by SQLite. Pages are keyed on the last row of the page before rather than an
+        # offset, so page n costs the same as page 0 and a dropped page can be fetched again.
+        key = normalize_title(query)
+        if len(key) >= TRIGRAM:
+            # Driven by the trigram index; the phrase form matches the whole query as a substring
+            sql = ("SELECT t.row, t.title, t.poster_path FROM title_search s JOIN titles t ON t.row = s.rowid "
+                   "WHERE title_search MATCH ? AND s.rowid > ? AND t.media_type = ?")
+            params = ['"' + key.replace('"', '""') + '"', after, media_type]
+            if genre:
+                sql += " AND EXISTS (SELECT 1 FROM title_genres g WHERE g.genre = ? AND g.media_type = t.media_type AND g.row = t.row)"
+                params.append(genre)
+            sql += " ORDER BY s.rowid LIMIT ?"
+        elif genre:
+            sql = ("SELECT t.row, t.title, t.poster_path FROM title_genres g JOIN titles t ON t.row = g.row "
+                   "WHERE g.genre = ? AND g.media_type = ? AND g.row > ?")
+            params = [genre, media_type, after]
+            if key:
+                sql += " AND instr(t.title_key, ?) > 0"
+                params.append(key)
+            sql += " ORDER BY g.row LIMIT ?"
+        else:
+            sql = "SELECT row, title, poster_path FROM titles WHERE media_type = ? AND row > ?"
+            params = [media_type, after]
+            if key:
+                sql += " AND instr(title_key, ?) > 0"
+                params.append(key)
+            sql += " ORDER BY row LIMIT ?"
+        params.append(limit)
+        return [tuple(row) for row in self._query(sql, params)]
+
+    def entries(self, rows, genre=None):
+        # (row, title, poster_path) for the given rows in the given order, e.g. ranked search results
+        rows = [int(row) for row in rows]
+        if not rows:
+            return []
+        placeholders = ", ".join("?" * len(rows))
+        sql = f"SELECT row, title, poster_path FROM titles WHERE row IN ({placeholders})"
+        params = list(rows)
+        if genre:
+            sql += " AND row IN (SELECT row FROM title_genres WHERE genre = ?)"
+            params.append(genre)
+        found = {row[0]: tuple(row) for row in self._query(sql, params)}
+        return [found[row] for row in rows if row in found]
+
+    def record(self, row):
+        found = self._query("SELECT * FROM titles WHERE row = ?", (int(row),))
+        if not found:
+            return None
+        # "row" stays, so the detail view can ask for this row's recommendations rather than its title's
+        record = dict(found[0])
+        del record["title_key"]
+        return record
+
+    def close(self):
+        self._db.close()
+
+class DatasetCatalogue:
+    # The same interface over the in-memory dataset, used when no catalogue has been built
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.titles = dataset.df["title"].to_numpy()
+        self.poster_paths = dataset.df["poster_path"].to_numpy()
+        self._matches = OrderedDict()
+        self._lock = threading.Lock()
+        # Built off the GUI thread; a search issued before it is ready waits on the dataset's lock
+        threading.Thread(target=lambda: dataset.title_index, daemon=True).start()
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def genres(self, media_type):
+        return self.dataset.genre_bitmap.names(self.dataset.rows(media_type))
+
+    def matches(self, media_type, query="", genre=None):
+        key = (media_type, normalize_title(query), genre)
+        with self._lock:
+            rows = self._matches.get(key)
+            if rows is not None:
+                self._matches.move_to_end(key)
+                return rows
+        rows = self.dataset.rows(media_type)
+        if key[1]:
+            rows = self.dataset.title_index.search(query, rows)
+        if genre:
+            rows = self.dataset.genre_bitmap.filter(rows, genre)
+        with self._lock:
+            self._matches[key] = rows
+            if len(self._matches) > DATASET_QUERY_CACHE_SIZE:
+                self._matches.popitem(last=False)
+        return rows
+
+    def page(self, media_type, query="", genre=None, after=-1, limit=100):
+        rows = self.matches(media_type, query, genre)
+        start = np.searchsorted(rows, after, side="right")
+        return self.entries(rows[start:start + limit])
+
+    def entries(self, rows, genre=None):
+        rows = np.asarray(rows, dtype=np.int64)
+        if genre:
+            rows = rows[(self.dataset.genre_bitmap.masks[rows] & self.dataset.genre_bitmap.bits.get(genre, np.uint64(0))) != 0]
+        return list(zip(rows.tolist(), self.titles[rows].tolist(), self.poster_paths[rows].tolist()))
+
+    def record(self, row):
+        return dict(self.dataset.df.iloc[int(row)].to_dict(), row=int(row))
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+def get_catalogue():
+    # The on-disk catalogue when build_catalogue.py has made one for the current metadata, else the loaded dataset
+    global _catalogue
+    with _catalogue_lock:
+        if _catalogue is None:
+            _catalogue = load_catalogue()
+            if _catalogue is None:
+                from .dataset import get_dataset
+                _catalogue = DatasetCatalogue(get_dataset())
+    return _catalogue
@@ -1,19 +1,41 @@
 ﻿import argparse
-import pandas as pd
-import json
-from .config import METADATA_PATH
-from .recommender import get_recommendations
+import time
+from .recommender import get_cached_recommender
+from .query_cache import get_query_cache
+from . import filters, metrics
 
 def run():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--title', type=str, required=True)
+    query = parser.add_mutually_exclusive_group(required=True)
+    query.add_argument('--title', type=str)
+    query.add_argument('--describe', type=str, metavar='TEXT', help="free-text description of what to watch")
+    parser.add_argument('--exact', action='store_true', help="scan every embedding instead of the ANN index")
+    filters.add_arguments(parser)
+    metrics.add_arguments(parser)
     args = parser.parse_args()
+    metrics.configure_from_args(args)
+    try:
+        recommendation_filter = filters.filter_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
 
-    df = pd.read_csv(METADATA_PATH)
-    df['embedding'] = df['embedding'].apply(lambda x: json.loads(x) if isinstance(x, str) else x)
-
-    recs = get_recommendations(df, args.title)
-    print(f"Recommendations for {args.title}:")
+    recommender = get_cached_recommender()
+    if args.describe:
+        start = time.perf_counter()
+        try:
+            vector, source = get_query_cache().get(args.describe)
+        except ImportError:
+            raise SystemExit("Free-text queries need sentence-transformers installed.")
+        print(f"Query embedding {'encoded' if source == 'encoded' else 'read from the ' + source + ' cache'} "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms.")
+        with metrics.profile("recommend"):
+            recs = [recommender.titles[i] for i in recommender.recommend_vector(vector, exact=args.exact,
+                                                                                filters=recommendation_filter)]
+        print(f"Recommendations for \"{args.describe}\":")
+    else:
+        with metrics.profile("recommend"):
+            recs = recommender.recommend(args.title, exact=args.exact, filters=recommendation_filter)
+        print(f"Recommendations for {args.title}:")
     for r in recs:
         print(f"- {r}")
 
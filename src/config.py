@@ -1,8 +1,23 @@
-﻿from pathlib import Path
+﻿import os
+from pathlib import Path
 
 TMDB_API_KEY = '<your_tmdb_api_key>'
 BASE_DIR = Path(__file__).resolve().parent.parent
-METADATA_PATH = BASE_DIR / "data" / "metadata_embeddings.csv"
+DATA_DIR = Path(os.environ.get("RECOMMENDER_DATA_DIR", BASE_DIR / "data"))
+METADATA_PATH = DATA_DIR / "metadata_embeddings.csv"
+EMBEDDINGS_PATH = DATA_DIR / "embeddings.npy"
+EMBEDDING_HASHES_PATH = DATA_DIR / "embedding_hashes.npy"
+EMBED_CHECKPOINT_PATH = DATA_DIR / "embed_checkpoint.json"
+ANN_INDEX_PATH = DATA_DIR / "ann_index.npz"
+NEIGHBOUR_IDS_PATH = DATA_DIR / "neighbour_ids.npy"
+NEIGHBOUR_SCORES_PATH = DATA_DIR / "neighbour_scores.npy"
+QUANTIZED_EMBEDDINGS_PATH = DATA_DIR / "embeddings_quantized.npy"
+QUANTIZED_SCALES_PATH = DATA_DIR / "embeddings_quantized_scales.npy"
+QUERY_CACHE_PATH = DATA_DIR / "query_cache.sqlite"
+CATALOGUE_PATH = DATA_DIR / "catalogue.sqlite"
+IMAGE_DIR = DATA_DIR / "images"
+THUMBNAIL_DIR = DATA_DIR / "thumbnails"
+THUMBNAIL_MANIFEST_PATH = THUMBNAIL_DIR / "manifest.json"
 MOVIE_GENRES = {
     28: "Action", 12: "Adventure", 16: "Animation", 35: "Comedy", 80: "Crime",
     99: "Documentary", 18: "Drama", 10751: "Family", 14: "Fantasy", 36: "History",
@@ -0,0 +1,86 @@
+﻿import threading
+import numpy as np
+import pandas as pd
+from .config import METADATA_PATH, EMBEDDINGS_PATH
+from .store import load_dataset
+from .search import TitleIndex, GenreBitmap
+from .genres import GenreBitsets
+from . import metrics
+
+# Low-cardinality text columns; categories keep one copy of each distinct value
+CATEGORY_COLUMNS = ["media_type", "genres", "genre_ids", "original_language"]
+NUMERIC_COLUMNS = ["popularity", "vote_average", "vote_count"]
+
+_dataset = None
+_lock = threading.Lock()
+
+def prepare_columns(df):
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    for column in NUMERIC_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+    for column in ("poster_path", "backdrop_path"):
+        if column in df.columns:
+            df[column] = df[column].fillna("")
+    return df
+
+class Dataset:
+    # Metadata and embeddings for one process: row i of df is row i of the embedding matrix
+    def __init__(self, df, embeddings):
+        self.df = df
+        self.embeddings = embeddings
+        self._title_index = None
+        self._genre_bitmap = None
+        self._genre_bitsets = None
+        self._index_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, metadata_path=METADATA_PATH, embeddings_path=EMBEDDINGS_PATH):
+        with metrics.span("dataset.load") as span:
+            df, embeddings = load_dataset(metadata_path, embeddings_path)
+            span.add(rows=len(df))
+            return cls(prepare_columns(df), embeddings)
+
+    def __len__(self):
+        return len(self.df)
+
+    def rows(self, media_type=None):
+        if media_type is None:
+            return np.arange(len(self.df))
+        return np.flatnonzero((self.df["media_type"] == media_type).to_numpy())
+
+    @property
+    def title_index(self):
+        # Built on first use and shared by the grid search and the recommender's title lookup
+        with self._index_lock:
+            if self._title_index is None:
+                with metrics.span("dataset.title_index", rows=len(self.df)):
+                    self._title_index = TitleIndex(self.df["title"].tolist())
+        return self._title_index
+
+    @property
+    def genre_bitmap(self):
+        with self._index_lock:
+            if self._genre_bitmap is None:
+                with metrics.span("dataset.genre_bitmap", rows=len(self.df)):
+                    self._genre_bitmap = GenreBitmap(self.df["genres"])
+        return self._genre_bitmap
+
+    @property
+    def genre_bitsets(self):
+        # genre_ids parsed once per distinct value, shared by every recommender over this dataset
+        with self._index_lock:
+            if self._genre_bitsets is None:
+                with metrics.span("dataset.genre_bitsets", rows=len(self.df)):
+                    self._genre_bitsets = GenreBitsets(self.df["genre_ids"])
+        return self._genre_bitsets
+
+def get_dataset(load=True):
+    # load=False only reports the shared dataset if something already loaded it
+    global _dataset
+    with _lock:
+        if _dataset is None and load:
+            _dataset = Dataset.load()
+    return _dataset
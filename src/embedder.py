@@ -1,9 +1,25 @@
-﻿from sentence_transformers import SentenceTransformer
+﻿import numpy as np
 import pandas as pd
 import json
+import hashlib
 from .config import MOVIE_GENRES, TV_GENRES
+from .genres import parse_distinct
+from . import metrics
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+_model = None
+
+DEFAULT_BATCH_SIZE = 64
+
+def get_model():
+    # sentence-transformers pulls in torch, so it is only imported once something is actually encoded
+    global _model
+    if _model is None:
+        with metrics.span("embed.load_model", model=MODEL_NAME):
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer(MODEL_NAME)
+    return _model
 
 def genre_list_to_names(genre_ids, media_type):
     if pd.isna(genre_ids):
@@ -22,9 +38,46 @@ def genre_list_to_names(genre_ids, media_type):
     genre_map = MOVIE_GENRES if media_type == 'movie' else TV_GENRES
     return ", ".join(genre_map.get(gid, "") for gid in ids if gid in genre_map)
 
-def add_embeddings(df):
+def genre_names(df):
+    # Same output as genre_list_to_names row by row, with each distinct genre_ids value parsed and named once
+    codes, lists = parse_distinct(df['genre_ids'])
+    movie_names = np.array([", ".join(MOVIE_GENRES[gid] for gid in ids if gid in MOVIE_GENRES) for ids in lists], dtype=object)
+    tv_names = np.array([", ".join(TV_GENRES[gid] for gid in ids if gid in TV_GENRES) for ids in lists], dtype=object)
+    is_movie = (df['media_type'] == 'movie').to_numpy()
+    return pd.Series(np.where(is_movie, movie_names[codes], tv_names[codes]), index=df.index)
+
+def prepare_texts(df):
     df = df[df['overview'].notnull()].copy()
-    df['genres'] = df.apply(lambda row: genre_list_to_names(row['genre_ids'], row['media_type']), axis=1)
+    df['genres'] = genre_names(df)
     df['combined_text'] = df['overview'] + ". Genres: " + df['genres']
-    df['embedding'] = df['combined_text'].apply(lambda x: model.encode(x).tolist())
+    return df
+
+def encode_texts(texts, batch_size=DEFAULT_BATCH_SIZE, workers=1, pool=None):
+    # `pool` is a running start_multi_process_pool() pool, for callers that encode many batches with one set of workers
+    texts = list(texts)
+    model = get_model()
+    if not texts:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    with metrics.span("embed.encode", rows=len(texts), batch_size=batch_size, workers=workers):
+        if pool is not None:
+            embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size)
+        elif workers > 1 and len(texts) > batch_size:
+            pool = model.start_multi_process_pool(target_devices=['cpu'] * workers)
+            try:
+                embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size)
+            finally:
+                model.stop_multi_process_pool(pool)
+        else:
+            embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    metrics.count("embed.rows_embedded", len(texts))
+    return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+
+def content_hashes(texts, model_name=MODEL_NAME):
+    # A vector only stays valid while both the input text and the model that produced it are unchanged
+    prefix = f"{model_name}\0".encode("utf-8")
+    return [hashlib.blake2b(prefix + text.encode("utf-8"), digest_size=16).hexdigest() for text in texts]
+
+def add_embeddings(df, batch_size=DEFAULT_BATCH_SIZE, workers=1):
+    df = prepare_texts(df)
+    df['embedding'] = list(encode_texts(df['combined_text'], batch_size, workers))
     return df
\ No newline at end of file
@@ -0,0 +1,217 @@
+import functools
+import math
+import threading
+import numpy as np
+import pandas as pd
+from .config import MOVIE_GENRES, TV_GENRES
+from .genres import GenreBitsets
+
+MEDIA_TYPES = ("movie", "tv")
+# Genre names as the app shows them, each with every id that carries the name in either map
+GENRE_NAME_IDS = {}
+for _genre_map in (MOVIE_GENRES, TV_GENRES):
+    for _gid, _name in _genre_map.items():
+        GENRE_NAME_IDS.setdefault(_name, set()).add(_gid)
+_EPOCH = pd.Timestamp("1970-01-01")
+
+def parse_date(text, end=False):
+    # "2010", "2010-05" or "2010-05-03" as days since 1970; end=True gives the last day of the year or month
+    try:
+        period = pd.Period(str(text).strip())
+    except (ValueError, TypeError):
+        raise ValueError(f"invalid date {text!r}, expected YYYY, YYYY-MM or YYYY-MM-DD")
+    day = period.end_time.normalize() if end else period.start_time
+    return float((day - _EPOCH).days)
+
+class RecommendationFilter:
+    # Conditions every recommended row must meet; None leaves a condition out. Date bounds are inclusive, so
+    # released_before="2015" keeps everything up to the end of 2015.
+    FIELDS = ("media_type", "genre", "released_after", "released_before", "min_popularity", "min_vote_count",
+              "min_vote_average")
+
+    def __init__(self, media_type=None, genre=None, released_after=None, released_before=None, min_popularity=None,
+                 min_vote_count=None, min_vote_average=None):
+        if media_type is not None and media_type not in MEDIA_TYPES:
+            raise ValueError(f"media_type must be one of {', '.join(MEDIA_TYPES)}")
+        if genre is not None:
+            names = {name.lower(): name for name in GENRE_NAME_IDS}
+            if genre.lower() not in names:
+                raise ValueError(f"unknown genre {genre!r}, expected one of {', '.join(sorted(GENRE_NAME_IDS))}")
+            genre = names[genre.lower()]
+        self.media_type = media_type
+        self.genre = genre
+        self.released_after = str(released_after) if released_after is not None else None
+        self.released_before = str(released_before) if released_before is not None else None
+        # Parsed up front, so a bad date fails when the filter is made rather than mid-query
+        self.date_range = (parse_date(self.released_after) if self.released_after is not None else None,
+                           parse_date(self.released_before, end=True) if self.released_before is not None else None)
+        self.min_popularity = float(min_popularity) if min_popularity is not None else None
+        self.min_vote_count = int(min_vote_count) if min_vote_count is not None else None
+        self.min_vote_average = float(min_vote_average) if min_vote_average is not None else None
+
+    def __bool__(self):
+        return any(getattr(self, field) is not None for field in self.FIELDS)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+
+    @classmethod
+    def from_params(cls, params):
+        # Request parameters (query strings or JSON); anything that does not parse is a ValueError
+        values = {}
+        for field in cls.FIELDS:
+            value = params.get(field)
+            if value is None or value == "":
+                continue
+            if field in ("media_type", "genre"):
+                # JSON bodies can carry any type; anything but a string would otherwise fail deep in validation
+                if not isinstance(value, str):
+                    raise ValueError(f"{field} must be a string")
+                values[field] = value
+            elif field in ("released_after", "released_before"):
+                values[field] = value
+            else:
+                try:
+                    values[field] = float(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"{field} must be a number")
+                # inf would overflow int() and nan matches nothing
+                if not math.isfinite(values[field]):
+                    raise ValueError(f"{field} must be a finite number")
+        return cls(**values)
+
+def add_arguments(parser):
+    parser.add_argument('--media-type', choices=MEDIA_TYPES, help="only recommend movies or only TV shows")
+    parser.add_argument('--genre', metavar='NAME', help="only recommend titles with this genre, e.g. Drama")
+    parser.add_argument('--released-after', metavar='DATE', help="YYYY, YYYY-MM or YYYY-MM-DD, inclusive")
+    parser.add_argument('--released-before', metavar='DATE', help="YYYY, YYYY-MM or YYYY-MM-DD, inclusive")
+    parser.add_argument('--min-popularity', type=float, metavar='N')
+    parser.add_argument('--min-votes', type=int, metavar='N', dest='min_vote_count')
+    parser.add_argument('--min-rating', type=float, metavar='N', dest='min_vote_average', help="minimum vote average")
+
+def filter_from_args(args):
+    return RecommendationFilter(**{field: getattr(args, field, None) for field in RecommendationFilter.FIELDS})
+
+class SortedColumn:
+    # Row numbers ordered by one numeric column: how many rows pass a range is two binary searches, and the rows
+    # themselves are a slice. Rows without a value never pass.
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(self.values))
+        self.order = valid[np.argsort(self.values[valid], kind="stable")]
+        self.sorted = self.values[self.order]
+
+    def bounds(self, low=None, high=None):
+        start = 0 if low is None else np.searchsorted(self.sorted, low, side="left")
+        stop = len(self.sorted) if high is None else np.searchsorted(self.sorted, high, side="right")
+        return start, max(stop, start)
+
+    def rows(self, low=None, high=None):
+        start, stop = self.bounds(low, high)
+        return np.sort(self.order[start:stop])
+
+    def check(self, rows, low=None, high=None):
+        # Which of `rows` pass, without touching the rest of the column
+        values = self.values[rows]
+        keep = ~np.isnan(values)
+        if low is not None:
+            keep &= values >= low
+        if high is not None:
+            keep &= values <= high
+        return keep
+
+class FilterIndex:
+    # Candidate rows for a RecommendationFilter, worked out before any scoring. Rows are partitioned by media type
+    # and by genre id, and each numeric column is kept sorted, so the size of every condition's row set is known
+    # cheaply. The smallest set is taken as is and the other conditions are checked on those rows only, which makes
+    # narrow filters cheap no matter how large the catalogue is. Partitions and columns are built on first use.
+    def __init__(self, df, genres=None):
+        self.df = df
+        self.n_rows = len(df)
+        self._genres = genres
+        self._media_types = None
+        self._media_rows = {}
+        self._genre_rows = {}
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    @property
+    def genres(self):
+        if self._genres is None:
+            self._genres = GenreBitsets(self.df['genre_ids'])
+        return self._genres
+
+    def media_types(self):
+        with self._lock:
+            if self._media_types is None:
+                media = self.df['media_type'] if 'media_type' in self.df else pd.Series([""] * self.n_rows)
+                self._media_types = media.astype(str).to_numpy()
+            return self._media_types
+
+    def media_rows(self, media_type):
+        media_types = self.media_types()
+        with self._lock:
+            if media_type not in self._media_rows:
+                self._media_rows[media_type] = np.flatnonzero(media_types == media_type)
+            return self._media_rows[media_type]
+
+    def check_media(self, rows, media_type):
+        return self.media_types()[rows] == media_type
+
+    def genre_rows(self, genre):
+        with self._lock:
+            if genre not in self._genre_rows:
+                self._genre_rows[genre] = np.flatnonzero(self.check_genre(None, genre))
+            return self._genre_rows[genre]
+
+    def check_genre(self, rows, genre):
+        # Rows carrying any id with this name, straight from the bitset words
+        genres = self.genres
+        matrix = genres.matrix if rows is None else genres.matrix[rows]
+        hit = np.zeros(len(matrix), dtype=bool)
+        for gid in GENRE_NAME_IDS.get(genre, ()):
+            bit = genres.bits.get(gid)
+            if bit is not None:
+                hit |= (matrix[:, bit // 64] & (np.uint64(1) << np.uint64(bit % 64))) != 0
+        return hit
+
+    def column(self, name):
+        with self._lock:
+            if name not in self._columns:
+                if name not in self.df:
+                    values = np.full(self.n_rows, np.nan)
+                elif name == "release_date":
+                    dates = pd.to_datetime(self.df[name], errors="coerce", format="mixed")
+                    values = ((dates - _EPOCH).dt.days).to_numpy(dtype=np.float64, na_value=np.nan)
+                else:
+                    values = pd.to_numeric(self.df[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                self._columns[name] = SortedColumn(values)
+            return self._columns[name]
+
+    def conditions(self, filters):
+        # (rows passing, function returning those rows, function checking given rows) for each condition set
+        if filters.media_type is not None:
+            rows = self.media_rows(filters.media_type)
+            yield len(rows), functools.partial(self.media_rows, filters.media_type), functools.partial(self.check_media, media_type=filters.media_type)
+        if filters.genre is not None:
+            rows = self.genre_rows(filters.genre)
+            yield len(rows), functools.partial(self.genre_rows, filters.genre), functools.partial(self.check_genre, genre=filters.genre)
+        for name, low, high in (("release_date", *filters.date_range), ("popularity", filters.min_popularity, None),
+                                ("vote_count", filters.min_vote_count, None), ("vote_average", filters.min_vote_average, None)):
+            if low is None and high is None:
+                continue
+            column = self.column(name)
+            start, stop = column.bounds(low, high)
+            yield stop - start, functools.partial(column.rows, low, high), functools.partial(column.check, low=low, high=high)
+
+    def rows(self, filters):
+        # Ascending rows that meet every condition, or None when the filter is empty (every row is a candidate)
+        if not filters:
+            return None
+        conditions = sorted(self.conditions(filters), key=lambda condition: condition[0])
+        rows = conditions[0][1]()
+        for _, _, check in conditions[1:]:
+            if not len(rows):
+                break
+            rows = rows[check(rows)]
+        return rows
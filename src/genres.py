@@ -0,0 +1,67 @@
+import json
+import numpy as np
+import pandas as pd
+from .config import MOVIE_GENRES, TV_GENRES
+
+# Fixed bit for every genre id the app knows about; ids outside the config get bits after these when they show up
+GENRE_IDS = sorted(set(MOVIE_GENRES) | set(TV_GENRES))
+GENRE_BITS = {gid: bit for bit, gid in enumerate(GENRE_IDS)}
+
+def parse_genre_ids(genre_ids):
+    if isinstance(genre_ids, str):
+        try:
+            ids = json.loads(genre_ids)
+        except json.JSONDecodeError:
+            return []
+        return ids if isinstance(ids, list) else []
+    if isinstance(genre_ids, (list, tuple, set)):
+        return list(genre_ids)
+    return []
+
+def parse_distinct(genre_ids):
+    # Parses each distinct value once: returns (codes, lists) with lists[codes[i]] the ids of row i.
+    # Missing values get code -1, and lists carries a trailing [] for them.
+    genre_ids = pd.Series(genre_ids)
+    if isinstance(genre_ids.dtype, pd.CategoricalDtype):
+        codes, uniques = genre_ids.cat.codes.to_numpy(), genre_ids.cat.categories
+    else:
+        try:
+            codes, uniques = pd.factorize(genre_ids)
+        except TypeError:
+            # In-memory lists are unhashable; tuples factorize the same way
+            codes, uniques = pd.factorize(genre_ids.map(lambda ids: tuple(ids) if isinstance(ids, (list, set)) else ids))
+    return codes, [parse_genre_ids(value) for value in uniques] + [[]]
+
+class GenreBitsets:
+    # One row of uint64 words per title with a bit per genre id. Jaccard is popcount(a & b) over
+    # |a| + |b| - popcount(a & b), the same integers the set-based formula divides.
+    def __init__(self, genre_ids):
+        codes, lists = parse_distinct(genre_ids)
+        self.bits = dict(GENRE_BITS)
+        for gid in sorted({gid for ids in lists for gid in ids} - self.bits.keys(), key=repr):
+            self.bits[gid] = len(self.bits)
+        words = max(-(-len(self.bits) // 64), 1)
+
+        distinct = np.zeros((len(lists), words), dtype=np.uint64)
+        for i, ids in enumerate(lists):
+            for gid in set(ids):
+                bit = self.bits[gid]
+                distinct[i, bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+        self.matrix = distinct[codes]
+        self.counts = np.bitwise_count(self.matrix).sum(axis=1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def jaccard(self, idx, rows=None):
+        matrix, counts = (self.matrix, self.counts) if rows is None else (self.matrix[rows], self.counts[rows])
+        intersection = np.bitwise_count(matrix & self.matrix[idx]).sum(axis=1, dtype=np.int64)
+        union = counts + self.counts[idx] - intersection
+        return np.divide(intersection, union, out=np.zeros(len(union)), where=union > 0)
+
+    def jaccard_many(self, idxs):
+        # (len(idxs), rows) Jaccard of each query row against every row, with the same integers as jaccard()
+        queries = self.matrix[idxs]
+        intersection = np.bitwise_count(queries[:, None, :] & self.matrix[None, :, :]).sum(axis=2, dtype=np.int64)
+        union = self.counts[None, :] + self.counts[idxs][:, None] - intersection
+        return np.divide(intersection, union, out=np.zeros(union.shape), where=union > 0)
@@ -0,0 +1,262 @@
+import atexit
+import bisect
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+# Off unless one of these is set (or the matching --metrics/--profile flag is passed). RECOMMENDER_METRICS is a
+# JSON-lines file to append to, or "-" for stderr; RECOMMENDER_PROFILE is "cpu", "memory" or "cpu,memory".
+METRICS_ENV = "RECOMMENDER_METRICS"
+PROFILE_ENV = "RECOMMENDER_PROFILE"
+PROFILE_KINDS = ("cpu", "memory")
+# Histogram bucket upper bounds in milliseconds, doubling from 10 us to about three minutes
+BUCKETS_MS = tuple(0.01 * 2 ** i for i in range(25))
+PROFILE_TOP = 25
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(BUCKETS_MS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        # Upper bound of the bucket holding the q-th percentile, so at most 2x above the true value
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "mean_ms": round(self.total / self.count, 4) if self.count else None,
+                "min_ms": round(self.min, 4) if self.count else None, "max_ms": round(self.max, 4),
+                "p50_ms": round(self.percentile(50), 4), "p95_ms": round(self.percentile(95), 4),
+                "p99_ms": round(self.percentile(99), 4)}
+
+class Metrics:
+    def __init__(self, path, profile=()):
+        self.path = path
+        self.profile = set(profile)
+        self.profiled = set()
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._out = sys.stderr if path == "-" else open(path, "a", encoding="utf-8")
+
+    def record(self, kind, name, /, **fields):
+        line = json.dumps({"type": kind, "name": name, "ts": round(time.time(), 6), "pid": os.getpid(),
+                           "thread": threading.current_thread().name, **fields}, default=str)
+        with self._lock:
+            if self._closed:
+                return
+            self._out.write(line + "\n")
+            self._out.flush()
+
+    def count(self, name, n):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, ms):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {"counters": dict(self.counters),
+                    "histograms": {name: h.summary() for name, h in self.histograms.items()}}
+
+    def close(self):
+        if self._closed:
+            return
+        if self.counters or self.histograms:
+            self.record("summary", "process", **self.snapshot())
+        self._closed = True
+        if self._out is not sys.stderr:
+            self._out.close()
+
+_metrics = None
+
+def configure(path=None, profile=None):
+    # Explicit arguments win over the environment. The settings are exported, so spawned worker processes
+    # (encode pools, thumbnail renderers) report to the same place.
+    global _metrics
+    path = path or os.environ.get(METRICS_ENV)
+    profile = profile if profile is not None else os.environ.get(PROFILE_ENV, "")
+    kinds = [kind for kind in (profile.split(",") if isinstance(profile, str) else profile) if kind]
+    for kind in kinds:
+        if kind not in PROFILE_KINDS:
+            raise ValueError(f"unknown profile kind {kind!r}, expected {' or '.join(PROFILE_KINDS)}")
+    if not path and not kinds:
+        return None
+    path = path or "-"
+    os.environ[METRICS_ENV] = path
+    if kinds:
+        os.environ[PROFILE_ENV] = ",".join(kinds)
+    if _metrics is not None:
+        _metrics.close()
+    _metrics = Metrics(path, kinds)
+    atexit.register(_metrics.close)
+    return _metrics
+
+def disable():
+    global _metrics
+    if _metrics is not None:
+        _metrics.close()
+        _metrics = None
+    os.environ.pop(METRICS_ENV, None)
+    os.environ.pop(PROFILE_ENV, None)
+
+def add_arguments(parser):
+    parser.add_argument('--metrics', metavar='PATH', help=f"append timings and counters as JSON lines to PATH ('-' for stderr); "
+                                                          f"also {METRICS_ENV}")
+    parser.add_argument('--profile', metavar='KINDS', help=f"cProfile (cpu) and/or tracemalloc (memory) capture of the first "
+                                                           f"recommendation or grid load, e.g. cpu,memory; also {PROFILE_ENV}")
+
+def configure_from_args(args):
+    return configure(args.metrics, args.profile)
+
+def enabled():
+    return _metrics is not None
+
+def snapshot():
+    return _metrics.snapshot() if _metrics is not None else None
+
+class _Off:
+    # Shared stand-in returned while metrics are off, so an instrumented block costs one call and one check
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, **fields):
+        pass
+
+_OFF = _Off()
+
+class _Span:
+    # Timed block: always feeds the histogram of its name, and with record=True also writes a span line
+    __slots__ = ("name", "fields", "record", "start")
+
+    def __init__(self, name, fields, record):
+        self.name = name
+        self.fields = fields
+        self.record = record
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ms = (time.perf_counter() - self.start) * 1000
+        metrics = _metrics
+        if metrics is not None:
+            metrics.observe(self.name, ms)
+            if self.record:
+                if exc_type is not None:
+                    self.fields["error"] = exc_type.__name__
+                metrics.record("span", self.name, ms=round(ms, 4), **self.fields)
+        return False
+
+    def add(self, **fields):
+        # Facts only known at the end of the block, e.g. how many rows it produced
+        self.fields.update(fields)
+
+def span(name, **fields):
+    # A pipeline stage or other coarse step: one line per block plus a latency histogram
+    if _metrics is None:
+        return _OFF
+    return _Span(name, fields, True)
+
+def timer(name):
+    # For hot paths (per query, per image): histogram only, no line per call
+    if _metrics is None:
+        return _OFF
+    return _Span(name, {}, False)
+
+def count(name, n=1):
+    if _metrics is not None:
+        _metrics.count(name, n)
+
+def timed(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _metrics is None:
+                return function(*args, **kwargs)
+            with _Span(name, {}, False):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+class _Profile:
+    def __init__(self, name, metrics):
+        self.name = name
+        self.metrics = metrics
+        self.profiler = None
+
+    def __enter__(self):
+        if "memory" in self.metrics.profile:
+            tracemalloc.start()
+        if "cpu" in self.metrics.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler is not None:
+            self.profiler.disable()
+        if tracemalloc.is_tracing():
+            # Snapshot before formatting the CPU stats, which would otherwise show up as the top allocations
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_TOP]
+            tracemalloc.stop()
+            self.metrics.record("profile", self.name, kind="memory", current_kb=current // 1024, peak_kb=peak // 1024,
+                                top=[{"where": str(stat.traceback), "kb": stat.size // 1024, "blocks": stat.count} for stat in top])
+        if self.profiler is not None:
+            # Full stats next to the metrics file for snakeviz/pstats, the top of it inline in the log
+            directory = os.path.dirname(os.path.abspath(self.metrics.path)) if self.metrics.path != "-" else os.getcwd()
+            stats_path = os.path.join(directory, f"profile-{re.sub(r'[^A-Za-z0-9_.-]', '_', self.name)}-{os.getpid()}.prof")
+            self.profiler.dump_stats(stats_path)
+            text = io.StringIO()
+            pstats.Stats(self.profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            self.metrics.record("profile", self.name, kind="cpu", stats_path=stats_path, top=text.getvalue().splitlines())
+        return False
+
+def profile(name):
+    # Captures the first `name` block of the process when profiling is on, e.g. one recommendation or grid load
+    metrics = _metrics
+    if metrics is None or not metrics.profile:
+        return _OFF
+    with metrics._lock:
+        if name in metrics.profiled:
+            return _OFF
+        metrics.profiled.add(name)
+    return _Profile(name, metrics)
+
+configure()
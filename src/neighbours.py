@@ -0,0 +1,49 @@
+import os
+import numpy as np
+from .config import NEIGHBOUR_IDS_PATH, NEIGHBOUR_SCORES_PATH, EMBEDDINGS_PATH
+
+class NeighbourTable:
+    # Top-k neighbours of every row, precomputed by build_neighbours.py. ids[i] are dataset rows, best first and
+    # padded with -1; scores[i] are their recommendation scores. Both arrays are memory-mapped, so a lookup is one row read.
+    def __init__(self, ids, scores):
+        self.ids = ids
+        self.scores = scores
+
+    @property
+    def k(self):
+        return self.ids.shape[1]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def lookup(self, row, top_n=None):
+        ids = np.asarray(self.ids[row, :top_n])
+        return ids[ids >= 0]
+
+def create_table(n_rows, k, ids_path=NEIGHBOUR_IDS_PATH, scores_path=NEIGHBOUR_SCORES_PATH):
+    # Empty table under temporary names for shard workers to fill in place; publish_table moves it into place
+    tmp_paths = (f"{ids_path}.tmp.npy", f"{scores_path}.tmp.npy")
+    ids = np.lib.format.open_memmap(tmp_paths[0], mode="w+", dtype=np.int32, shape=(n_rows, k))
+    ids[:] = -1
+    scores = np.lib.format.open_memmap(tmp_paths[1], mode="w+", dtype=np.float32, shape=(n_rows, k))
+    scores[:] = np.nan
+    ids.flush()
+    scores.flush()
+    return tmp_paths
+
+def publish_table(tmp_paths, ids_path=NEIGHBOUR_IDS_PATH, scores_path=NEIGHBOUR_SCORES_PATH):
+    os.replace(tmp_paths[1], scores_path)
+    os.replace(tmp_paths[0], ids_path)
+
+def load_neighbours(ids_path=NEIGHBOUR_IDS_PATH, scores_path=NEIGHBOUR_SCORES_PATH, n_rows=None,
+                    embeddings_path=EMBEDDINGS_PATH):
+    if not os.path.exists(ids_path) or not os.path.exists(scores_path):
+        return None
+    if os.path.exists(embeddings_path) and os.path.getmtime(ids_path) < os.path.getmtime(embeddings_path):
+        print("Ignoring neighbour table older than the embeddings; rerun build_neighbours.py.")
+        return None
+    table = NeighbourTable(np.load(ids_path, mmap_mode="r"), np.load(scores_path, mmap_mode="r"))
+    if n_rows is not None and len(table) != n_rows:
+        print(f"Ignoring neighbour table built for {len(table)} rows, dataset has {n_rows}.")
+        return None
+    return table
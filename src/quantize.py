@@ -0,0 +1,96 @@
+import os
+import numpy as np
+from .config import QUANTIZED_EMBEDDINGS_PATH, QUANTIZED_SCALES_PATH, EMBEDDINGS_PATH
+
+QUANTIZED_KINDS = ("float16", "int8")
+# Rows widened to float32 per step: small enough that the widened block is still in cache for the dot product
+BLOCK_ROWS = 512
+
+class QuantizedEmbeddings:
+    # Compact copy of the unit-length embedding matrix used to shortlist candidates, which are then re-scored
+    # against the float32 store. float16 keeps 2 bytes per value; int8 keeps 1 byte per value plus a float32 scale
+    # per row (symmetric, the row's largest magnitude maps to 127). Both are memory-mapped when loaded from disk.
+    def __init__(self, codes, scales=None):
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def kind(self):
+        return "int8" if self.codes.dtype == np.int8 else "float16"
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def quantize(cls, embeddings, kind, block_rows=65_536):
+        # `embeddings` must already be unit length (see recommender.normalize_rows)
+        if kind not in QUANTIZED_KINDS:
+            raise ValueError(f"unknown quantization {kind!r}, expected one of {', '.join(QUANTIZED_KINDS)}")
+        n, dim = embeddings.shape
+        codes = np.empty((n, dim), dtype=np.int8 if kind == "int8" else np.float16)
+        scales = np.empty(n, dtype=np.float32) if kind == "int8" else None
+        for start in range(0, n, block_rows):
+            block = np.asarray(embeddings[start:start + block_rows], dtype=np.float32)
+            if kind == "int8":
+                scale = np.abs(block).max(axis=1) / 127
+                scale[scale == 0] = 1
+                codes[start:start + len(block)] = np.rint(block / scale[:, None])
+                scales[start:start + len(block)] = scale
+            else:
+                codes[start:start + len(block)] = block
+        return cls(codes, scales)
+
+    def dot(self, vector, rows=None):
+        # Approximate float32 dot products of `vector` with every row (or the given rows), one block at a time
+        vector = np.asarray(vector, dtype=np.float32)
+        n = len(self.codes) if rows is None else len(rows)
+        out = np.empty(n, dtype=np.float32)
+        buffer = np.empty((min(BLOCK_ROWS, n), self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, n, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, n)
+            block = buffer[:stop - start]
+            block[...] = self.codes[start:stop] if rows is None else self.codes[rows[start:stop]]
+            np.dot(block, vector, out=out[start:stop])
+        if self.scales is not None:
+            out *= self.scales if rows is None else self.scales[rows]
+        return out
+
+    def save(self, codes_path=QUANTIZED_EMBEDDINGS_PATH, scales_path=QUANTIZED_SCALES_PATH):
+        # Scales first, so a reader never pairs new codes with old scales; a float16 copy has none
+        tmp_path = f"{codes_path}.tmp.npy"
+        np.save(tmp_path, self.codes)
+        if self.scales is not None:
+            np.save(f"{scales_path}.tmp.npy", self.scales)
+            os.replace(f"{scales_path}.tmp.npy", scales_path)
+        elif os.path.exists(scales_path):
+            os.remove(scales_path)
+        os.replace(tmp_path, codes_path)
+
+def remove_quantized(codes_path=QUANTIZED_EMBEDDINGS_PATH, scales_path=QUANTIZED_SCALES_PATH):
+    for path in (codes_path, scales_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+def load_quantized(codes_path=QUANTIZED_EMBEDDINGS_PATH, scales_path=QUANTIZED_SCALES_PATH, n_rows=None,
+                   embeddings_path=EMBEDDINGS_PATH):
+    if not os.path.exists(codes_path):
+        return None
+    if os.path.exists(embeddings_path) and os.path.getmtime(codes_path) < os.path.getmtime(embeddings_path):
+        print("Ignoring quantized embeddings older than the embeddings; rerun quantize_embeddings.py.")
+        return None
+    codes = np.load(codes_path, mmap_mode="r")
+    scales = None
+    if codes.dtype == np.int8:
+        if not os.path.exists(scales_path):
+            print("Ignoring int8 embeddings without their scales; rerun quantize_embeddings.py.")
+            return None
+        scales = np.load(scales_path, mmap_mode="r")
+    quantized = QuantizedEmbeddings(codes, scales)
+    if n_rows is not None and len(quantized) != n_rows:
+        print(f"Ignoring quantized embeddings built for {len(quantized)} rows, dataset has {n_rows}.")
+        return None
+    return quantized
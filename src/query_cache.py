@@ -0,0 +1,121 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from .config import QUERY_CACHE_PATH
+from .embedder import MODEL_NAME, encode_texts, content_hashes
+from .search import normalize_title
+from . import metrics
+
+MEMORY_ENTRIES = 1024
+DISK_ENTRIES = 100_000
+
+def normalize_query(text):
+    # Case, accents and spacing do not change what is being asked for, so those variants share one entry
+    return " ".join(normalize_title(text).split())
+
+class QueryEmbeddingCache:
+    # Free-text query embeddings: a bounded in-memory LRU in front of a SQLite table that survives restarts.
+    # Keys hash the model name with the normalized text, like the catalogue's content hashes, so switching
+    # models never serves a stale vector. The disk tier keeps the newest DISK_ENTRIES queries.
+    def __init__(self, path=QUERY_CACHE_PATH, memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES,
+                 encode=encode_texts, model_name=MODEL_NAME):
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.encode = encode
+        self.model_name = model_name
+        self.stats = {"memory": 0, "disk": 0, "encoded": 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # One encode at a time: the model is shared, and a query already being encoded is only encoded once
+        self._encode_lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            try:
+                self._db = sqlite3.connect(str(path), timeout=5, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Query embedding cache at {path} unavailable ({e}), keeping it in memory only.")
+                self._db = None
+
+    def key(self, text):
+        return content_hashes([normalize_query(text)], self.model_name)[0]
+
+    def get(self, text):
+        # Returns (vector, source) with source one of "memory", "disk" or "encoded"
+        key = self.key(text)
+        vector = self._from_memory(key)
+        if vector is not None:
+            return vector, self._hit("memory")
+        vector = self._from_disk(key)
+        if vector is not None:
+            self._remember(key, vector)
+            return vector, self._hit("disk")
+
+        with self._encode_lock:
+            vector = self._from_memory(key)
+            if vector is not None:
+                return vector, self._hit("memory")
+            with metrics.timer("query_cache.encode"):
+                vector = np.asarray(self.encode([normalize_query(text)])[0], dtype=np.float32)
+        self._remember(key, vector)
+        self._store(key, vector)
+        return vector, self._hit("encoded")
+
+    def _hit(self, source):
+        with self._lock:
+            self.stats[source] += 1
+        metrics.count(f"query_cache.{source}")
+        return source
+
+    def _from_memory(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+            return vector
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _from_disk(self, key):
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT vector FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+        return None if row is None else np.frombuffer(row[0], dtype=np.float32)
+
+    def _store(self, key, vector):
+        if self._db is None:
+            return
+        with self._lock:
+            try:
+                self._db.execute("INSERT OR REPLACE INTO query_embeddings (key, vector) VALUES (?, ?)",
+                                 (key, vector.astype(np.float32).tobytes()))
+                # Oldest entries go first; rowids only grow, so this is a range delete on the primary index
+                self._db.execute("DELETE FROM query_embeddings WHERE rowid <= (SELECT MAX(rowid) FROM query_embeddings) - ?",
+                                 (self.disk_entries,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Could not save query embedding: {e}")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+def get_query_cache():
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache()
+    return _query_cache
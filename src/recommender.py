@@ -1,58 +1,305 @@
-﻿from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-import json
-import ast
+﻿import numpy as np
 import pandas as pd
-from src.config import METADATA_PATH
+import threading
+from src.dataset import get_dataset
+from src.ann import load_index, DEFAULT_PROBES
+from src.search import TitleIndex, intersect_mask, normalize_title
+from src.genres import GenreBitsets
+from src.filters import FilterIndex
+from src.neighbours import load_neighbours
+from src.quantize import load_quantized
+from src import metrics
 
-_cached_df = None
+SIMILARITY_WEIGHT = 0.8
+GENRE_WEIGHT = 0.2
+# Batch scoring keeps roughly this many bytes of (query, row) intermediates alive per block
+BATCH_MEMORY_BYTES = 256 * 1024 * 1024
+BATCH_BYTES_PER_SCORE = 48
+# With quantized embeddings, this many candidates per requested result are re-scored exactly
+RERANK_FACTOR = 4
+
+_cached_recommender = None
+_recommender_lock = threading.Lock()
 
 def get_cached_dataset():
-    global _cached_df
-    if _cached_df is None:
-        import ast
-        df = pd.read_csv(METADATA_PATH)
-        df = df[df['embedding'].notnull()].reset_index(drop=True)
-        df['embedding'] = df['embedding'].apply(lambda x: np.array(ast.literal_eval(x)) if isinstance(x, str) else x)
-        _cached_df = df
-    return _cached_df
-
-def get_recommendations(df, title, top_n=15):
-    embeddings = np.vstack(df['embedding'].values)
-    similarity_matrix = cosine_similarity(embeddings)
-
-    match = df[df['title'].str.lower().str.contains(title.lower())]
-    if match.empty:
-        return []
-
-    idx = match.index[0]
-    query_title = title.lower()
-    query_genres = set(json.loads(df.iloc[idx]['genre_ids']) if isinstance(df.iloc[idx]['genre_ids'], str) else df.iloc[idx]['genre_ids'])
-
-    scores = []
-    for i in range(len(df)):
-        if i == idx:
-            continue
-
-        candidate_title = df.iloc[i]['title'].lower()
-        candidate_genres = set(json.loads(df.iloc[i]['genre_ids']) if isinstance(df.iloc[i]['genre_ids'], str) else df.iloc[i]['genre_ids'])
-
-        genre_score = len(query_genres & candidate_genres) / len(query_genres | candidate_genres) if query_genres | candidate_genres else 0.0
-        similarity_score = similarity_matrix[idx][i]
-        combined_score = 0.8 * similarity_score + 0.2 * genre_score
-
-        scores.append((i, combined_score))
-
-    scores = sorted(scores, key=lambda x: x[1], reverse=True)
-
-    # Filter out any title that contains the query title or vice versa
-    filtered = []
-    for i, _ in scores:
-        candidate_title = df.iloc[i]['title'].lower()
-        if query_title in candidate_title or candidate_title in query_title:
-            continue
-        filtered.append(df.iloc[i]['title'])
-        if len(filtered) == top_n:
-            break
-
-    return filtered
+    return get_dataset().df
+
+def build_recommender(dataset):
+    # Everything the app precomputes for a dataset: ANN index, title index, genre bitsets, neighbour table and
+    # quantized embeddings
+    with metrics.span("recommender.build", rows=len(dataset)):
+        return Recommender(dataset.df, dataset.embeddings, load_index(), title_index=dataset.title_index,
+                           genres=dataset.genre_bitsets, neighbours=load_neighbours(n_rows=len(dataset)),
+                           quantized=load_quantized(n_rows=len(dataset)))
+
+def get_cached_recommender():
+    # Built once, possibly from the GUI's recommendation worker while the main thread also asks for it
+    global _cached_recommender
+    with _recommender_lock:
+        if _cached_recommender is None:
+            _cached_recommender = build_recommender(get_dataset())
+    return _cached_recommender
+
+def normalize_rows(matrix):
+    # float16 has no BLAS path, so half-precision stores are widened for scoring
+    if matrix.dtype != np.float32 and matrix.dtype != np.float64:
+        matrix = matrix.astype(np.float32)
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))[:, None]
+    if np.all(np.abs(norms - 1) < 1e-6):
+        # Already unit length (the encoder normalizes), keep the memory-mapped store as is
+        return matrix
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class Recommender:
+    def __init__(self, df, embeddings=None, index=None, n_probe=DEFAULT_PROBES, title_index=None, genres=None,
+                 neighbours=None, quantized=None, rerank=RERANK_FACTOR, filter_index=None):
+        self.df = df
+        self.titles = df['title'].tolist()
+        # Case- and accent-folded like search keys, for dropping candidates that share the query's title
+        self._title_keys = [normalize_title(title) for title in self.titles]
+        self._title_index = title_index
+        self.popularity = pd.to_numeric(df['popularity'], errors='coerce').fillna(0).to_numpy() if 'popularity' in df else None
+
+        if quantized is not None and len(quantized) != len(df):
+            print(f"Ignoring quantized embeddings built for {len(quantized)} rows, dataset has {len(df)}.")
+            quantized = None
+        self.quantized = quantized
+        self.rerank = rerank
+
+        # Unit-length rows, so a single matrix-vector product gives cosine similarity. A quantized copy is only
+        # built from a unit-length float32 store, which is then used as is instead of reading every row to check.
+        if embeddings is None:
+            embeddings = np.array(df['embedding'].tolist())
+        self.embeddings = embeddings if quantized is not None else normalize_rows(embeddings)
+
+        self.genres = genres if genres is not None else GenreBitsets(df['genre_ids'])
+
+        if index is not None and index.n_rows != len(df):
+            print(f"Ignoring ANN index built for {index.n_rows} rows, dataset has {len(df)}.")
+            index = None
+        self.index = index
+        self.n_probe = n_probe
+        self.neighbours = neighbours
+        self._filter_index = filter_index
+        self._filter_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.titles)
+
+    @property
+    def title_index(self):
+        if self._title_index is None:
+            self._title_index = TitleIndex(self.titles)
+        return self._title_index
+
+    @property
+    def filter_index(self):
+        with self._filter_lock:
+            if self._filter_index is None:
+                self._filter_index = FilterIndex(self.df, self.genres)
+        return self._filter_index
+
+    def candidate_rows(self, filters):
+        # Ascending rows a RecommendationFilter allows, None for no filter
+        return self.filter_index.rows(filters) if filters else None
+
+    def find(self, title):
+        return self.title_index.find(title, self.popularity)
+
+    def scores(self, idx, rows=None):
+        embeddings = self.embeddings if rows is None else self.embeddings[rows]
+        # Combined in place on the Jaccard buffer; same operations, and so the same values, as w1 * sim + w2 * jaccard
+        score = self.genres.jaccard(idx, rows)
+        score *= GENRE_WEIGHT
+        score += SIMILARITY_WEIGHT * (embeddings @ self.embeddings[idx])
+        return score
+
+    def approximate_scores(self, idx, rows=None):
+        # scores() with the similarity taken from the quantized copy
+        score = self.genres.jaccard(idx, rows)
+        score *= GENRE_WEIGHT
+        score += SIMILARITY_WEIGHT * self.quantized.dot(self.embeddings[idx], rows)
+        return score
+
+    def batch_scores(self, idxs):
+        # One row of scores per query row: a single matrix product for the whole block, combined as in scores()
+        score = self.genres.jaccard_many(idxs)
+        score *= GENRE_WEIGHT
+        score += SIMILARITY_WEIGHT * (self.embeddings[idxs] @ self.embeddings.T)
+        return score
+
+    def recommend(self, title, top_n=15, exact=False, filters=None):
+        return [self.titles[i] for i in self.recommend_rows(title, top_n, exact, filters)]
+
+    @metrics.timed("recommend")
+    def recommend_rows(self, title, top_n=15, exact=False, filters=None):
+        # `filters` (a RecommendationFilter) narrows the candidates before anything is scored
+        idx = self.find(title)
+        if idx is None:
+            return []
+        query_title = normalize_title(title)
+        # A partial title drops candidates by what was typed, which the neighbour table cannot answer
+        return self._recommend(idx, top_n, exact, filters, None if query_title == self._title_keys[idx] else query_title)
+
+    @metrics.timed("recommend")
+    def recommend_row(self, idx, top_n=15, exact=False, filters=None):
+        # Like recommend_rows for a known dataset row, e.g. a title picked in the GUI that shares its name with others
+        idx = int(idx)
+        if not 0 <= idx < len(self):
+            return []
+        return self._recommend(idx, top_n, exact, filters)
+
+    def _recommend(self, idx, top_n, exact, filters, query_title=None):
+        # `query_title` is None when the query is the row itself; candidates sharing its title are dropped either way
+        allowed = self.candidate_rows(filters)
+        if allowed is not None and not len(allowed):
+            return []
+
+        # The table was built with each row as its own query, so it answers only those
+        if query_title is None and allowed is None and self.neighbours is not None and top_n <= self.neighbours.k:
+            metrics.count("recommend.neighbour_table")
+            return self.neighbours.lookup(idx, top_n).tolist()
+        if query_title is None:
+            query_title = self._title_keys[idx]
+        if exact:
+            return self._rank(idx, query_title, self.scores(idx, allowed), allowed, top_n)
+        # A candidate set no larger than what the probed lists would hold is cheaper to scan outright
+        if self.index is None or (allowed is not None and len(allowed) * self.index.n_lists <= len(self) * self.n_probe):
+            return self._rank_candidates(idx, query_title, allowed, top_n)
+
+        n_probe = self.n_probe
+        while True:
+            rows = self.index.candidates(self.embeddings[idx], n_probe)
+            if allowed is not None:
+                rows = rows[intersect_mask(rows, allowed)]
+            filtered = self._rank_candidates(idx, query_title, rows, top_n)
+            # Too few survivors after the title filter: widen the search, ending in a full scan
+            if len(filtered) == top_n or n_probe >= self.index.n_lists:
+                return filtered
+            n_probe *= 2
+
+    @metrics.timed("recommend.vector")
+    def recommend_vector(self, vector, top_n=15, exact=False, rows=None, filters=None):
+        # Rows closest to an arbitrary query embedding (e.g. encoded free text), by cosine similarity alone since
+        # there is no query title or genres to compare against. `rows` (ascending) and `filters` restrict the candidates.
+        vector = np.asarray(vector, dtype=self.embeddings.dtype).ravel()
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        if rows is not None:
+            rows = np.asarray(rows)
+        allowed = self.candidate_rows(filters)
+        if allowed is not None:
+            rows = allowed if rows is None else rows[intersect_mask(rows, allowed)]
+        if exact or self.index is None or (rows is not None and len(rows) * self.index.n_lists <= len(self) * self.n_probe):
+            candidates = np.arange(len(self)) if rows is None else rows
+            return self._rank_vector(vector, candidates, top_n, exact)
+
+        n_probe = self.n_probe
+        while True:
+            candidates = self.index.candidates(vector, n_probe)
+            if rows is not None:
+                candidates = candidates[intersect_mask(candidates, rows)]
+            if len(candidates) >= top_n or n_probe >= self.index.n_lists:
+                return self._rank_vector(vector, candidates, top_n)
+            n_probe *= 2
+
+    def _rank_vector(self, vector, candidates, top_n, exact=False):
+        everything = len(candidates) == len(self)
+        if self.quantized is not None and not exact:
+            # Shortlist on the quantized copy, then only the shortlist is read from the float32 store
+            approx = self.quantized.dot(vector, None if everything else candidates)
+            candidates = np.sort(candidates[top_k_indices(approx, top_n * self.rerank)[:top_n * self.rerank]])
+            everything = False
+        embeddings = self.embeddings if everything else self.embeddings[candidates]
+        return candidates[top_k_indices(embeddings @ vector, top_n)[:top_n]].tolist()
+
+    def recommend_batch(self, queries, top_n=15):
+        # Titles (resolved like recommend) or row positions; one list of titles per query, [] where nothing matched
+        idxs, query_titles, positions = [], [], []
+        for position, query in enumerate(queries):
+            idx = int(query) if isinstance(query, (int, np.integer)) else self.find(query)
+            if idx is None:
+                continue
+            idxs.append(idx)
+            query_titles.append(self._title_keys[idx] if isinstance(query, (int, np.integer)) else normalize_title(query))
+            positions.append(position)
+        results = [[] for _ in queries]
+        ids, _ = self.neighbours_of(idxs, top_n, query_titles)
+        for position, row in zip(positions, ids):
+            results[position] = [self.titles[i] for i in row if i >= 0]
+        return results
+
+    def neighbours_of(self, idxs, top_n=15, query_titles=None, block_size=None):
+        # Exact top_n rows and scores for many query rows, scored block by block so the intermediates stay
+        # within BATCH_MEMORY_BYTES. Rows are -1 and scores NaN where fewer than top_n candidates survive.
+        idxs = np.asarray(idxs, dtype=np.int64)
+        if query_titles is None:
+            query_titles = [self._title_keys[idx] for idx in idxs]
+        if block_size is None:
+            block_size = max(BATCH_MEMORY_BYTES // (BATCH_BYTES_PER_SCORE * max(len(self), 1)), 1)
+        ids = np.full((len(idxs), top_n), -1, dtype=np.int32)
+        scores = np.full((len(idxs), top_n), np.nan, dtype=np.float32)
+        metrics.count("recommend.batch_queries", len(idxs))
+        for start in range(0, len(idxs), block_size):
+            block = idxs[start:start + block_size]
+            block_scores = self.batch_scores(block)
+            for j, idx in enumerate(block):
+                rows = self._rank(idx, query_titles[start + j], block_scores[j], None, top_n)
+                ids[start + j, :len(rows)] = rows
+                scores[start + j, :len(rows)] = block_scores[j][rows]
+        return ids, scores
+
+    def _rank_candidates(self, idx, query_title, rows, top_n):
+        # Ranks every row (or `rows`), exactly or, with quantized embeddings, by re-scoring the best of the
+        # quantized scores exactly. The shortlist grows when the title filter leaves too few survivors.
+        if self.quantized is None:
+            return self._rank(idx, query_title, self.scores(idx, rows), rows, top_n)
+        approx = self.approximate_scores(idx, rows)
+        size = (top_n + 1) * self.rerank
+        while True:
+            # Sorted, so ties in the exact scores still fall back to row order
+            shortlist = np.sort(top_k_indices(approx, size)[:size])
+            if rows is not None:
+                shortlist = rows[shortlist]
+            filtered = self._rank(idx, query_title, self.scores(idx, shortlist), shortlist, top_n)
+            if len(filtered) == top_n or size >= len(approx):
+                return filtered
+            size *= 4
+
+    def _rank(self, idx, query_title, scores, rows, top_n):
+        # Over-fetch, since candidates whose title contains the query (or vice versa) are dropped
+        k = top_n + 1
+        while True:
+            candidates = top_k_indices(scores, k)
+            if rows is not None:
+                candidates = rows[candidates]
+            filtered = []
+            for i in candidates:
+                if i == idx:
+                    continue
+                candidate_title = self._title_keys[i]
+                if query_title in candidate_title or candidate_title in query_title:
+                    continue
+                filtered.append(int(i))
+                if len(filtered) == top_n:
+                    return filtered
+            if len(candidates) == len(scores):
+                return filtered
+            k *= 4
+
+def top_k_indices(scores, k):
+    # Highest scores first, ties broken by row order like a stable descending sort
+    n = len(scores)
+    if k < n:
+        threshold = scores[np.argpartition(scores, n - k)[n - k:]].min()
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(n)
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+def get_recommendations(df, title, top_n=15, embeddings=None, index=None, exact=False, filters=None):
+    shared = get_dataset(load=False)
+    recommender = get_cached_recommender() if shared is not None and df is shared.df else Recommender(df, embeddings, index)
+    return recommender.recommend(title, top_n, exact, filters)
@@ -0,0 +1,198 @@
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+SHORT_QUERY_CACHE_SIZE = 256
+
+def normalize_title(title):
+    # Case- and accent-insensitive form used for both indexing and queries
+    if not isinstance(title, str):
+        return ""
+    title = title.casefold().replace("\0", "")
+    if not title.isascii():
+        title = "".join(c for c in unicodedata.normalize("NFKD", title) if not unicodedata.combining(c))
+    return title
+
+class TitleIndex:
+    # Trigram inverted index over normalized titles, stored CSR-style: postings[offsets[i]:offsets[i + 1]] are the
+    # rows (ascending) whose title contains keys[i]. Each title is indexed with two trailing pad characters, so every
+    # character starts a trigram and a query of up to three characters is a contiguous range of keys.
+    # Characters are renumbered densely (pad = 0), which keeps a trigram small enough to share a uint64 with its row.
+    def __init__(self, titles):
+        self.titles = [normalize_title(title) for title in titles]
+        self.lengths = np.fromiter(map(len, self.titles), dtype=np.int64, count=len(self.titles))
+        self._short_queries = OrderedDict()
+        self._short_queries_lock = threading.Lock()
+
+        text = "".join(title + "\0\0" for title in self.titles)
+        if text.isascii():
+            codes = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        else:
+            codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        alphabet = np.flatnonzero(np.bincount(codes, minlength=1))
+        if not len(alphabet) or alphabet[0] != 0:
+            alphabet = np.concatenate(([0], alphabet))
+        self.char_ids = {code: i for i, code in enumerate(alphabet.tolist())}
+        self.char_bits = max(int(len(alphabet) - 1).bit_length(), 1)
+        table = np.zeros(int(alphabet[-1]) + 1, dtype=np.min_scalar_type(len(alphabet)))
+        table[alphabet] = np.arange(len(alphabet))
+        ids = table[codes]
+        del text, codes
+
+        # Narrowest dtypes and in-place shifts throughout: at a million titles these arrays hold tens of millions of entries
+        key_dtype = np.uint32 if 3 * self.char_bits <= 32 else np.uint64
+        bits = key_dtype(self.char_bits)
+        keys = ids[:-2].astype(key_dtype)
+        keys <<= bits + bits
+        keys |= ids[1:-1].astype(key_dtype) << bits
+        keys |= ids[2:]
+        valid = ids[:-2] != 0
+        keys = keys[valid]
+        rows = np.repeat(np.arange(len(self.titles), dtype=np.uint32), self.lengths + 2)[:-2][valid]
+        del ids, valid
+
+        row_bits = max(int(len(self.titles) - 1).bit_length(), 1)
+        if 3 * self.char_bits + row_bits <= 64:
+            # (key, row) pairs sort as one integer; repeated trigrams of one title collapse to one posting
+            packed = keys.astype(np.uint64)
+            del keys
+            packed <<= np.uint64(row_bits)
+            packed |= rows
+            del rows
+            packed.sort()
+            if len(packed):
+                packed = packed[np.concatenate(([True], packed[1:] != packed[:-1]))]
+            keys = (packed >> np.uint64(row_bits)).astype(key_dtype)
+            rows = packed & np.uint64((1 << row_bits) - 1)
+            del packed
+        else:
+            order = np.argsort(keys, kind="stable")
+            keys, rows = keys[order], rows[order]
+            keep = np.ones(len(keys), dtype=bool)
+            keep[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+            keys, rows = keys[keep], rows[keep]
+
+        boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        self.keys = keys[np.concatenate(([0], boundaries))] if len(keys) else keys
+        self.offsets = np.concatenate(([0], boundaries, [len(keys)])).astype(np.int64)
+        self.postings = rows.astype(np.int32)
+
+    def trigram_key(self, ids):
+        # Up to three dense character ids packed like the index keys; shorter prefixes are padded with 0
+        ids = list(ids) + [0] * (3 - len(ids))
+        return (ids[0] << (2 * self.char_bits)) | (ids[1] << self.char_bits) | ids[2]
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _postings(self, lo, hi):
+        # Postings of every key in [lo, hi)
+        first, last = np.searchsorted(self.keys, np.array([lo, hi], dtype=np.uint64))
+        return self.postings[self.offsets[first]:self.offsets[last]]
+
+    def _short_query(self, ids):
+        # One to three characters: the union of a key range, cached since these are the broadest queries
+        query = tuple(ids)
+        with self._short_queries_lock:
+            rows = self._short_queries.get(query)
+            if rows is not None:
+                self._short_queries.move_to_end(query)
+                return rows
+        lo = self.trigram_key(ids)
+        postings = self._postings(lo, lo + (1 << (self.char_bits * (3 - len(ids)))))
+        if len(ids) == 3:
+            rows = postings
+        else:
+            mask = np.zeros(len(self.titles), dtype=bool)
+            mask[postings] = True
+            rows = np.flatnonzero(mask).astype(np.int32)
+        # Shared by the grid, the recommendation worker and the server's request threads
+        with self._short_queries_lock:
+            self._short_queries[query] = rows
+            if len(self._short_queries) > SHORT_QUERY_CACHE_SIZE:
+                self._short_queries.popitem(last=False)
+        return rows
+
+    def search(self, query, rows=None):
+        # Ascending rows whose normalized title contains the normalized query, optionally restricted to the sorted
+        # subset `rows`. An empty query matches everything.
+        query = normalize_title(query)
+        if not query:
+            return np.arange(len(self.titles)) if rows is None else rows
+        ids = [self.char_ids.get(ord(c)) for c in query]
+        if None in ids:
+            # A character no title contains
+            matches = np.zeros(0, dtype=np.int32)
+        elif len(ids) <= 3:
+            matches = self._short_query(ids)
+        else:
+            # Intersect the trigram lists rarest first, then confirm the survivors contain the whole query
+            keys = sorted({self.trigram_key(ids[i:i + 3]) for i in range(len(ids) - 2)})
+            lists = sorted((self._postings(key, key + 1) for key in keys), key=len)
+            matches = lists[0]
+            for postings in lists[1:]:
+                if not len(matches):
+                    break
+                matches = matches[intersect_mask(matches, postings)]
+            if rows is not None:
+                matches = matches[intersect_mask(matches, rows)]
+                rows = None
+            titles = self.titles
+            matches = np.fromiter((row for row in matches.tolist() if query in titles[row]), dtype=np.int32)
+        if rows is not None:
+            matches = matches[intersect_mask(matches, rows)]
+        return matches
+
+    def find(self, title, popularity=None):
+        # Best single row for a free-typed title: an exact title beats one starting with the query, which beats one
+        # merely containing it. Ties go to the most popular entry, then the earliest row.
+        matches = self.search(title)
+        if not len(matches):
+            return None
+        query = normalize_title(title)
+        best = matches[self.lengths[matches] == len(query)]
+        if not len(best):
+            titles = self.titles
+            best = np.fromiter((row for row in matches.tolist() if titles[row].startswith(query)), dtype=np.int64)
+        if not len(best):
+            best = matches
+        if popularity is None:
+            return int(best[0])
+        return int(best[np.argmax(popularity[best])])
+
+def intersect_mask(rows, sorted_rows):
+    # Which entries of `rows` appear in the ascending array `sorted_rows`
+    if not len(sorted_rows):
+        return np.zeros(len(rows), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_rows, rows), len(sorted_rows) - 1)
+    return sorted_rows[positions] == rows
+
+class GenreBitmap:
+    # One uint64 per row with a bit per genre name, built from the comma-separated `genres` column
+    def __init__(self, genres):
+        genres = genres.astype("category") if genres.dtype.name != "category" else genres
+        categories = genres.cat.categories
+        names = sorted({name for value in categories for name in str(value).split(", ") if name})
+        if len(names) > 64:
+            raise ValueError(f"{len(names)} genres do not fit a 64-bit genre bitmap")
+        self.bits = {name: np.uint64(1) << np.uint64(i) for i, name in enumerate(names)}
+
+        # Masks are worked out once per distinct genres string, then spread over the rows by category code
+        category_masks = np.zeros(len(categories) + 1, dtype=np.uint64)
+        for code, value in enumerate(categories):
+            for name in str(value).split(", "):
+                if name:
+                    category_masks[code] |= self.bits[name]
+        self.masks = category_masks[genres.cat.codes.to_numpy()]  # code -1 (missing) picks the trailing 0
+
+    def names(self, rows=None):
+        masks = self.masks if rows is None else self.masks[rows]
+        present = np.bitwise_or.reduce(masks) if len(masks) else np.uint64(0)
+        return [name for name, bit in self.bits.items() if present & bit]
+
+    def filter(self, rows, name):
+        bit = self.bits.get(name)
+        if bit is None:
+            return rows[:0]
+        return rows[(self.masks[rows] & bit) != 0]
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit, parse_qs
+from .dataset import Dataset
+from .filters import RecommendationFilter
+from .query_cache import get_query_cache
+from .recommender import build_recommender
+from . import metrics
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_TOP_N = 15
+MAX_TOP_N = 100
+RESULT_COLUMNS = ["id", "title", "media_type", "release_date", "poster_path"]
+
+def parse_flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ("1", "true", "yes")
+
+class ServerState:
+    # The loaded dataset and its recommender. Requests read `current` once, so a reload swaps in a complete
+    # replacement while in-flight requests finish on the old one (both are resident for the length of the reload).
+    def __init__(self):
+        self.current = None
+        self.generation = 0
+        self.loaded_at = None
+        self.load_seconds = None
+        self.started = time.time()
+        self.requests = 0
+        self._reload_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        with self._reload_lock:
+            start = time.perf_counter()
+            dataset = Dataset.load()
+            self.current = (dataset, build_recommender(dataset))
+            self.generation += 1
+            self.loaded_at = time.time()
+            self.load_seconds = time.perf_counter() - start
+        return self.health()
+
+    def count_request(self):
+        with self._count_lock:
+            self.requests += 1
+
+    def health(self):
+        dataset, recommender = self.current
+        return {
+            "status": "ok",
+            "rows": len(dataset),
+            "generation": self.generation,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 3),
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "requests": self.requests,
+            "ann_index": recommender.index is not None,
+            "neighbour_table": recommender.neighbours is not None,
+            "metrics": metrics.snapshot(),
+        }
+
+    def recommend(self, params):
+        dataset, recommender = self.current
+        try:
+            top_n = int(params.get("top_n", DEFAULT_TOP_N))
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError("top_n must be an integer")
+        if not 1 <= top_n <= MAX_TOP_N:
+            raise ValueError(f"top_n must be between 1 and {MAX_TOP_N}")
+        exact = parse_flag(params.get("exact", False))
+
+        with metrics.profile("recommend"):
+            return self.run_query(dataset, recommender, params, top_n, exact)
+
+    def run_query(self, dataset, recommender, params, top_n, exact):
+        title, text = params.get("title"), params.get("text")
+        filters = RecommendationFilter.from_params(params)
+        if text:
+            # The encoder is loaded on the first free-text query; repeated queries skip it via the cache
+            vector, source = get_query_cache().get(str(text))
+            rows = recommender.recommend_vector(vector, top_n, exact, filters=filters)
+            query = {"text": text, "embedding": source}
+        elif title:
+            rows = recommender.recommend_rows(str(title), top_n, exact, filters)
+            query = {"title": title}
+        else:
+            raise ValueError("expected a 'title' or 'text' parameter")
+        if filters:
+            query["filters"] = filters.as_dict()
+
+        frame = dataset.df.iloc[rows][[c for c in RESULT_COLUMNS if c in dataset.df.columns]].astype(object)
+        results = frame.where(frame.notna(), None).to_dict(orient="records")
+        return {**query, "top_n": top_n, "generation": self.generation, "results": results}
+
+class RequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.0: every connection closes after its response, so an idle client never holds on to a pool worker
+    server_version = "RecommenderServer/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.dispatch("GET", url.path, params)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length))
+            except json.JSONDecodeError:
+                self.send_json(400, {"error": "request body is not valid JSON"})
+                return
+            if not isinstance(body, dict):
+                self.send_json(400, {"error": "request body must be a JSON object"})
+                return
+            params.update(body)
+        self.dispatch("POST", url.path, params)
+
+    def dispatch(self, method, path, params):
+        state = self.server.state
+        state.count_request()
+        endpoint = path.strip("/") if path in ("/health", "/reload", "/recommend") else "other"
+        with metrics.timer(f"server.{endpoint}"):
+            self.handle_endpoint(state, method, path, params)
+
+    def handle_endpoint(self, state, method, path, params):
+        try:
+            if path == "/health" and method == "GET":
+                body = state.health()
+            elif path == "/reload" and method == "POST":
+                body = state.reload()
+            elif path == "/recommend":
+                body = state.recommend(params)
+            else:
+                self.send_json(404, {"error": f"no endpoint {method} {path}"})
+                return
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except ImportError:
+            self.send_json(503, {"error": "free-text queries need sentence-transformers installed"})
+            return
+        except Exception as e:
+            self.log_error("%s %s failed: %r", method, path, e)
+            self.send_json(500, {"error": "internal error"})
+            return
+        self.send_json(200, body)
+
+    def send_json(self, status, body):
+        metrics.count(f"server.status.{status}")
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix-socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_request(self, code="-", size="-"):
+        if self.server.verbose:
+            super().log_request(code, size)
+
+class WorkerPoolMixIn:
+    # Requests run on a fixed pool of threads rather than a new thread per connection. NumPy releases the GIL
+    # for the matrix products, so scoring overlaps across workers.
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+class PooledHTTPServer(WorkerPoolMixIn, HTTPServer):
+    pass
+
+class PooledUnixServer(WorkerPoolMixIn, socketserver.UnixStreamServer):
+    pass
+
+def make_server(state, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, workers=None, verbose=False):
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = PooledUnixServer(socket_path, RequestHandler)
+    else:
+        server = PooledHTTPServer((host, port), RequestHandler)
+    server.pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1, thread_name_prefix="recommend")
+    server.state = state
+    server.verbose = verbose
+    return server
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--socket', help="serve on this Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=None, help="request threads (default: CPU count)")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure_from_args(args)
+
+    print("Loading dataset...")
+    state = ServerState()
+    print(f"Loaded {state.health()['rows']} titles in {state.load_seconds:.1f}s.")
+    server = make_server(state, args.host, args.port, args.socket, args.workers, args.verbose)
+    if args.socket:
+        print(f"Serving on unix:{args.socket}", flush=True)
+    else:
+        print(f"Serving on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,101 @@
+import io
+import json
+import os
+import numpy as np
+import pandas as pd
+from .config import METADATA_PATH, EMBEDDINGS_PATH, EMBEDDING_HASHES_PATH
+
+EMBEDDING_DTYPES = {"float32": np.float32, "float16": np.float16}
+# Bytes reserved ahead of the rows of a .npy file written in blocks. numpy pads every header so the row count can
+# grow to 21 digits in place, which keeps any 1- or 2-D header at this size.
+NPY_HEADER_BYTES = 128
+
+def _save_array(array, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+class NpyAppender:
+    # A .npy file grown a block of rows at a time, so an array larger than memory is written as it is produced.
+    # Rows go after a reserved header that finish() fills in once the row count is known. Reopening with `rows`
+    # drops anything written past that many rows, e.g. by a run that stopped before recording its progress.
+    def __init__(self, path, dtype, row_shape=(), rows=0):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.rows = rows
+        self.file = open(path, "r+b" if rows else "w+b")
+        self.file.truncate(self.size(self.dtype, self.row_shape, rows))
+        self.file.seek(0, os.SEEK_END)
+
+    @staticmethod
+    def size(dtype, row_shape, rows):
+        return NPY_HEADER_BYTES + rows * np.dtype(dtype).itemsize * int(np.prod(row_shape))
+
+    def append(self, block):
+        block = np.ascontiguousarray(block, dtype=self.dtype)
+        if block.shape[1:] != self.row_shape:
+            raise ValueError(f"expected rows of shape {self.row_shape}, got {block.shape[1:]}")
+        self.file.write(block.tobytes())
+        self.rows += len(block)
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def finish(self, path):
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {"descr": np.lib.format.dtype_to_descr(self.dtype),
+                                                      "fortran_order": False, "shape": (self.rows, *self.row_shape)})
+        if len(header.getvalue()) != NPY_HEADER_BYTES:
+            raise ValueError(f"a .npy header for {self.rows} rows does not fit {NPY_HEADER_BYTES} bytes")
+        self.file.seek(0)
+        self.file.write(header.getvalue())
+        self.sync()
+        self.file.close()
+        os.replace(self.path, path)
+
+    def close(self):
+        self.file.close()
+
+def save_embeddings(embeddings, path=EMBEDDINGS_PATH, dtype="float32"):
+    _save_array(np.ascontiguousarray(embeddings, dtype=EMBEDDING_DTYPES[dtype]), path)
+
+def load_embeddings(path=EMBEDDINGS_PATH, mmap=True):
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+def load_hashes(path=EMBEDDING_HASHES_PATH):
+    if not os.path.exists(path):
+        return None
+    return np.load(path).astype(str)
+
+def save_dataset(df, embeddings, metadata_path=METADATA_PATH, embeddings_path=EMBEDDINGS_PATH, dtype="float32",
+                 hashes=None, hashes_path=EMBEDDING_HASHES_PATH):
+    # Row i of the matrix belongs to the metadata row whose embedding_row is i
+    df = df.drop(columns=["embedding"], errors="ignore").copy()
+    df["embedding_row"] = np.arange(len(df))
+    save_embeddings(embeddings, embeddings_path, dtype)
+    if hashes is not None:
+        _save_array(np.asarray(hashes, dtype=str), hashes_path)
+    elif os.path.exists(hashes_path):
+        # Content hashes describe the previous matrix, keeping them would misalign incremental runs
+        os.remove(hashes_path)
+    df.to_csv(metadata_path, index=False)
+
+def load_dataset(metadata_path=METADATA_PATH, embeddings_path=EMBEDDINGS_PATH, mmap=True):
+    df = pd.read_csv(metadata_path)
+    if "embedding_row" in df.columns and os.path.exists(embeddings_path):
+        df = df[df["embedding_row"].notnull()].reset_index(drop=True)
+        rows = df["embedding_row"].to_numpy(dtype=np.int64)
+        embeddings = load_embeddings(embeddings_path, mmap)
+        if np.array_equal(rows, np.arange(len(rows))):
+            embeddings = embeddings[:len(rows)]
+        else:
+            embeddings = embeddings[rows]
+        return df, embeddings
+
+    # Legacy layout: one JSON-encoded vector per row in the embedding column
+    df = df[df["embedding"].notnull()].reset_index(drop=True)
+    embeddings = np.array([json.loads(x) for x in df.pop("embedding")], dtype=np.float32)
+    return df, embeddings
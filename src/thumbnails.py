@@ -0,0 +1,61 @@
+import json
+import os
+from pathlib import Path
+from PIL import Image
+from src.config import THUMBNAIL_DIR, THUMBNAIL_MANIFEST_PATH
+
+GRID_SIZE = (120, 180)
+DETAIL_SIZE = (240, 360)
+THUMBNAIL_SIZES = (GRID_SIZE, DETAIL_SIZE)
+JPEG_QUALITY = 90
+MANIFEST_VERSION = 1
+
+def normalize_path(rel_path):
+    return rel_path.strip().lstrip("\\/").replace("\\", "/")
+
+def size_name(size):
+    return f"{size[0]}x{size[1]}"
+
+def thumbnail_path(rel_path, size):
+    return THUMBNAIL_DIR / size_name(size) / Path(rel_path).with_suffix(".jpg")
+
+def render_thumbnail(source_path, size):
+    return render_thumbnails(source_path, [size])[0]
+
+def render_thumbnails(source_path, sizes):
+    # One decode serves every size. For JPEGs, draft() makes the decoder scale by 1/2..1/8 itself
+    # instead of inflating the full original.
+    largest = max(sizes, key=lambda size: size[0] * size[1])
+    with Image.open(source_path) as img:
+        img.draft("RGB", largest)
+        img = img.convert("RGB")
+    thumbnails = []
+    for size in sizes:
+        thumbnail = img.copy()
+        thumbnail.thumbnail(size, Image.LANCZOS)
+        thumbnails.append(thumbnail)
+    return thumbnails
+
+def save_thumbnail(img, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    img.save(tmp_path, format="JPEG", quality=JPEG_QUALITY)
+    os.replace(tmp_path, path)
+
+def load_manifest(path=THUMBNAIL_MANIFEST_PATH):
+    # {"version", "sizes": ["120x180", ...], "images": {rel_path: [mtime_ns, bytes, blake2b]}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"version": MANIFEST_VERSION, "sizes": [], "images": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "sizes": [], "images": {}}
+    return manifest
+
+def save_manifest(manifest, path=THUMBNAIL_MANIFEST_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
@@ -1,17 +1,90 @@
-﻿import requests
+﻿import argparse
+import requests
+import threading
 import time
 import json
 import os
-from src.config import TMDB_API_KEY
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from src.config import DATA_DIR, TMDB_API_KEY
+from src import metrics
 
 HEADERS = {"Accept": "application/json"}
 BASE_URL = "https://api.themoviedb.org/3/discover/"
-SAVE_DIR = "data"
+SAVE_DIR = str(DATA_DIR)
 os.makedirs(SAVE_DIR, exist_ok=True)
 
+DEFAULT_RATE = 20
+DEFAULT_WORKERS = 8
+MAX_RETRIES = 5
+# Seconds to wait after a 429 whose Retry-After is missing or unreadable
+DEFAULT_RETRY_AFTER = 10
 
-def fetch_page(media_type, page):
-	url = f"{BASE_URL}{media_type}"
+
+class RateLimiter:
+	# Token bucket shared by all workers; a 429 empties it, pauses everyone for Retry-After and slows the refill
+	def __init__(self, rate, burst=None, min_rate=1.0):
+		self.rate = float(rate)
+		self.min_rate = min(min_rate, self.rate)
+		self.capacity = burst or max(1.0, self.rate)
+		self.tokens = self.capacity
+		self.updated = time.monotonic()
+		self.paused_until = 0.0
+		self.lock = threading.Lock()
+
+	def acquire(self):
+		while True:
+			with self.lock:
+				now = time.monotonic()
+				if now >= self.paused_until:
+					self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+					self.updated = now
+					if self.tokens >= 1:
+						self.tokens -= 1
+						return
+					wait = (1 - self.tokens) / self.rate
+				else:
+					wait = self.paused_until - now
+			time.sleep(wait)
+
+	def back_off(self, retry_after):
+		with self.lock:
+			now = time.monotonic()
+			self.paused_until = max(self.paused_until, now + retry_after)
+			self.tokens = 0
+			self.updated = max(now, self.paused_until)
+			self.rate = max(self.min_rate, self.rate * 0.8)
+
+
+def make_session(workers=DEFAULT_WORKERS):
+	session = requests.Session()
+	adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+	session.mount("https://", adapter)
+	session.mount("http://", adapter)
+	session.headers.update(HEADERS)
+	return session
+
+
+def parse_retry_after(value, default=DEFAULT_RETRY_AFTER):
+	# Retry-After is either a number of seconds or an HTTP date
+	if value is None:
+		return default
+	try:
+		return max(0.0, float(value))
+	except ValueError:
+		pass
+	try:
+		when = parsedate_to_datetime(value)
+	except (TypeError, ValueError):
+		return default
+	if when.tzinfo is None:
+		return default
+	return max(0.0, when.timestamp() - time.time())
+
+
+def fetch_page(session, limiter, media_type, page, base_url=BASE_URL):
+	url = f"{base_url}{media_type}"
 	params = {
 		"api_key": TMDB_API_KEY,
 		"sort_by": "popularity.desc",
@@ -19,36 +92,144 @@ def fetch_page(media_type, page):
 		"vote_count.gte": 50,
 		"language": "en-US"
 	}
-	response = requests.get(url, headers=HEADERS, params=params)
+	for attempt in range(MAX_RETRIES):
+		limiter.acquire()
+		try:
+			with metrics.timer("scraper.request"):
+				response = session.get(url, params=params, timeout=10)
+		except requests.RequestException as e:
+			print(f"Error fetching page {page} of {media_type}: {e}")
+			metrics.count("scraper.request_errors")
+			limiter.back_off(2 ** attempt)
+			continue
+
+		if response.status_code == 429:
+			retry_after = parse_retry_after(response.headers.get("Retry-After"))
+			print(f"Rate limited. Waiting {retry_after:.0f} seconds...")
+			metrics.count("scraper.rate_limited")
+			limiter.back_off(retry_after)
+			continue
 
-	if response.status_code == 429:
-		retry_after = int(response.headers.get("Retry-After", 10))
-		print(f"Rate limited. Waiting {retry_after} seconds...")
-		time.sleep(retry_after)
-		return fetch_page(media_type, page)
+		if response.status_code >= 500:
+			print(f"Error fetching page {page} of {media_type}: {response.status_code}, retrying")
+			metrics.count("scraper.server_errors")
+			limiter.back_off(2 ** attempt)
+			continue
 
-	if response.status_code != 200:
-		print(f"Error fetching page {page} of {media_type}: {response.status_code}")
-		return []
+		if response.status_code != 200:
+			print(f"Error fetching page {page} of {media_type}: {response.status_code}")
+			metrics.count("scraper.failed_pages")
+			return None
 
-	return response.json().get("results", [])
+		try:
+			results = response.json().get("results", [])
+			if not isinstance(results, list):
+				raise ValueError("results is not a list")
+		except (ValueError, AttributeError) as e:
+			# A 200 with an HTML error page or a truncated body is retried like a server error
+			print(f"Error reading page {page} of {media_type}: {e}")
+			metrics.count("scraper.bad_responses")
+			limiter.back_off(2 ** attempt)
+			continue
+		return results
 
+	print(f"Giving up on page {page} of {media_type} after {MAX_RETRIES} attempts")
+	metrics.count("scraper.failed_pages")
+	return None
 
-def scrape_tmdb(media_type, max_pages=500, delay=0.25):
-	output_path = os.path.join(SAVE_DIR, f"tmdb_{media_type}.jsonl")
+
+def truncate_partial_line(path, block_size=4096):
+	# Drops whatever follows the last newline, i.e. a line torn by a run that was killed mid-write
+	if not os.path.exists(path):
+		return
+	with open(path, "r+b") as f:
+		end = f.seek(0, os.SEEK_END)
+		position = end
+		while position > 0:
+			start = max(0, position - block_size)
+			f.seek(start)
+			newline = f.read(position - start).rfind(b"\n")
+			if newline >= 0:
+				position = start + newline + 1
+				break
+			position = start
+		if position < end:
+			print(f"Discarding {end - position} bytes of a partial line at the end of {path}")
+			f.truncate(position)
+
+
+def load_checkpoint(path):
+	if not os.path.exists(path):
+		return set()
+	with open(path, "r", encoding="utf-8") as f:
+		return {int(line) for line in f if line.strip()}
+
+
+def scrape_tmdb(media_type, max_pages=500, rate=DEFAULT_RATE, workers=DEFAULT_WORKERS, resume=True,
+				base_url=BASE_URL, save_dir=SAVE_DIR):
+	output_path = os.path.join(save_dir, f"tmdb_{media_type}.jsonl")
+	checkpoint_path = os.path.join(save_dir, f"tmdb_{media_type}.pages")
 	print(f"Saving {media_type} data to {output_path}")
 
-	with open(output_path, "w", encoding="utf-8") as f:
-		for page in range(1, max_pages + 1):
-			print(f"Fetching {media_type} page {page}/{max_pages}")
-			results = fetch_page(media_type, page)
-			for entry in results:
-				entry["media_type"] = media_type
-				json.dump(entry, f)
-				f.write("\n")
-			time.sleep(delay)
+	if not resume:
+		for path in (output_path, checkpoint_path):
+			if os.path.exists(path):
+				os.remove(path)
+	# Appending after a torn line would glue it to the first new row
+	for path in (output_path, checkpoint_path):
+		truncate_partial_line(path)
+	done = load_checkpoint(checkpoint_path)
+	pending = [page for page in range(1, max_pages + 1) if page not in done]
+	if done:
+		print(f"Resuming {media_type}: {max_pages - len(pending)} pages already fetched")
+
+	limiter = RateLimiter(rate)
+	fetched = 0
+	start = time.perf_counter()
+
+	with metrics.span("scraper.scrape", media_type=media_type, pages=len(pending)) as span:
+		with make_session(workers) as session, \
+				open(output_path, "a", encoding="utf-8") as f, \
+				open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+				ThreadPoolExecutor(max_workers=workers) as pool:
+			futures = {pool.submit(fetch_page, session, limiter, media_type, page, base_url): page for page in pending}
+			for future in as_completed(futures):
+				page = futures[future]
+				try:
+					results = future.result()
+				except Exception as e:
+					# One bad page must not stop the run; it stays unchecked and is fetched again on resume
+					print(f"Error fetching page {page} of {media_type}: {e}")
+					metrics.count("scraper.failed_pages")
+					continue
+				if results is None:
+					continue
+				# Rows are flushed before the page is checkpointed, so a crash can only repeat a page, never lose one
+				f.write("".join(json.dumps({**entry, "media_type": media_type}) + "\n" for entry in results))
+				f.flush()
+				checkpoint.write(f"{page}\n")
+				checkpoint.flush()
+				fetched += 1
+				metrics.count("scraper.pages_fetched")
+				metrics.count("scraper.items", len(results))
+				print(f"Fetched {media_type} page {page}/{max_pages}")
+		span.add(fetched=fetched)
+
+	elapsed = time.perf_counter() - start
+	print(f"Fetched {fetched} {media_type} pages in {elapsed:.1f}s ({fetched / max(elapsed, 1e-9):.1f} pages/sec)")
+	return fetched
 
 
 if __name__ == "__main__":
-	scrape_tmdb("movie")
-	scrape_tmdb("tv")
+	parser = argparse.ArgumentParser()
+	parser.add_argument("media_types", nargs="*", default=["movie", "tv"])
+	parser.add_argument("--pages", type=int, default=500)
+	parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="requests per second")
+	parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+	parser.add_argument("--fresh", action="store_true", help="discard checkpoints and start from page 1")
+	metrics.add_arguments(parser)
+	args = parser.parse_args()
+	metrics.configure_from_args(args)
+
+	for media_type in args.media_types:
+		scrape_tmdb(media_type, args.pages, args.rate, args.workers, resume=not args.fresh)